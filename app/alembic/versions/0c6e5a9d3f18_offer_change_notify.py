@@ -0,0 +1,65 @@
+"""offer change notify
+
+Revision ID: 0c6e5a9d3f18
+Revises: f3b8d2a61c07
+Create Date: 2026-10-17 21:40:02.157390
+
+Сброс кэша предложений (offers.py) во всех воркерах: запись цены или условий
+поставщика шлёт NOTIFY table_changes, '<таблица>:<material_id>' — воркеры
+сбрасывают только предложения этого материала. Триггер уровня строки:
+одинаковые уведомления в транзакции Postgres склеивает, так что пакет цен даёт
+по уведомлению на материал. TRUNCATE — '<таблица>' без ключа (сбросить всё).
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0c6e5a9d3f18'
+down_revision: Union[str, Sequence[str], None] = 'f3b8d2a61c07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+OFFER_TABLES = ['supplier_material_prices', 'supplier_materials']
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(
+        """
+        CREATE FUNCTION notify_material_change() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                PERFORM pg_notify('table_changes', TG_TABLE_NAME || ':' || OLD.material_id);
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                PERFORM pg_notify('table_changes', TG_TABLE_NAME || ':' || NEW.material_id);
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """
+    )
+    for table in OFFER_TABLES:
+        op.execute(
+            f"CREATE TRIGGER {table}_notify "
+            f"AFTER INSERT OR UPDATE OR DELETE ON {table} "
+            f"FOR EACH ROW EXECUTE FUNCTION notify_material_change()"
+        )
+        # notify_table_change() — из f3b8d2a61c07
+        op.execute(
+            f"CREATE TRIGGER {table}_truncate_notify "
+            f"AFTER TRUNCATE ON {table} "
+            f"FOR EACH STATEMENT EXECUTE FUNCTION notify_table_change()"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in reversed(OFFER_TABLES):
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_truncate_notify ON {table}")
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_notify ON {table}")
+    op.execute("DROP FUNCTION IF EXISTS notify_material_change()")
@@ -0,0 +1,90 @@
+"""secondary indexes
+
+Revision ID: 1f539339da03
+Revises: 773ed140c716
+Create Date: 2026-10-16 12:40:08.193547
+
+Индексы под отчёты: история движений, остатки на дату, поступления по заявке,
+последние цены поставщиков. Строятся через CREATE INDEX CONCURRENTLY,
+чтобы не блокировать запись на рабочей базе, поэтому каждый индекс
+создаётся вне транзакции (autocommit_block).
+
+Не добавлены, т.к. уже покрыты уникальными ограничениями (ведущие колонки):
+- po_items(po_id)                                         -> uq_po_material (po_id, material_id)
+- supplier_material_prices(supplier_id, material_id, price_date) -> uq_supplier_price_date
+
+Если CONCURRENTLY-построение прервалось, Postgres оставляет индекс в состоянии
+INVALID — его нужно удалить (DROP INDEX CONCURRENTLY ...) и повторить upgrade.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1f539339da03'
+down_revision: Union[str, Sequence[str], None] = '773ed140c716'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (имя, таблица, колонки, доп. параметры)
+INDEXES = [
+    # история движений по материалу
+    ('ix_stock_movements_material_date', 'stock_movements',
+     ['material_id', 'move_date'], {}),
+    # остатки / история по складу×материалу, в т.ч. на дату
+    ('ix_stock_movements_to_wh_material_date', 'stock_movements',
+     ['to_warehouse_id', 'material_id', 'move_date'], {}),
+    ('ix_stock_movements_from_wh_material_date', 'stock_movements',
+     ['from_warehouse_id', 'material_id', 'move_date'], {}),
+    # выгрузки и отчёты за период
+    ('ix_stock_movements_move_date', 'stock_movements',
+     ['move_date'], {}),
+    # поступления по заявке (большинство движений без заявки — частичный индекс)
+    ('ix_stock_movements_related_po_id', 'stock_movements',
+     ['related_po_id'], {'postgresql_where': sa.text('related_po_id IS NOT NULL')}),
+    # последняя цена каждого поставщика по материалу
+    ('ix_supplier_material_prices_material_supplier_date', 'supplier_material_prices',
+     ['material_id', 'supplier_id', sa.text('price_date DESC')], {}),
+    # поставщики материала
+    ('ix_supplier_materials_material_id', 'supplier_materials',
+     ['material_id'], {}),
+    # остатки материала по всем складам
+    ('ix_stock_balances_material_id', 'stock_balances',
+     ['material_id'], {}),
+    # фильтры отчётов по проекту и категории
+    ('ix_warehouses_project_id', 'warehouses',
+     ['project_id'], {}),
+    ('ix_materials_category_id', 'materials',
+     ['category_id'], {}),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции
+    with op.get_context().autocommit_block():
+        for name, table, columns, kwargs in INDEXES:
+            op.create_index(
+                name,
+                table,
+                columns,
+                unique=False,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+                **kwargs,
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(
+                name,
+                table_name=table,
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
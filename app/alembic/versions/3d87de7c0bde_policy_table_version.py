@@ -0,0 +1,67 @@
+"""policy table version
+
+Revision ID: 3d87de7c0bde
+Revises: 3e3f4e28e515
+Create Date: 2026-10-16 23:20:41.118305
+
+Версия для warehouse_material_policy (ETag списка политик) и время изменения
+в уведомлении: NOTIFY table_versions, '<таблица>:<версия>:<epoch>' —
+воркеры держат у себя версию и время изменения каждой таблицы и отвечают
+304 Not Modified без запроса к БД.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3d87de7c0bde'
+down_revision: Union[str, Sequence[str], None] = '3e3f4e28e515'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+FUNCTION_TEMPLATE = """
+    CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger AS $$
+    DECLARE
+        new_version bigint;
+    BEGIN
+        INSERT INTO table_versions (table_name, version, updated_at)
+        VALUES (TG_TABLE_NAME, 1, now())
+        ON CONFLICT (table_name) DO UPDATE
+            SET version = table_versions.version + 1,
+                updated_at = now()
+        RETURNING version INTO new_version;
+        PERFORM pg_notify('table_versions', {payload});
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(
+        FUNCTION_TEMPLATE.format(
+            payload="TG_TABLE_NAME || ':' || new_version || ':' || extract(epoch FROM now())"
+        )
+    )
+    op.execute(
+        "INSERT INTO table_versions (table_name, version, updated_at) "
+        "VALUES ('warehouse_material_policy', 1, now())"
+    )
+    op.execute(
+        "CREATE TRIGGER warehouse_material_policy_version "
+        "AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON warehouse_material_policy "
+        "FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version()"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute(
+        "DROP TRIGGER IF EXISTS warehouse_material_policy_version ON warehouse_material_policy"
+    )
+    op.execute("DELETE FROM table_versions WHERE table_name = 'warehouse_material_policy'")
+    op.execute(FUNCTION_TEMPLATE.format(payload="TG_TABLE_NAME || ':' || new_version"))
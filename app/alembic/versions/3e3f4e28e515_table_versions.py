@@ -0,0 +1,75 @@
+"""table versions
+
+Revision ID: 3e3f4e28e515
+Revises: 3ee160efdb7a
+Create Date: 2026-10-16 22:58:17.902292
+
+Счётчик версий справочных таблиц: любой INSERT / UPDATE / DELETE / TRUNCATE
+увеличивает table_versions.version и отправляет
+NOTIFY table_versions, '<таблица>:<версия>' (уходит при COMMIT).
+По этим уведомлениям воркеры сбрасывают кэш справочников (refcache.py).
+
+Триггеры уровня оператора: массовая вставка даёт одно увеличение версии,
+а не по одному на строку.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3e3f4e28e515'
+down_revision: Union[str, Sequence[str], None] = '3ee160efdb7a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+VERSIONED_TABLES = ['units', 'categories', 'materials', 'suppliers', 'projects', 'warehouses']
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'table_versions',
+        sa.Column('table_name', sa.String(), nullable=False),
+        sa.Column('version', sa.BigInteger(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('table_name'),
+    )
+    op.execute(
+        """
+        CREATE FUNCTION bump_table_version() RETURNS trigger AS $$
+        DECLARE
+            new_version bigint;
+        BEGIN
+            INSERT INTO table_versions (table_name, version, updated_at)
+            VALUES (TG_TABLE_NAME, 1, now())
+            ON CONFLICT (table_name) DO UPDATE
+                SET version = table_versions.version + 1,
+                    updated_at = now()
+            RETURNING version INTO new_version;
+            PERFORM pg_notify('table_versions', TG_TABLE_NAME || ':' || new_version);
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """
+    )
+    for table in VERSIONED_TABLES:
+        op.execute(
+            f"INSERT INTO table_versions (table_name, version, updated_at) "
+            f"VALUES ('{table}', 1, now())"
+        )
+        op.execute(
+            f"CREATE TRIGGER {table}_version "
+            f"AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table} "
+            f"FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version()"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in reversed(VERSIONED_TABLES):
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_version ON {table}")
+    op.execute("DROP FUNCTION IF EXISTS bump_table_version()")
+    op.drop_table('table_versions')
@@ -0,0 +1,175 @@
+"""partition stock_movements by month
+
+Revision ID: 3ee160efdb7a
+Revises: 1f539339da03
+Create Date: 2026-10-16 14:05:51.620934
+
+stock_movements становится декларативно секционированной таблицей
+(PARTITION BY RANGE (move_date)), по одной секции на месяц, плюс секция
+DEFAULT для дат вне созданных секций. Первичный ключ — (move_id, move_date):
+в секционированной таблице ключ обязан включать колонку секционирования.
+move_id по-прежнему берётся из той же последовательности.
+
+Секции на будущее и отсоединение старых — команда `python -m partitions`.
+
+Миграция переписывает весь журнал (INSERT ... SELECT) и держит на нём
+эксклюзивную блокировку — выполнять в окно обслуживания.
+"""
+from datetime import date
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3ee160efdb7a'
+down_revision: Union[str, Sequence[str], None] = '1f539339da03'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# сколько месяцев вперёд создать сразу
+MONTHS_AHEAD = 3
+# более старые строки (ошибки в датах и т.п.) уходят в DEFAULT, а не плодят секции
+MAX_MONTHS_BACK = 120
+
+COLUMNS = (
+    "move_id, move_type, move_date, status, supplier_id, from_warehouse_id, "
+    "to_warehouse_id, related_po_id, material_id, qty, unit_price, ext_doc_no, "
+    "ext_doc_date, vehicle_number, shipped_by_name, accepted_by_name, ship_date, "
+    "load_date, file_url, project_id, driver_name, file_mime, file_hash"
+)
+
+# имена внешних ключей заданы явно: старая таблица на момент CREATE TABLE
+# ещё существует, и автоматические имена получили бы суффикс "1"
+COLUMN_DEFS = """
+    move_id integer NOT NULL DEFAULT nextval('stock_movements_move_id_seq'),
+    move_type varchar NOT NULL,
+    move_date date NOT NULL,
+    status varchar,
+    supplier_id integer CONSTRAINT stock_movements_supplier_id_fkey REFERENCES suppliers (supplier_id),
+    from_warehouse_id integer CONSTRAINT stock_movements_from_warehouse_id_fkey REFERENCES warehouses (warehouse_id),
+    to_warehouse_id integer CONSTRAINT stock_movements_to_warehouse_id_fkey REFERENCES warehouses (warehouse_id),
+    related_po_id integer CONSTRAINT stock_movements_related_po_id_fkey REFERENCES purchase_orders (po_id),
+    material_id integer NOT NULL CONSTRAINT stock_movements_material_id_fkey REFERENCES materials (material_id),
+    qty numeric NOT NULL,
+    unit_price numeric,
+    ext_doc_no varchar,
+    ext_doc_date date,
+    vehicle_number varchar,
+    shipped_by_name varchar,
+    accepted_by_name varchar,
+    ship_date date,
+    load_date date,
+    file_url varchar,
+    project_id integer CONSTRAINT stock_movements_project_id_fkey REFERENCES projects (project_id),
+    driver_name varchar,
+    file_mime varchar,
+    file_hash varchar
+"""
+
+INDEXES = [
+    ('ix_stock_movements_move_id', '(move_id)'),
+    ('ix_stock_movements_material_date', '(material_id, move_date)'),
+    ('ix_stock_movements_to_wh_material_date', '(to_warehouse_id, material_id, move_date)'),
+    ('ix_stock_movements_from_wh_material_date', '(from_warehouse_id, material_id, move_date)'),
+    ('ix_stock_movements_move_date', '(move_date)'),
+    ('ix_stock_movements_related_po_id', '(related_po_id) WHERE related_po_id IS NOT NULL'),
+]
+
+
+def _add_months(d: date, months: int) -> date:
+    idx = d.year * 12 + d.month - 1 + months
+    return date(idx // 12, idx % 12 + 1, 1)
+
+
+def _create_indexes() -> None:
+    for name, columns in INDEXES:
+        op.execute(f"CREATE INDEX {name} ON stock_movements {columns}")
+
+
+def _drop_indexes() -> None:
+    for name, _ in INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conn = op.get_bind()
+
+    op.execute("ALTER TABLE stock_movements RENAME TO stock_movements_legacy")
+    op.execute(
+        "ALTER TABLE stock_movements_legacy "
+        "RENAME CONSTRAINT stock_movements_pkey TO stock_movements_legacy_pkey"
+    )
+    _drop_indexes()
+    op.execute("ALTER SEQUENCE stock_movements_move_id_seq OWNED BY NONE")
+
+    op.execute(
+        f"""
+        CREATE TABLE stock_movements (
+            {COLUMN_DEFS},
+            CONSTRAINT stock_movements_pkey PRIMARY KEY (move_id, move_date)
+        ) PARTITION BY RANGE (move_date)
+        """
+    )
+    op.execute("ALTER SEQUENCE stock_movements_move_id_seq OWNED BY stock_movements.move_id")
+
+    # секции: от первого месяца журнала до текущего + MONTHS_AHEAD
+    this_month = date.today().replace(day=1)
+    first, last = conn.execute(
+        sa.text("SELECT min(move_date), max(move_date) FROM stock_movements_legacy")
+    ).first()
+    start = first.replace(day=1) if first else this_month
+    start = max(start, _add_months(this_month, -MAX_MONTHS_BACK))
+    end = _add_months(max(last.replace(day=1) if last else this_month, this_month), MONTHS_AHEAD)
+
+    month = start
+    while month <= end:
+        op.execute(
+            f"CREATE TABLE stock_movements_y{month.year:04d}m{month.month:02d} "
+            f"PARTITION OF stock_movements "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_add_months(month, 1).isoformat()}')"
+        )
+        month = _add_months(month, 1)
+    op.execute("CREATE TABLE stock_movements_default PARTITION OF stock_movements DEFAULT")
+
+    op.execute(
+        f"INSERT INTO stock_movements ({COLUMNS}) "
+        f"SELECT {COLUMNS} FROM stock_movements_legacy"
+    )
+    op.execute("DROP TABLE stock_movements_legacy")
+
+    _create_indexes()
+    op.execute("ANALYZE stock_movements")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("ALTER TABLE stock_movements RENAME TO stock_movements_partitioned")
+    op.execute(
+        "ALTER TABLE stock_movements_partitioned "
+        "RENAME CONSTRAINT stock_movements_pkey TO stock_movements_partitioned_pkey"
+    )
+    _drop_indexes()
+    op.execute("ALTER SEQUENCE stock_movements_move_id_seq OWNED BY NONE")
+
+    op.execute(
+        f"""
+        CREATE TABLE stock_movements (
+            {COLUMN_DEFS},
+            CONSTRAINT stock_movements_pkey PRIMARY KEY (move_id)
+        )
+        """
+    )
+    op.execute("ALTER SEQUENCE stock_movements_move_id_seq OWNED BY stock_movements.move_id")
+    op.execute(
+        f"INSERT INTO stock_movements ({COLUMNS}) "
+        f"SELECT {COLUMNS} FROM stock_movements_partitioned"
+    )
+    # отсоединённые ранее секции (архив) остаются отдельными таблицами
+    op.execute("DROP TABLE stock_movements_partitioned CASCADE")
+
+    _create_indexes()
+    op.execute("ANALYZE stock_movements")
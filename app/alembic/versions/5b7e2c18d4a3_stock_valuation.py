@@ -0,0 +1,68 @@
+"""stock valuation
+
+Revision ID: 5b7e2c18d4a3
+Revises: c9ca9006e51e
+Create Date: 2026-10-17 16:32:08.214519
+
+Стоимость запасов по складу×материалу (stock_valuation) и открытые FIFO-слои
+(stock_cost_layers), которые ведутся при вставке движений (valuation.py).
+
+Средняя себестоимость зависит от порядка движений, поэтому одним
+INSERT ... SELECT, как stock_balances в 773ed140c716, её не посчитать.
+Таблицы создаются пустыми; заполнить по накопленному журналу:
+python -m valuation (порциями материалов, можно на работающей системе).
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b7e2c18d4a3'
+down_revision: Union[str, Sequence[str], None] = 'c9ca9006e51e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('stock_valuation',
+    sa.Column('warehouse_id', sa.Integer(), nullable=False),
+    sa.Column('material_id', sa.Integer(), nullable=False),
+    sa.Column('qty', sa.Numeric(), nullable=False),
+    sa.Column('avg_cost', sa.Numeric(), nullable=False),
+    sa.Column('value', sa.Numeric(), nullable=False),
+    sa.ForeignKeyConstraint(['material_id'], ['materials.material_id'], ),
+    sa.ForeignKeyConstraint(['warehouse_id'], ['warehouses.warehouse_id'], ),
+    sa.PrimaryKeyConstraint('warehouse_id', 'material_id')
+    )
+    op.create_index('ix_stock_valuation_material_id', 'stock_valuation', ['material_id'], unique=False)
+
+    op.create_table('stock_cost_layers',
+    sa.Column('layer_id', sa.BigInteger(), autoincrement=True, nullable=False),
+    sa.Column('warehouse_id', sa.Integer(), nullable=False),
+    sa.Column('material_id', sa.Integer(), nullable=False),
+    sa.Column('received_date', sa.Date(), nullable=False),
+    sa.Column('qty', sa.Numeric(), nullable=False),
+    sa.Column('unit_cost', sa.Numeric(), nullable=False),
+    sa.ForeignKeyConstraint(['material_id'], ['materials.material_id'], ),
+    sa.ForeignKeyConstraint(['warehouse_id'], ['warehouses.warehouse_id'], ),
+    sa.PrimaryKeyConstraint('layer_id')
+    )
+    op.create_index(
+        'ix_stock_cost_layers_wh_material_layer',
+        'stock_cost_layers',
+        ['warehouse_id', 'material_id', 'layer_id'],
+        unique=False,
+    )
+    op.create_index('ix_stock_cost_layers_material_id', 'stock_cost_layers', ['material_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_stock_cost_layers_material_id', table_name='stock_cost_layers')
+    op.drop_index('ix_stock_cost_layers_wh_material_layer', table_name='stock_cost_layers')
+    op.drop_table('stock_cost_layers')
+    op.drop_index('ix_stock_valuation_material_id', table_name='stock_valuation')
+    op.drop_table('stock_valuation')
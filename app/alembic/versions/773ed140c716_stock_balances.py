@@ -0,0 +1,70 @@
+"""stock balances
+
+Revision ID: 773ed140c716
+Revises: 9be161fa8ad4
+Create Date: 2026-10-16 10:12:41.417203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '773ed140c716'
+down_revision: Union[str, Sequence[str], None] = '9be161fa8ad4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # колонки, которые уже есть в schemas.StockMovementCreate,
+    # но не попали в первую миграцию
+    op.add_column('stock_movements', sa.Column('project_id', sa.Integer(), nullable=True))
+    op.add_column('stock_movements', sa.Column('driver_name', sa.String(), nullable=True))
+    op.add_column('stock_movements', sa.Column('file_mime', sa.String(), nullable=True))
+    op.add_column('stock_movements', sa.Column('file_hash', sa.String(), nullable=True))
+    op.create_foreign_key(
+        'stock_movements_project_id_fkey',
+        'stock_movements', 'projects',
+        ['project_id'], ['project_id'],
+    )
+
+    op.create_table('stock_balances',
+    sa.Column('warehouse_id', sa.Integer(), nullable=False),
+    sa.Column('material_id', sa.Integer(), nullable=False),
+    sa.Column('qty', sa.Numeric(), nullable=False),
+    sa.ForeignKeyConstraint(['material_id'], ['materials.material_id'], ),
+    sa.ForeignKeyConstraint(['warehouse_id'], ['warehouses.warehouse_id'], ),
+    sa.PrimaryKeyConstraint('warehouse_id', 'material_id')
+    )
+
+    # первичное заполнение остатков по уже накопленному журналу
+    op.execute(
+        """
+        INSERT INTO stock_balances (warehouse_id, material_id, qty)
+        SELECT warehouse_id, material_id, SUM(qty)
+        FROM (
+            SELECT to_warehouse_id AS warehouse_id, material_id, qty
+            FROM stock_movements
+            WHERE to_warehouse_id IS NOT NULL
+            UNION ALL
+            SELECT from_warehouse_id, material_id, -qty
+            FROM stock_movements
+            WHERE from_warehouse_id IS NOT NULL
+        ) AS journal
+        GROUP BY warehouse_id, material_id
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('stock_balances')
+    op.drop_constraint('stock_movements_project_id_fkey', 'stock_movements', type_='foreignkey')
+    op.drop_column('stock_movements', 'file_hash')
+    op.drop_column('stock_movements', 'file_mime')
+    op.drop_column('stock_movements', 'driver_name')
+    op.drop_column('stock_movements', 'project_id')
@@ -0,0 +1,46 @@
+"""stock balance snapshots
+
+Revision ID: 8d41f0a6c2b9
+Revises: 5b7e2c18d4a3
+Create Date: 2026-10-17 18:47:53.604127
+
+Снимки остатков на конец месяца (stock_balance_snapshots) и реестр закрытых
+периодов (stock_snapshot_periods) для GET /stock-balances?as_of=... (snapshots.py).
+Таблицы создаются пустыми; снимки по накопленному журналу: python -m snapshots.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d41f0a6c2b9'
+down_revision: Union[str, Sequence[str], None] = '5b7e2c18d4a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('stock_snapshot_periods',
+    sa.Column('period_end', sa.Date(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('period_end')
+    )
+    op.create_table('stock_balance_snapshots',
+    sa.Column('period_end', sa.Date(), nullable=False),
+    sa.Column('warehouse_id', sa.Integer(), nullable=False),
+    sa.Column('material_id', sa.Integer(), nullable=False),
+    sa.Column('qty', sa.Numeric(), nullable=False),
+    sa.ForeignKeyConstraint(['period_end'], ['stock_snapshot_periods.period_end'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['material_id'], ['materials.material_id'], ),
+    sa.ForeignKeyConstraint(['warehouse_id'], ['warehouses.warehouse_id'], ),
+    sa.PrimaryKeyConstraint('period_end', 'warehouse_id', 'material_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('stock_balance_snapshots')
+    op.drop_table('stock_snapshot_periods')
@@ -0,0 +1,72 @@
+"""materials search
+
+Revision ID: a41f7c2d9e58
+Revises: cd0bb090c0cd
+Create Date: 2026-10-17 09:12:37.640215
+
+Индексы под GET /materials/search:
+- GIN (gin_trgm_ops) по name и sku — поиск по фрагментам и с опечатками
+  (ILIKE '%...%', операторы pg_trgm % и <%);
+- btree (lower(...) COLLATE "C") по sku и name — автодополнение
+  LIKE 'префикс%': первые N строк читаются из индекса уже в нужном порядке,
+  сколько бы материалов ни подходило под префикс. С text_pattern_ops
+  диапазон по префиксу тоже есть, но ORDER BY по нему не идёт — пришлось бы
+  сортировать все совпадения.
+
+pg_trgm входит в contrib (есть в образе postgres:16) и является доверенным
+расширением — создать его может владелец базы.
+
+Индексы строятся через CREATE INDEX CONCURRENTLY (как в 1f539339da03).
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a41f7c2d9e58'
+down_revision: Union[str, Sequence[str], None] = 'cd0bb090c0cd'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (имя, колонки, доп. параметры) — все индексы на materials
+INDEXES = [
+    ('ix_materials_name_trgm', ['name'],
+     {'postgresql_using': 'gin', 'postgresql_ops': {'name': 'gin_trgm_ops'}}),
+    ('ix_materials_sku_trgm', ['sku'],
+     {'postgresql_using': 'gin', 'postgresql_ops': {'sku': 'gin_trgm_ops'}}),
+    ('ix_materials_sku_prefix', [sa.text('(lower(sku) COLLATE "C")')], {}),
+    ('ix_materials_name_prefix', [sa.text('(lower(name) COLLATE "C")')], {}),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции
+    with op.get_context().autocommit_block():
+        for name, columns, kwargs in INDEXES:
+            op.create_index(
+                name,
+                'materials',
+                columns,
+                unique=False,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+                **kwargs,
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, _, _ in reversed(INDEXES):
+            op.drop_index(
+                name,
+                table_name='materials',
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
+    # расширение не удаляем: им могут пользоваться и другие объекты базы
@@ -0,0 +1,54 @@
+"""prices as of index
+
+Revision ID: c9ca9006e51e
+Revises: a41f7c2d9e58
+Create Date: 2026-10-17 14:05:41.577691
+
+Индекс под GET /prices/as-of: (supplier_id, material_id, price_date DESC) —
+ровно порядок DISTINCT ON (supplier_id, material_id) ... ORDER BY price_date DESC,
+так что цена пары на дату — одна проба индекса, а страница пар читается
+без сортировки. uq_supplier_price_date (те же колонки, но price_date ASC)
+так не используется: смешанный порядок потребовал бы сортировки.
+
+Строится через CREATE INDEX CONCURRENTLY (как в 1f539339da03).
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c9ca9006e51e'
+down_revision: Union[str, Sequence[str], None] = 'a41f7c2d9e58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDEX = 'ix_supplier_material_prices_supplier_material_date'
+TABLE = 'supplier_material_prices'
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции
+    with op.get_context().autocommit_block():
+        op.create_index(
+            INDEX,
+            TABLE,
+            ['supplier_id', 'material_id', sa.text('price_date DESC')],
+            unique=False,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            INDEX,
+            table_name=TABLE,
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
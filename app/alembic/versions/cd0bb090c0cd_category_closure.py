@@ -0,0 +1,122 @@
+"""category closure
+
+Revision ID: cd0bb090c0cd
+Revises: 3d87de7c0bde
+Create Date: 2026-10-16 23:41:12.504118
+
+Таблица замыкания иерархии категорий: строка (ancestor_id, descendant_id, depth)
+на каждую пару "предок — потомок", включая саму категорию (depth = 0).
+Поддерево любой глубины — один индексный join по ancestor_id.
+
+Синхронизация — триггерами на categories:
+- AFTER INSERT: пути от всех предков родителя + (сама, сама, 0);
+- AFTER UPDATE OF parent_id: пути поддерева от старых предков удаляются,
+  от новых — добавляются; перенос в собственное поддерево запрещён.
+Существующие категории заполняются рекурсивным запросом по parent_id.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'cd0bb090c0cd'
+down_revision: Union[str, Sequence[str], None] = '3d87de7c0bde'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+BACKFILL = """
+    INSERT INTO category_closure (ancestor_id, descendant_id, depth)
+    WITH RECURSIVE paths (ancestor_id, descendant_id, depth) AS (
+        SELECT category_id, category_id, 0 FROM categories
+        UNION ALL
+        SELECT p.ancestor_id, c.category_id, p.depth + 1
+        FROM paths p
+        JOIN categories c ON c.parent_id = p.descendant_id
+    )
+    SELECT ancestor_id, descendant_id, depth FROM paths
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'category_closure',
+        sa.Column('ancestor_id', sa.Integer(), nullable=False),
+        sa.Column('descendant_id', sa.Integer(), nullable=False),
+        sa.Column('depth', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['ancestor_id'], ['categories.category_id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['descendant_id'], ['categories.category_id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('ancestor_id', 'descendant_id'),
+    )
+    op.create_index('ix_category_closure_descendant_id', 'category_closure', ['descendant_id'])
+    op.execute(BACKFILL)
+
+    op.execute(
+        """
+        CREATE FUNCTION category_closure_insert() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO category_closure (ancestor_id, descendant_id, depth)
+            SELECT ancestor_id, NEW.category_id, depth + 1
+            FROM category_closure
+            WHERE descendant_id = NEW.parent_id
+            UNION ALL
+            SELECT NEW.category_id, NEW.category_id, 0;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE FUNCTION category_closure_move() RETURNS trigger AS $$
+        BEGIN
+            IF NEW.parent_id IS NOT NULL AND EXISTS (
+                SELECT 1 FROM category_closure
+                WHERE ancestor_id = NEW.category_id AND descendant_id = NEW.parent_id
+            ) THEN
+                RAISE EXCEPTION 'category % cannot be moved into its own subtree', NEW.category_id
+                    USING ERRCODE = 'check_violation';
+            END IF;
+
+            -- пути от прежних предков ко всему поддереву
+            DELETE FROM category_closure
+            WHERE descendant_id IN (
+                    SELECT descendant_id FROM category_closure WHERE ancestor_id = NEW.category_id
+                )
+              AND ancestor_id NOT IN (
+                    SELECT descendant_id FROM category_closure WHERE ancestor_id = NEW.category_id
+                );
+
+            -- пути от новых предков ко всему поддереву
+            INSERT INTO category_closure (ancestor_id, descendant_id, depth)
+            SELECT a.ancestor_id, d.descendant_id, a.depth + d.depth + 1
+            FROM category_closure a
+            JOIN category_closure d ON d.ancestor_id = NEW.category_id
+            WHERE a.descendant_id = NEW.parent_id;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        "CREATE TRIGGER categories_closure_insert AFTER INSERT ON categories "
+        "FOR EACH ROW EXECUTE FUNCTION category_closure_insert()"
+    )
+    op.execute(
+        "CREATE TRIGGER categories_closure_move AFTER UPDATE OF parent_id ON categories "
+        "FOR EACH ROW WHEN (OLD.parent_id IS DISTINCT FROM NEW.parent_id) "
+        "EXECUTE FUNCTION category_closure_move()"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS categories_closure_move ON categories")
+    op.execute("DROP TRIGGER IF EXISTS categories_closure_insert ON categories")
+    op.execute("DROP FUNCTION IF EXISTS category_closure_move()")
+    op.execute("DROP FUNCTION IF EXISTS category_closure_insert()")
+    op.drop_index('ix_category_closure_descendant_id', table_name='category_closure')
+    op.drop_table('category_closure')
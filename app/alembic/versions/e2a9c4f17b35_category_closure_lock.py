@@ -0,0 +1,87 @@
+"""category closure lock
+
+Revision ID: e2a9c4f17b35
+Revises: 8d41f0a6c2b9
+Create Date: 2026-10-17 20:12:36.881402
+
+Триггеры category_closure (cd0bb090c0cd) проверяли "перенос в собственное
+поддерево" по снимку без блокировки: два параллельных переноса A под B
+и B под A оба проходили проверку и вместе давали цикл parent_id и ложные
+строки замыкания. Теперь оба триггера первым делом берут
+LOCK TABLE category_closure IN SHARE ROW EXCLUSIVE MODE (режим конфликтует
+сам с собой): переносы и вставки категорий выполняются по очереди, а проверка
+(новый снимок на каждый запрос функции) видит уже закоммиченные переносы.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2a9c4f17b35'
+down_revision: Union[str, Sequence[str], None] = '8d41f0a6c2b9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+LOCK = "LOCK TABLE category_closure IN SHARE ROW EXCLUSIVE MODE;"
+
+INSERT_FUNCTION = """
+    CREATE OR REPLACE FUNCTION category_closure_insert() RETURNS trigger AS $$
+    BEGIN
+        {lock}
+        INSERT INTO category_closure (ancestor_id, descendant_id, depth)
+        SELECT ancestor_id, NEW.category_id, depth + 1
+        FROM category_closure
+        WHERE descendant_id = NEW.parent_id
+        UNION ALL
+        SELECT NEW.category_id, NEW.category_id, 0;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+"""
+
+MOVE_FUNCTION = """
+    CREATE OR REPLACE FUNCTION category_closure_move() RETURNS trigger AS $$
+    BEGIN
+        {lock}
+        IF NEW.parent_id IS NOT NULL AND EXISTS (
+            SELECT 1 FROM category_closure
+            WHERE ancestor_id = NEW.category_id AND descendant_id = NEW.parent_id
+        ) THEN
+            RAISE EXCEPTION 'category % cannot be moved into its own subtree', NEW.category_id
+                USING ERRCODE = 'check_violation';
+        END IF;
+
+        -- пути от прежних предков ко всему поддереву
+        DELETE FROM category_closure
+        WHERE descendant_id IN (
+                SELECT descendant_id FROM category_closure WHERE ancestor_id = NEW.category_id
+            )
+          AND ancestor_id NOT IN (
+                SELECT descendant_id FROM category_closure WHERE ancestor_id = NEW.category_id
+            );
+
+        -- пути от новых предков ко всему поддереву
+        INSERT INTO category_closure (ancestor_id, descendant_id, depth)
+        SELECT a.ancestor_id, d.descendant_id, a.depth + d.depth + 1
+        FROM category_closure a
+        JOIN category_closure d ON d.ancestor_id = NEW.category_id
+        WHERE a.descendant_id = NEW.parent_id;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(INSERT_FUNCTION.format(lock=LOCK))
+    op.execute(MOVE_FUNCTION.format(lock=LOCK))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute(INSERT_FUNCTION.format(lock=""))
+    op.execute(MOVE_FUNCTION.format(lock=""))
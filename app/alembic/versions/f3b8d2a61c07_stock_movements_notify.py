@@ -0,0 +1,55 @@
+"""stock movements notify
+
+Revision ID: f3b8d2a61c07
+Revises: e2a9c4f17b35
+Create Date: 2026-10-17 21:05:19.342871
+
+Уведомление о записи в stock_movements для сброса кэшей отчётов во всех
+воркерах: NOTIFY table_changes, 'stock_movements' (триггер уровня оператора,
+одно уведомление на INSERT / UPDATE / DELETE / TRUNCATE; одинаковые
+уведомления в транзакции Postgres склеивает).
+
+Версия в table_versions (как у справочников, 3e3f4e28e515) здесь не ведётся:
+её строка обновлялась бы каждой транзакцией с движением и держалась бы
+заблокированной до commit — все записи движений шли бы строго по очереди.
+Канал table_changes — для таких таблиц без версии: '<таблица>' или
+'<таблица>:<ключ>' (см. refcache.py).
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3b8d2a61c07'
+down_revision: Union[str, Sequence[str], None] = 'e2a9c4f17b35'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(
+        """
+        CREATE FUNCTION notify_table_change() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('table_changes', TG_TABLE_NAME);
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """
+    )
+    # на секционированной таблице триггер уровня оператора срабатывает
+    # для операций над родительской таблицей
+    op.execute(
+        "CREATE TRIGGER stock_movements_notify "
+        "AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON stock_movements "
+        "FOR EACH STATEMENT EXECUTE FUNCTION notify_table_change()"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS stock_movements_notify ON stock_movements")
+    op.execute("DROP FUNCTION IF EXISTS notify_table_change()")
@@ -0,0 +1,124 @@
+# app/balances.py
+"""
+Поддержка таблицы stock_balances (остатки по складу×материалу).
+
+Правило одно для всех типов движений (IN / OUT / TRANSFER / ADJUST):
+- если указан to_warehouse_id   -> остаток на этом складе увеличивается на qty;
+- если указан from_warehouse_id -> остаток на этом складе уменьшается на qty.
+
+Так IN меняет только склад-получатель, OUT — только склад-отправитель,
+TRANSFER — оба, а ADJUST — тот склад, который указан (qty может быть
+отрицательным).
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+from typing import Dict, Iterable, Tuple
+
+from sqlalchemy import delete, func, insert, literal, select, union_all
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+try:
+    from .db import SessionLocal
+    from . import models
+except ImportError:
+    from db import SessionLocal
+    import models
+
+
+BalanceKey = Tuple[int, int]  # (warehouse_id, material_id)
+
+
+def movement_deltas(movements: Iterable) -> Dict[BalanceKey, Decimal]:
+    """
+    Считает изменения остатков по списку движений.
+    Движение — любой объект с полями from_warehouse_id, to_warehouse_id,
+    material_id и qty (ORM-модель или Pydantic-схема).
+    """
+    deltas: Dict[BalanceKey, Decimal] = defaultdict(Decimal)
+    for mv in movements:
+        qty = Decimal(str(mv.qty))
+        if mv.to_warehouse_id is not None:
+            deltas[(mv.to_warehouse_id, mv.material_id)] += qty
+        if mv.from_warehouse_id is not None:
+            deltas[(mv.from_warehouse_id, mv.material_id)] -= qty
+    return deltas
+
+
+def apply_deltas(db: Session, deltas: Dict[BalanceKey, Decimal]) -> None:
+    """
+    Применяет изменения к stock_balances одним INSERT ... ON CONFLICT.
+    Вызывается в той же транзакции, что и вставка движений, коммит делает
+    вызывающий код.
+
+    Ключи сортируются, чтобы параллельные транзакции блокировали строки
+    в одном и том же порядке и не ловили deadlock.
+    """
+    rows = [
+        {"warehouse_id": wh_id, "material_id": mat_id, "qty": qty}
+        for (wh_id, mat_id), qty in sorted(deltas.items())
+        if qty != 0
+    ]
+    if not rows:
+        return
+
+    stmt = pg_insert(models.StockBalance).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[
+            models.StockBalance.warehouse_id,
+            models.StockBalance.material_id,
+        ],
+        set_={"qty": models.StockBalance.qty + stmt.excluded.qty},
+    )
+    db.execute(stmt)
+
+
+def apply_movements(db: Session, movements: Iterable) -> None:
+    """
+    Обновляет остатки по списку только что вставленных движений.
+    """
+    apply_deltas(db, movement_deltas(movements))
+
+
+def rebuild(db: Session) -> None:
+    """
+    Полностью пересчитывает stock_balances по журналу движений.
+    Нужен для первичного заполнения и для сверки, в обычной работе
+    остатки поддерживаются инкрементально.
+    """
+    mv = models.StockMovement
+    incoming = select(
+        mv.to_warehouse_id.label("warehouse_id"),
+        mv.material_id.label("material_id"),
+        mv.qty.label("qty"),
+    ).where(mv.to_warehouse_id.is_not(None))
+    outgoing = select(
+        mv.from_warehouse_id.label("warehouse_id"),
+        mv.material_id.label("material_id"),
+        (literal(0) - mv.qty).label("qty"),
+    ).where(mv.from_warehouse_id.is_not(None))
+    journal = union_all(incoming, outgoing).subquery()
+
+    db.execute(delete(models.StockBalance))
+    db.execute(
+        insert(models.StockBalance).from_select(
+            ["warehouse_id", "material_id", "qty"],
+            select(
+                journal.c.warehouse_id,
+                journal.c.material_id,
+                func.sum(journal.c.qty),
+            ).group_by(journal.c.warehouse_id, journal.c.material_id),
+        )
+    )
+
+
+if __name__ == "__main__":
+    # python -m balances  — пересчитать остатки по всему журналу
+    session = SessionLocal()
+    try:
+        rebuild(session)
+        session.commit()
+        print("Stock balances rebuilt.")
+    finally:
+        session.close()
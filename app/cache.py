@@ -0,0 +1,76 @@
+# app/cache.py
+"""
+Простой кэш в памяти процесса для отчётов.
+
+Каждый воркер uvicorn держит свой кэш. Запись, сделанная этим воркером,
+сбрасывает кэш сразу (invalidate()); записи других воркеров и служебных
+команд приходят через LISTEN/NOTIFY (refcache.subscribe) и тоже сбрасывают
+кэш во всех воркерах. Пока подписки нет (старт, обрыв соединения), кэш
+не читается вовсе (refcache.is_coherent()). ttl ограничивает устаревание
+только для записей без NOTIFY — например, пересчёта python -m valuation
+или python -m balances.
+
+Защита от гонки "отчёт считался, пока шла запись": значение кладётся
+в кэш только если с момента начала расчёта не было invalidate()
+(см. generation).
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+# время жизни записей отчётов, сек.
+REPORT_CACHE_TTL = float(os.getenv("REPORT_CACHE_TTL", "30"))
+# сколько разных наборов фильтров держать на отчёт
+REPORT_CACHE_SIZE = int(os.getenv("REPORT_CACHE_SIZE", "256"))
+
+
+class TTLCache:
+    """
+    LRU-кэш с ограничением по размеру и времени жизни записей.
+    """
+
+    def __init__(self, ttl: float = REPORT_CACHE_TTL, maxsize: int = REPORT_CACHE_SIZE):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.generation = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, generation: Optional[int] = None) -> None:
+        """
+        generation — значение self.generation, прочитанное до расчёта value;
+        если с тех пор кэш сбрасывали, value устарело и не сохраняется.
+        """
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        """Сбросить одну запись (key) или весь кэш."""
+        with self._lock:
+            self.generation += 1
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
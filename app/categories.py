@@ -0,0 +1,170 @@
+# app/categories.py
+"""
+Иерархия категорий материалов на таблице замыкания category_closure.
+
+category_closure хранит все пары предок — потомок (и саму категорию с depth = 0)
+и поддерживается триггерами на categories (миграция cd0bb090c0cd): вставка
+и перенос (смена parent_id) обновляют её в той же транзакции. Поэтому
+"всё поддерево категории" — один join по индексу, независимо от глубины.
+
+python -m categories — пересобрать category_closure по parent_id (для сверки).
+"""
+
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import delete, distinct, func, select, text
+from sqlalchemy.orm import Session
+
+try:
+    from .db import SessionLocal
+    from . import models
+except ImportError:
+    from db import SessionLocal
+    import models
+
+
+def build_tree(categories: Iterable) -> List[dict]:
+    """
+    Вложенное дерево из плоского списка категорий (по одному проходу).
+    Узел: category_id, name, parent_id, children.
+    """
+    nodes: Dict[int, dict] = {}
+    for category in categories:
+        nodes[category.category_id] = {
+            "category_id": category.category_id,
+            "name": category.name,
+            "parent_id": category.parent_id,
+            "children": [],
+        }
+
+    roots = []
+    for node in nodes.values():
+        parent = nodes.get(node["parent_id"])
+        if parent is None:
+            roots.append(node)
+        else:
+            parent["children"].append(node)
+    return roots
+
+
+def subtree_ids(category_id: int):
+    """SELECT id всех категорий поддерева (включая саму категорию)."""
+    closure = models.CategoryClosure
+    return select(closure.descendant_id).where(closure.ancestor_id == category_id)
+
+
+def materials_query(category_id: int, recursive: bool = False):
+    """Материалы категории; recursive — вместе со всеми подкатегориями."""
+    material = models.Material
+    if not recursive:
+        return select(material).where(material.category_id == category_id)
+    closure = models.CategoryClosure
+    return (
+        select(material)
+        .join(closure, closure.descendant_id == material.category_id)
+        .where(closure.ancestor_id == category_id)
+    )
+
+
+def stock_rollup_query(
+    warehouse_id: Optional[int] = None,
+    project_id: Optional[int] = None,
+):
+    """
+    Остатки, свёрнутые по поддеревьям: для каждой категории — суммы остатков
+    материалов её самой и всех подкатегорий, отдельно по каждой единице
+    измерения (строка на категорию×единицу; категория без остатков — одна
+    строка с unit_id NULL). Собрать ответ — group_rollup.
+    """
+    closure = models.CategoryClosure
+    material = models.Material
+    balance = models.StockBalance
+    category = models.Category
+    unit = models.Unit
+
+    rollup = (
+        select(
+            closure.ancestor_id.label("category_id"),
+            material.unit_id,
+            func.sum(balance.qty).label("qty"),
+            func.count(distinct(balance.material_id)).label("materials"),
+        )
+        .join(material, material.category_id == closure.descendant_id)
+        .join(balance, balance.material_id == material.material_id)
+        .group_by(closure.ancestor_id, material.unit_id)
+    )
+    if warehouse_id is not None:
+        rollup = rollup.where(balance.warehouse_id == warehouse_id)
+    if project_id is not None:
+        rollup = rollup.join(
+            models.Warehouse, models.Warehouse.warehouse_id == balance.warehouse_id
+        ).where(models.Warehouse.project_id == project_id)
+    rollup = rollup.subquery("rollup")
+
+    return (
+        select(
+            category.category_id,
+            category.name,
+            category.parent_id,
+            rollup.c.unit_id,
+            unit.symbol,
+            rollup.c.qty,
+            rollup.c.materials,
+        )
+        .outerjoin(rollup, rollup.c.category_id == category.category_id)
+        .outerjoin(unit, unit.unit_id == rollup.c.unit_id)
+        .order_by(category.category_id, rollup.c.unit_id)
+    )
+
+
+def group_rollup(rows: Iterable) -> List[dict]:
+    """Строки stock_rollup_query -> категории со списком units (по порядку строк)."""
+    result: Dict[int, dict] = {}
+    for row in rows:
+        node = result.setdefault(row.category_id, {
+            "category_id": row.category_id,
+            "name": row.name,
+            "parent_id": row.parent_id,
+            "materials": 0,
+            "units": [],
+        })
+        if row.unit_id is not None:
+            node["materials"] += row.materials
+            node["units"].append({
+                "unit_id": row.unit_id,
+                "symbol": row.symbol,
+                "qty": row.qty,
+                "materials": row.materials,
+            })
+    return list(result.values())
+
+
+def rebuild(db: Session) -> None:
+    """Пересобрать category_closure целиком рекурсивным обходом parent_id."""
+    db.execute(delete(models.CategoryClosure))
+    db.execute(
+        text(
+            """
+            INSERT INTO category_closure (ancestor_id, descendant_id, depth)
+            WITH RECURSIVE paths (ancestor_id, descendant_id, depth) AS (
+                SELECT category_id, category_id, 0 FROM categories
+                UNION ALL
+                SELECT p.ancestor_id, c.category_id, p.depth + 1
+                FROM paths p
+                JOIN categories c ON c.parent_id = p.descendant_id
+            )
+            SELECT ancestor_id, descendant_id, depth FROM paths
+            """
+        )
+    )
+
+
+if __name__ == "__main__":
+    # python -m categories  — пересобрать таблицу замыкания категорий
+    session = SessionLocal()
+    try:
+        rebuild(session)
+        session.commit()
+        print("Category closure rebuilt.")
+    finally:
+        session.close()
@@ -0,0 +1,77 @@
+# app/etags.py
+"""
+Условные GET для списков: ETag / Last-Modified по версии таблицы.
+
+Версия таблицы (table_versions, см. refcache.py) меняется при каждой записи,
+поэтому ETag = имя таблицы + версия. Клиент присылает If-None-Match
+(или If-Modified-Since) — если версия не изменилась, отвечаем 304
+без запроса списка и без сериализации. Сама версия берётся из памяти
+воркера, так что 304 обходится без обращения к БД.
+
+ETag один на все страницы и фильтры таблицы: HTTP-кэш клиента и так
+хранит ответы по полному URL.
+"""
+
+from datetime import datetime
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+
+from fastapi import Request, Response, status
+
+try:
+    from . import refcache
+except ImportError:
+    import refcache
+
+
+def make_etag(table: str, version: int) -> str:
+    return f'"{table}-{version}"'
+
+
+def _matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # сравнение слабое: W/"x" и "x" считаются одинаковыми
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in candidates
+
+
+def _not_modified_since(if_modified_since: str, updated_at: datetime) -> bool:
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        return False
+    # в HTTP-датах нет долей секунды
+    return updated_at.replace(microsecond=0) <= since
+
+
+async def check(request: Request, response: Response, db, table: str) -> Optional[Response]:
+    """
+    Ставит ETag / Last-Modified на ответ. Если клиентская копия актуальна,
+    возвращает готовый ответ 304 — обработчик должен вернуть его сразу.
+    """
+    current = await refcache.table_version(db, table)
+    if current is None:
+        return None
+    version, updated_at = current
+
+    headers = {
+        "ETag": make_etag(table, version),
+        "Last-Modified": format_datetime(updated_at, usegmt=True),
+        # клиент может хранить ответ, но обязан перепроверять его (If-None-Match)
+        "Cache-Control": "no-cache",
+    }
+    response.headers.update(headers)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        fresh = _matches(if_none_match, headers["ETag"])
+    else:
+        if_modified_since = request.headers.get("if-modified-since")
+        fresh = if_modified_since is not None and _not_modified_since(if_modified_since, updated_at)
+
+    if fresh:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return None
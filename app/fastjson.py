@@ -0,0 +1,69 @@
+# app/fastjson.py
+"""
+Быстрый путь ответа для больших списков: колонки -> dict -> orjson.
+
+Обычный путь FastAPI для response_model=List[Schema]: ORM-объекты
+(гидратация, identity map) -> валидация каждого объекта схемой
+(from_attributes) -> jsonable_encoder -> json.dumps. На страницах в тысячи
+строк почти всё время CPU уходит туда.
+
+Здесь:
+- SELECT только колонок схемы, в порядке её полей (ключи JSON те же, что
+  у обычного ответа), без ORM-объектов;
+- строки сразу в dict и в JSON через orjson;
+- обработчик возвращает готовый Response — FastAPI не валидирует его повторно,
+  а response_model остаётся в декораторе только для OpenAPI (схема та же).
+
+Типы колонок совпадают с полями схем, поэтому валидация не нужна;
+Numeric (Decimal) отдаётся числом, как float-поля схем.
+Сравнение путей — bench/serialization.py.
+"""
+
+from decimal import Decimal
+from typing import Any, Iterable, Optional, Sequence
+
+import orjson
+from fastapi import Response
+from sqlalchemy import select
+
+try:
+    from .pagination import Page
+except ImportError:
+    from pagination import Page
+
+
+MEDIA_TYPE = "application/json"
+
+
+def columns(schema, table) -> list:
+    """Колонки таблицы в порядке полей схемы."""
+    return [table.c[name] for name in schema.model_fields]
+
+
+def select_schema(schema, model):
+    """SELECT колонок модели, которые есть в схеме ответа."""
+    return select(*columns(schema, model.__table__))
+
+
+def default(value: Any):
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps_rows(keys: Sequence[str], rows: Iterable[Sequence[Any]]) -> bytes:
+    """JSON-массив объектов из строк-кортежей."""
+    return orjson.dumps([dict(zip(keys, row)) for row in rows], default=default)
+
+
+def rows_response(keys: Sequence[str], rows, headers: Optional[dict] = None) -> Response:
+    return Response(content=dumps_rows(keys, rows), media_type=MEDIA_TYPE, headers=headers)
+
+
+async def fetch_page(page: Page, db, stmt, *key_columns) -> Response:
+    """
+    Страница колонок stmt (см. select_schema) готовым JSON-ответом;
+    X-Next-Cursor и другие заголовки, выставленные на page.response, переносятся.
+    """
+    rows = await page.fetch_rows(db, stmt, *key_columns)
+    return rows_response(list(stmt.selected_columns.keys()), rows, dict(page.response.headers))
@@ -1,41 +1,64 @@
 # app/main.py
 
-from typing import List
+from contextlib import asynccontextmanager
+from datetime import date
+from typing import List, Literal, Optional
 
-from fastapi import FastAPI, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, status
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 
 # Пытаемся сначала импортировать как пакет (когда запускаем app.main),
 # если не получится — как обычные модули (когда в Docker запускаем main.py)
 try:
-    from .db import SessionLocal
-    from . import models, schemas
+    from .db import AsyncSessionLocal, async_engine, engine, pool_status
+    from . import balances, categories, etags, export, fastjson, metrics, models, movements, offers, purchasing, refcache, reports, schemas, search, slowlog, snapshots, valuation
+    from .pagination import Page
 except ImportError:
-    from db import SessionLocal
-    import models, schemas
+    from db import AsyncSessionLocal, async_engine, engine, pool_status
+    import balances, categories, etags, export, fastjson, metrics, models, movements, offers, purchasing, refcache, reports, schemas, search, slowlog, snapshots, valuation
+    from pagination import Page
 
 
-def get_db():
+async def get_db():
     """
     Зависимость FastAPI для работы с БД.
-    На каждый запрос создаётся сессия и потом закрывается.
+    На каждый запрос создаётся асинхронная сессия и потом закрывается.
     """
-    db = SessionLocal()
-    try:
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # подписка на изменения справочников (сброс кэша во всех воркерах)
+    refcache.start()
+    yield
+    await refcache.stop()
+    # соединения asyncpg привязаны к event loop — закрываем их вместе с приложением
+    await async_engine.dispose()
 
 
 app = FastAPI(
     title="Warehouse Backend",
     description="API для складского учета строительных материалов",
     version="1.0.0",
+    lifespan=lifespan,
 )
+# время ответа, SQL-запросы и строки по маршрутам — GET /metrics
+app.add_middleware(metrics.MetricsMiddleware)
+metrics.instrument(async_engine, engine)
+# журнал медленных запросов (если задан SLOW_QUERY_MS) — GET /debug/slow-queries
+slowlog.instrument(async_engine, engine)
+# сброс кэшей отчётов и предложений по изменениям из любого воркера (LISTEN в refcache)
+refcache.subscribe(reports.STOCK_TABLES, reports.on_change)
+refcache.subscribe(offers.OFFER_TABLES, offers.on_change)
 
 
 @app.get("/ping")
-def ping():
+async def ping():
     """
     Простой эндпоинт-проверка, что сервер жив.
     Не трогает базу данных.
@@ -43,10 +66,19 @@ def ping():
     return {"status": "ok"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """
+    Метрики этого воркера в текстовом формате Prometheus (см. metrics.py).
+    Не трогает базу данных.
+    """
+    return Response(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+
 # ===== UNITS =====
 
 @app.post("/units", response_model=schemas.Unit, status_code=status.HTTP_201_CREATED)
-def create_unit(unit_in: schemas.UnitCreate, db: Session = Depends(get_db)):
+async def create_unit(unit_in: schemas.UnitCreate, db: AsyncSession = Depends(get_db)):
     """
     Создание единицы измерения (шт, м, кг и т.п.).
     """
@@ -55,24 +87,25 @@ def create_unit(unit_in: schemas.UnitCreate, db: Session = Depends(get_db)):
         symbol=unit_in.symbol,
     )
     db.add(unit)
-    db.commit()
-    db.refresh(unit)
+    await db.commit()
+    await db.refresh(unit)
+    refcache.invalidate("units")
     return unit
 
 
 @app.get("/units", response_model=List[schemas.Unit])
-def list_units(db: Session = Depends(get_db)):
+async def list_units(page: Page = Depends(), db: AsyncSession = Depends(get_db)):
     """
-    Список всех единиц измерения.
+    Список единиц измерения (постранично, курсор в X-Next-Cursor, из кэша справочников).
     """
-    units = db.query(models.Unit).order_by(models.Unit.unit_id).all()
+    units = await refcache.fetch_page(page, db, models.Unit, models.Unit.unit_id)
     return units
 
 
 # ===== CATEGORIES =====
 
 @app.post("/categories", response_model=schemas.Category, status_code=status.HTTP_201_CREATED)
-def create_category(category_in: schemas.CategoryCreate, db: Session = Depends(get_db)):
+async def create_category(category_in: schemas.CategoryCreate, db: AsyncSession = Depends(get_db)):
     """
     Создание категории материалов (кабель, труба, арматура и т.п.).
     parent_id можно оставить пустым для корневых категорий.
@@ -82,24 +115,134 @@ def create_category(category_in: schemas.CategoryCreate, db: Session = Depends(g
         parent_id=category_in.parent_id,
     )
     db.add(category)
-    db.commit()
-    db.refresh(category)
+    await db.commit()
+    await db.refresh(category)
+    refcache.invalidate("categories")
     return category
 
 
 @app.get("/categories", response_model=List[schemas.Category])
-def list_categories(db: Session = Depends(get_db)):
+async def list_categories(page: Page = Depends(), db: AsyncSession = Depends(get_db)):
     """
-    Список всех категорий.
+    Список категорий (постранично, из кэша справочников).
     """
-    categories = db.query(models.Category).order_by(models.Category.category_id).all()
+    categories = await refcache.fetch_page(page, db, models.Category, models.Category.category_id)
     return categories
 
 
+@app.get("/categories/tree", response_model=List[schemas.CategoryTreeNode])
+async def get_category_tree(db: AsyncSession = Depends(get_db)):
+    """
+    Всё дерево категорий одним ответом (корни и вложенные children).
+    """
+    async def load():
+        rows = (await db.execute(select(models.Category).order_by(models.Category.category_id))).scalars()
+        return categories.build_tree(rows)
+
+    return await refcache.cached("categories", ("tree",), load)
+
+
+@app.get("/categories/stock", response_model=List[schemas.CategoryStock])
+async def get_category_stock(
+    warehouse_id: Optional[int] = None,
+    project_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Остатки по категориям с учётом всех подкатегорий
+    (по одному складу / складам проекта или по всем складам), отдельно
+    по каждой единице измерения.
+    """
+    rows = await db.execute(categories.stock_rollup_query(warehouse_id, project_id))
+    return categories.group_rollup(rows)
+
+
+@app.get("/categories/{category_id}/materials", response_model=List[schemas.Material])
+async def list_category_materials(
+    category_id: int,
+    recursive: bool = False,
+    page: Page = Depends(),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Материалы категории; recursive=true — вместе со всеми подкатегориями
+    (один join по таблице замыкания category_closure).
+    """
+    if await db.get(models.Category, category_id) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Category not found",
+        )
+    rows = await page.fetch(
+        db,
+        categories.materials_query(category_id, recursive),
+        models.Material.material_id,
+    )
+    return rows
+
+
+@app.patch("/categories/{category_id}", response_model=schemas.Category)
+async def update_category(
+    category_id: int,
+    category_in: schemas.CategoryUpdate,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Переименование и перенос категории в другую ветку (вместе с поддеревом).
+    Перенос в собственное поддерево запрещён.
+    """
+    category = await db.get(models.Category, category_id)
+    if category is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Category not found",
+        )
+
+    fields = category_in.model_dump(exclude_unset=True)
+    if fields.get("name") is None:
+        fields.pop("name", None)
+    parent_id = fields.get("parent_id")
+    if parent_id is not None:
+        if await db.get(models.Category, parent_id) is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Parent category not found",
+            )
+        in_subtree = await db.scalar(
+            select(models.CategoryClosure.descendant_id).where(
+                models.CategoryClosure.ancestor_id == category_id,
+                models.CategoryClosure.descendant_id == parent_id,
+            )
+        )
+        if in_subtree is not None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Category cannot be moved into its own subtree",
+            )
+
+    for field, value in fields.items():
+        setattr(category, field, value)
+    try:
+        await db.commit()
+    except IntegrityError:
+        # параллельный перенос успел поставить parent_id в поддерево:
+        # триггер category_closure_move проверяет это под блокировкой
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Category cannot be moved into its own subtree",
+        )
+    await db.refresh(category)
+    refcache.invalidate("categories")
+    # отчёты по категориям считают поддеревья
+    reports.invalidate()
+    return category
+
+
 # ===== SUPPLIERS =====
 
 @app.post("/suppliers", response_model=schemas.Supplier, status_code=status.HTTP_201_CREATED)
-def create_supplier(supplier_in: schemas.SupplierCreate, db: Session = Depends(get_db)):
+async def create_supplier(supplier_in: schemas.SupplierCreate, db: AsyncSession = Depends(get_db)):
     """
     Создание поставщика.
     """
@@ -110,54 +253,135 @@ def create_supplier(supplier_in: schemas.SupplierCreate, db: Session = Depends(g
         bin_iin=supplier_in.bin_iin,
     )
     db.add(supplier)
-    db.commit()
-    db.refresh(supplier)
+    await db.commit()
+    await db.refresh(supplier)
+    refcache.invalidate("suppliers")
     return supplier
 
 
 @app.get("/suppliers", response_model=List[schemas.Supplier])
-def list_suppliers(db: Session = Depends(get_db)):
+async def list_suppliers(
+    request: Request,
+    page: Page = Depends(),
+    db: AsyncSession = Depends(get_db),
+):
     """
-    Список всех поставщиков.
+    Список поставщиков (постранично, из кэша справочников).
+    Поддерживает If-None-Match / If-Modified-Since (304 Not Modified).
     """
-    suppliers = db.query(models.Supplier).order_by(models.Supplier.supplier_id).all()
+    not_modified = await etags.check(request, page.response, db, "suppliers")
+    if not_modified is not None:
+        return not_modified
+    suppliers = await refcache.fetch_page(page, db, models.Supplier, models.Supplier.supplier_id)
     return suppliers
 
 
 # ===== SUPPLIER MATERIALS (номенклатура поставщика) =====
 
 @app.get("/supplier-materials", response_model=List[schemas.SupplierMaterial])
-def list_supplier_materials(db: Session = Depends(get_db)):
+async def list_supplier_materials(page: Page = Depends(), db: AsyncSession = Depends(get_db)):
     """
-    Номенклатура: какие материалы поставляют поставщики.
+    Номенклатура: какие материалы поставляют поставщики (постранично).
     """
-    rows = (
-        db.query(models.SupplierMaterial)
-        .order_by(models.SupplierMaterial.sup_id)
-        .all()
+    rows = await page.fetch(
+        db,
+        select(models.SupplierMaterial),
+        models.SupplierMaterial.sup_id,
     )
     return rows
 
 
 # ===== SUPPLIER MATERIAL PRICES (история цен) =====
 
+@app.post(
+    "/supplier-material-prices",
+    response_model=schemas.SupplierMaterialPrice,
+    status_code=status.HTTP_201_CREATED,
+)
+async def create_supplier_material_price(
+    price_in: schemas.SupplierMaterialPriceCreate,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Новая цена поставщика по материалу на дату.
+    Одна цена на поставщика×материал×дату.
+    """
+    existing = await db.scalar(
+        select(models.SupplierMaterialPrice.price_id).where(
+            models.SupplierMaterialPrice.supplier_id == price_in.supplier_id,
+            models.SupplierMaterialPrice.material_id == price_in.material_id,
+            models.SupplierMaterialPrice.price_date == price_in.price_date,
+        )
+    )
+    if existing:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Price for this supplier, material and date already exists",
+        )
+
+    price = models.SupplierMaterialPrice(
+        supplier_id=price_in.supplier_id,
+        material_id=price_in.material_id,
+        price=price_in.price,
+        currency=price_in.currency,
+        price_date=price_in.price_date,
+    )
+    db.add(price)
+    try:
+        await db.commit()
+    except IntegrityError as e:
+        # параллельный POST той же цены проходит проверку выше и падает на уникальности
+        await db.rollback()
+        duplicate = "uq_supplier_price_date" in str(e.orig)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Price for this supplier, material and date already exists"
+            if duplicate else "Supplier or material not found",
+        )
+    offers.invalidate(price.material_id)
+    return price
+
+
 @app.get("/supplier-material-prices", response_model=List[schemas.SupplierMaterialPrice])
-def list_supplier_material_prices(db: Session = Depends(get_db)):
+async def list_supplier_material_prices(page: Page = Depends(), db: AsyncSession = Depends(get_db)):
     """
-    История цен поставщиков по материалам.
+    История цен поставщиков по материалам (постранично).
     """
-    rows = (
-        db.query(models.SupplierMaterialPrice)
-        .order_by(models.SupplierMaterialPrice.price_id)
-        .all()
+    return await fastjson.fetch_page(
+        page,
+        db,
+        fastjson.select_schema(schemas.SupplierMaterialPrice, models.SupplierMaterialPrice),
+        models.SupplierMaterialPrice.price_id,
+    )
+
+
+@app.get("/prices/as-of", response_model=List[schemas.SupplierMaterialPrice])
+async def prices_as_of(
+    as_of: date = Query(..., alias="date", description="Дата, на которую нужны цены"),
+    supplier_id: Optional[int] = None,
+    material_id: Optional[int] = None,
+    page: Page = Depends(),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Цены поставщиков, действовавшие на дату: по каждой паре поставщик×материал —
+    последняя цена с price_date не позже date. Фильтры по поставщику и материалу;
+    постранично по паре (supplier_id, material_id).
+    """
+    latest = offers.build_prices_as_of_query(as_of, supplier_id, material_id)
+    return await fastjson.fetch_page(
+        page,
+        db,
+        select(*fastjson.columns(schemas.SupplierMaterialPrice, latest)),
+        latest.c.supplier_id,
+        latest.c.material_id,
     )
-    return rows
 
 
 # ===== PROJECTS =====
 
 @app.post("/projects", response_model=schemas.Project, status_code=status.HTTP_201_CREATED)
-def create_project(project_in: schemas.ProjectCreate, db: Session = Depends(get_db)):
+async def create_project(project_in: schemas.ProjectCreate, db: AsyncSession = Depends(get_db)):
     """
     Создание строительного проекта/объекта.
     """
@@ -169,24 +393,25 @@ def create_project(project_in: schemas.ProjectCreate, db: Session = Depends(get_
         address=project_in.address,
     )
     db.add(project)
-    db.commit()
-    db.refresh(project)
+    await db.commit()
+    await db.refresh(project)
+    refcache.invalidate("projects")
     return project
 
 
 @app.get("/projects", response_model=List[schemas.Project])
-def list_projects(db: Session = Depends(get_db)):
+async def list_projects(page: Page = Depends(), db: AsyncSession = Depends(get_db)):
     """
-    Список всех проектов/объектов.
+    Список проектов/объектов (постранично, из кэша справочников).
     """
-    projects = db.query(models.Project).order_by(models.Project.project_id).all()
+    projects = await refcache.fetch_page(page, db, models.Project, models.Project.project_id)
     return projects
 
 
 # ===== WAREHOUSES =====
 
 @app.post("/warehouses", response_model=schemas.Warehouse, status_code=status.HTTP_201_CREATED)
-def create_warehouse(warehouse_in: schemas.WarehouseCreate, db: Session = Depends(get_db)):
+async def create_warehouse(warehouse_in: schemas.WarehouseCreate, db: AsyncSession = Depends(get_db)):
     """
     Создание склада, привязанного к проекту.
     """
@@ -197,17 +422,18 @@ def create_warehouse(warehouse_in: schemas.WarehouseCreate, db: Session = Depend
         type=warehouse_in.type,
     )
     db.add(warehouse)
-    db.commit()
-    db.refresh(warehouse)
+    await db.commit()
+    await db.refresh(warehouse)
+    refcache.invalidate("warehouses")
     return warehouse
 
 
 @app.get("/warehouses", response_model=List[schemas.Warehouse])
-def list_warehouses(db: Session = Depends(get_db)):
+async def list_warehouses(page: Page = Depends(), db: AsyncSession = Depends(get_db)):
     """
-    Список всех складов.
+    Список складов (постранично, из кэша справочников).
     """
-    warehouses = db.query(models.Warehouse).order_by(models.Warehouse.warehouse_id).all()
+    warehouses = await refcache.fetch_page(page, db, models.Warehouse, models.Warehouse.warehouse_id)
     return warehouses
 
 
@@ -218,9 +444,9 @@ def list_warehouses(db: Session = Depends(get_db)):
     response_model=schemas.WarehouseMaterialPolicy,
     status_code=status.HTTP_201_CREATED,
 )
-def create_warehouse_policy(
+async def create_warehouse_policy(
     policy_in: schemas.WarehouseMaterialPolicyCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     """
     Создание политики минимальных остатков по складу и материалу.
@@ -231,52 +457,94 @@ def create_warehouse_policy(
         min_stock=policy_in.min_stock,
     )
     db.add(policy)
-    db.commit()
+    await db.commit()
+    refcache.invalidate("warehouse_material_policy")
+    reports.invalidate()
     return policy
 
 
 @app.get("/warehouse-policies", response_model=List[schemas.WarehouseMaterialPolicy])
-def list_warehouse_policies(db: Session = Depends(get_db)):
-    """
-    Список всех политик минимальных остатков.
+async def list_warehouse_policies(
+    request: Request,
+    page: Page = Depends(),
+    db: AsyncSession = Depends(get_db),
+):
     """
-    policies = db.query(models.WarehouseMaterialPolicy).all()
-    return policies
+    Список политик минимальных остатков (постранично, по ключу склад×материал).
+    Поддерживает If-None-Match / If-Modified-Since (304 Not Modified).
+    """
+    not_modified = await etags.check(request, page.response, db, "warehouse_material_policy")
+    if not_modified is not None:
+        return not_modified
+    return await fastjson.fetch_page(
+        page,
+        db,
+        fastjson.select_schema(schemas.WarehouseMaterialPolicy, models.WarehouseMaterialPolicy),
+        models.WarehouseMaterialPolicy.warehouse_id,
+        models.WarehouseMaterialPolicy.material_id,
+    )
 
 
 # ===== PURCHASE ORDERS =====
 
 @app.post(
     "/purchase-orders",
-    response_model=schemas.PurchaseOrder,
+    response_model=schemas.PurchaseOrderWithItems,
     status_code=status.HTTP_201_CREATED,
 )
-def create_purchase_order(
+async def create_purchase_order(
     po_in: schemas.PurchaseOrderCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     """
-    Создание заявки на поставку (Purchase Order).
+    Создание заявки на поставку (Purchase Order) сразу с позициями (items).
+    Заявка и позиции сохраняются одной транзакцией: либо всё, либо ничего.
+    Каждый материал — не больше одной позиции.
     """
-    po = models.PurchaseOrder(
-        supplier_id=po_in.supplier_id,
-        warehouse_id=po_in.warehouse_id,
-        order_date=po_in.order_date,
-        expected_date=po_in.expected_date,
-        status=po_in.status,
-    )
-    db.add(po)
-    db.commit()
-    db.refresh(po)
-    return po
+    duplicates = purchasing.duplicate_materials(po_in.items)
+    if duplicates:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Duplicate material_id in items: {duplicates}",
+        )
+
+    try:
+        order = await db.run_sync(purchasing.create_order, po_in)
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Supplier, warehouse or material not found",
+        )
+    return order
+
+
+@app.post("/purchase-orders/replenish", response_model=schemas.ReplenishmentPlan)
+async def replenish_purchase_orders(
+    project_id: Optional[int] = None,
+    warehouse_id: Optional[int] = None,
+    category_id: Optional[int] = None,
+    dry_run: bool = False,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Автопополнение: черновики заявок (status DRAFT) на все нехватки ниже min_stock
+    за вычетом уже заказанного по открытым заявкам. Поставщик — с наименьшей
+    суммой заказа max(нехватка, min_order_qty) по последней цене, при равенстве —
+    с меньшим сроком поставки. Одна заявка на поставщик×склад.
+    dry_run=true — только посчитать план, ничего не сохраняя.
+    Фильтры те же, что у /reports/shortages.
+    """
+    return await purchasing.plan_replenishment(db, project_id, warehouse_id, category_id, dry_run)
 
 
 @app.get("/purchase-orders", response_model=List[schemas.PurchaseOrder])
-def list_purchase_orders(db: Session = Depends(get_db)):
+async def list_purchase_orders(page: Page = Depends(), db: AsyncSession = Depends(get_db)):
     """
-    Список всех заявок на поставку.
+    Список заявок на поставку (постранично).
     """
-    orders = db.query(models.PurchaseOrder).order_by(models.PurchaseOrder.po_id).all()
+    orders = await page.fetch(db, select(models.PurchaseOrder), models.PurchaseOrder.po_id)
     return orders
 
 
@@ -287,9 +555,9 @@ def list_purchase_orders(db: Session = Depends(get_db)):
     response_model=schemas.POItem,
     status_code=status.HTTP_201_CREATED,
 )
-def create_po_item(
+async def create_po_item(
     item_in: schemas.POItemCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     """
     Создание позиции в заявке на поставку.
@@ -302,18 +570,22 @@ def create_po_item(
         currency=item_in.currency,
     )
     db.add(item)
-    db.commit()
-    db.refresh(item)
+    await db.commit()
+    await db.refresh(item)
     return item
 
 
 @app.get("/po-items", response_model=List[schemas.POItem])
-def list_po_items(db: Session = Depends(get_db)):
+async def list_po_items(page: Page = Depends(), db: AsyncSession = Depends(get_db)):
     """
-    Список всех позиций во всех заявках.
+    Позиции всех заявок (постранично).
     """
-    items = db.query(models.POItem).order_by(models.POItem.po_item_id).all()
-    return items
+    return await fastjson.fetch_page(
+        page,
+        db,
+        fastjson.select_schema(schemas.POItem, models.POItem),
+        models.POItem.po_item_id,
+    )
 
 
 # ===== STOCK MOVEMENTS =====
@@ -323,9 +595,9 @@ def list_po_items(db: Session = Depends(get_db)):
     response_model=schemas.StockMovement,
     status_code=status.HTTP_201_CREATED,
 )
-def create_stock_movement(
+async def create_stock_movement(
     mv_in: schemas.StockMovementCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     """
     Создание движения по складу:
@@ -356,30 +628,286 @@ def create_stock_movement(
         file_hash=mv_in.file_hash,
     )
     db.add(mv)
-    db.commit()
-    db.refresh(mv)
+    # остатки, снимки и стоимость обновляем в той же транзакции, что и вставку движения
+    await db.run_sync(balances.apply_movements, [mv_in])
+    await db.run_sync(snapshots.apply_movements, [mv_in])
+    await db.run_sync(valuation.apply_movements, [mv_in])
+    await db.commit()
+    reports.invalidate()
+    await db.refresh(mv)
     return mv
 
 
+@app.post(
+    "/stock-movements/bulk",
+    response_model=schemas.StockMovementBulkResult,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {
+                    "schema": {
+                        "type": "array",
+                        "items": {"$ref": "#/components/schemas/StockMovementCreate"},
+                    }
+                },
+                "application/x-ndjson": {
+                    "schema": {"$ref": "#/components/schemas/StockMovementCreate"}
+                },
+            },
+        }
+    },
+)
+async def create_stock_movements_bulk(request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    Массовая загрузка движений: JSON-массив или NDJSON (Content-Type: application/x-ndjson).
+    Вставка идёт пачками, ошибки возвращаются по каждой строке,
+    корректные строки при этом сохраняются.
+    """
+    body = await request.body()
+    try:
+        items = movements.parse_bulk_body(body, request.headers.get("content-type", ""))
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid bulk body: {e}",
+        )
+
+    result = await db.run_sync(movements.bulk_insert, items)
+    if result["inserted"]:
+        reports.invalidate()
+    return result
+
+
+@app.get("/stock-movements/export")
+async def export_stock_movements(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    warehouse_id: Optional[int] = None,
+):
+    """
+    Потоковая выгрузка журнала движений в NDJSON или CSV.
+    Фильтры: диапазон move_date (включительно) и склад (отправитель или получатель).
+    Память сервера не зависит от размера выгрузки.
+    """
+    stmt = export.build_export_query(date_from, date_to, warehouse_id)
+    body = export.iter_csv(stmt) if format == "csv" else export.iter_ndjson(stmt)
+    return StreamingResponse(
+        body,
+        media_type=export.EXPORT_MEDIA_TYPES[format],
+        headers={
+            "Content-Disposition": f'attachment; filename="stock_movements.{format}"',
+        },
+    )
+
+
 @app.get("/stock-movements", response_model=List[schemas.StockMovement])
-def list_stock_movements(db: Session = Depends(get_db)):
+async def list_stock_movements(page: Page = Depends(), db: AsyncSession = Depends(get_db)):
+    """
+    Журнал движений по складам (постранично).
+    """
+    # без ORM-объектов и повторной валидации (см. fastjson.py)
+    return await fastjson.fetch_page(
+        page,
+        db,
+        fastjson.select_schema(schemas.StockMovement, models.StockMovement),
+        models.StockMovement.move_id,
+    )
+
+
+# ===== STOCK BALANCES (текущие остатки) =====
+
+@app.get("/stock-balances", response_model=List[schemas.StockBalance])
+async def list_stock_balances(
+    warehouse_id: Optional[int] = None,
+    material_id: Optional[int] = None,
+    as_of: Optional[date] = Query(None, description="Остатки на конец этого дня"),
+    page: Page = Depends(),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Текущие остатки по складам и материалам.
+    Читаются из таблицы stock_balances, журнал движений не агрегируется.
+
+    as_of — остатки на конец дня: ближайший снимок на конец месяца не позже
+    as_of плюс движения после него (не больше месяца журнала), нулевые
+    остатки не возвращаются.
+    """
+    if as_of is not None:
+        period_end = (await db.execute(snapshots.nearest_period_query(as_of))).scalar()
+        balances_as_of = snapshots.build_balances_as_of_query(as_of, period_end, warehouse_id, material_id)
+        return await fastjson.fetch_page(
+            page,
+            db,
+            select(*fastjson.columns(schemas.StockBalance, balances_as_of)),
+            balances_as_of.c.warehouse_id,
+            balances_as_of.c.material_id,
+        )
+
+    stmt = fastjson.select_schema(schemas.StockBalance, models.StockBalance)
+    if warehouse_id is not None:
+        stmt = stmt.where(models.StockBalance.warehouse_id == warehouse_id)
+    if material_id is not None:
+        stmt = stmt.where(models.StockBalance.material_id == material_id)
+    return await fastjson.fetch_page(
+        page,
+        db,
+        stmt,
+        models.StockBalance.warehouse_id,
+        models.StockBalance.material_id,
+    )
+
+
+@app.get("/warehouses/{warehouse_id}/stock", response_model=List[schemas.StockBalance])
+async def get_warehouse_stock(
+    warehouse_id: int,
+    page: Page = Depends(),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Остатки конкретного склада по всем материалам.
+    """
+    warehouse = await db.get(models.Warehouse, warehouse_id)
+    if warehouse is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Warehouse not found",
+        )
+
+    return await fastjson.fetch_page(
+        page,
+        db,
+        fastjson.select_schema(schemas.StockBalance, models.StockBalance).where(
+            models.StockBalance.warehouse_id == warehouse_id
+        ),
+        models.StockBalance.material_id,
+    )
+
+
+# ===== OFFERS (актуальные предложения поставщиков) =====
+
+@app.post("/offers/lookup", response_model=List[schemas.MaterialOffers])
+async def lookup_offers(
+    lookup_in: schemas.OfferLookupRequest,
+    db: AsyncSession = Depends(get_db),
+):
     """
-    Список всех движений по складам.
+    Предложения поставщиков сразу по многим материалам (например, по всем
+    строкам заявки) — один запрос к БД только по материалам, которых нет в кэше.
+    Порядок ответа совпадает с порядком material_ids (без повторов).
     """
-    moves = db.query(models.StockMovement).order_by(models.StockMovement.move_id).all()
-    return moves
+    found = await offers.lookup(db, lookup_in.material_ids)
+    return [
+        {"material_id": material_id, "offers": rows}
+        for material_id, rows in found.items()
+    ]
+
+
+# ===== REPORTS =====
+
+@app.get("/reports/shortages", response_model=List[schemas.Shortage])
+async def report_shortages(
+    project_id: Optional[int] = None,
+    warehouse_id: Optional[int] = None,
+    category_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Нехватки: пары склад×материал, где текущий остаток ниже min_stock
+    из политики минимальных остатков. deficit — сколько не хватает до минимума.
+    Фильтры: проект, склад, категория материала. Результат кэшируется
+    и сбрасывается при записи движений и политик.
+    """
+    return await reports.shortages(db, project_id, warehouse_id, category_id)
+
+
+@app.get("/reports/donors", response_model=List[schemas.TransferSuggestion])
+async def report_donors(db: AsyncSession = Depends(get_db)):
+    """
+    Предложения перемещений: излишки складов (остаток выше их min_stock)
+    распределяются по всем нехваткам. Каждое предложение — готовое
+    TRANSFER-движение (без даты) для POST /stock-movements.
+    """
+    return await reports.donors(db)
+
+
+@app.get(
+    "/reports/donors/{warehouse_id}/{material_id}",
+    response_model=List[schemas.TransferSuggestion],
+)
+async def report_donors_for_shortage(
+    warehouse_id: int,
+    material_id: int,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Доноры для одной нехватки: все излишки материала доступны ей одной.
+    Пустой список — нехватки нет или излишков нет.
+    """
+    return await reports.donors(db, warehouse_id, material_id)
+
+
+@app.get("/reports/valuation", response_model=List[schemas.ValuationRow])
+async def report_valuation(
+    group_by: Literal["warehouse", "project", "category"] = "warehouse",
+    project_id: Optional[int] = None,
+    warehouse_id: Optional[int] = None,
+    category_id: Optional[int] = None,
+    method: Literal["avg", "fifo"] = "avg",
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Стоимость запасов по складам, проектам или категориям (категория включает
+    подкатегории). method=avg — по средневзвешенной себестоимости, fifo — по
+    открытым FIFO-слоям (только при VALUATION_FIFO). Читает таблицы, которые
+    ведутся при записи движений, журнал не агрегируется.
+    """
+    if method == "fifo" and not valuation.VALUATION_FIFO:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="FIFO valuation is disabled (set VALUATION_FIFO and rebuild)",
+        )
+    return await reports.valuation(db, group_by, project_id, warehouse_id, category_id, method)
 
 
 # ===== DEBUG (можно потом удалить) =====
 
+@app.get("/debug/pool")
+async def debug_pool():
+    """
+    Состояние пулов соединений этого воркера: размер, занятые/свободные,
+    overflow и время ожидания соединения. Не трогает базу данных.
+    """
+    return {
+        "async": pool_status(async_engine),
+        "sync": pool_status(engine),
+    }
+
+
+@app.get("/debug/slow-queries")
+async def debug_slow_queries():
+    """
+    Последние медленные SQL-запросы этого воркера (новые первыми): длительность,
+    маршрут, параметры и план EXPLAIN (ANALYZE, BUFFERS), если он снят.
+    Пусто, если журнал выключен (SLOW_QUERY_MS не задан).
+    """
+    return {
+        "threshold_ms": slowlog.SLOW_QUERY_MS,
+        "explain_sample": slowlog.SLOW_QUERY_EXPLAIN_SAMPLE,
+        "entries": slowlog.entries(),
+    }
+
+
 @app.get("/debug/materials")
-def debug_list_materials(db: Session = Depends(get_db)):
+async def debug_list_materials(db: AsyncSession = Depends(get_db)):
     """
     Временный эндпоинт для проверки связи с базой:
     пытается вытащить первые 10 материалов.
     Пока таблица пустая, вернёт пустой список.
     """
-    materials = db.query(models.Material).limit(10).all()
+    result = await db.execute(select(models.Material).limit(10))
+    materials = result.scalars().all()
     return [
         {
             "material_id": m.material_id,
@@ -393,12 +921,14 @@ def debug_list_materials(db: Session = Depends(get_db)):
 # ===== MATERIALS =====
 
 @app.post("/materials", response_model=schemas.Material, status_code=status.HTTP_201_CREATED)
-def create_material(material_in: schemas.MaterialCreate, db: Session = Depends(get_db)):
+async def create_material(material_in: schemas.MaterialCreate, db: AsyncSession = Depends(get_db)):
     """
     Создание нового материала.
     Проверяем уникальность sku.
     """
-    existing = db.query(models.Material).filter(models.Material.sku == material_in.sku).first()
+    existing = await db.scalar(
+        select(models.Material).where(models.Material.sku == material_in.sku)
+    )
     if existing:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -412,15 +942,54 @@ def create_material(material_in: schemas.MaterialCreate, db: Session = Depends(g
         category_id=material_in.category_id,
     )
     db.add(material)
-    db.commit()
-    db.refresh(material)
+    await db.commit()
+    await db.refresh(material)
+    refcache.invalidate("materials")
     return material
 
 
 @app.get("/materials", response_model=List[schemas.Material])
-def list_materials(db: Session = Depends(get_db)):
+async def list_materials(
+    request: Request,
+    page: Page = Depends(),
+    db: AsyncSession = Depends(get_db),
+):
     """
-    Список всех материалов (пока без пагинации).
+    Список материалов (постранично, курсор в X-Next-Cursor, из кэша справочников).
+    Поддерживает If-None-Match / If-Modified-Since (304 Not Modified).
     """
-    materials = db.query(models.Material).order_by(models.Material.material_id).all()
+    not_modified = await etags.check(request, page.response, db, "materials")
+    if not_modified is not None:
+        return not_modified
+    materials = await refcache.fetch_page(page, db, models.Material, models.Material.material_id)
     return materials
+
+
+@app.get("/materials/search", response_model=List[schemas.Material])
+async def search_materials(
+    q: str = Query(..., min_length=1, max_length=200, description="Фрагмент артикула или названия"),
+    mode: Literal["fuzzy", "prefix"] = "fuzzy",
+    limit: int = Query(search.DEFAULT_LIMIT, ge=1, le=search.MAX_LIMIT),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Поиск материалов по артикулу и названию, лучшие совпадения первыми.
+    mode=prefix — автодополнение (артикул / название / слово названия начинается с q),
+    mode=fuzzy — по фрагментам и с опечатками (pg_trgm).
+    """
+    return await search.search(db, q, mode, limit)
+
+
+@app.get("/materials/{material_id}/offers", response_model=List[schemas.Offer])
+async def get_material_offers(material_id: int, db: AsyncSession = Depends(get_db)):
+    """
+    Последняя цена каждого поставщика по материалу + срок поставки
+    и минимальная партия. Сначала самые дешёвые, при равной цене — быстрее.
+    """
+    found = (await offers.lookup(db, [material_id]))[material_id]
+    if not found and await db.get(models.Material, material_id) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Material not found",
+        )
+    return found
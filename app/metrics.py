@@ -0,0 +1,254 @@
+# app/metrics.py
+"""
+Метрики запросов в формате Prometheus (GET /metrics).
+
+Что считается (по шаблону маршрута, например /warehouses/{warehouse_id}/stock):
+- http_requests_total{method,route,status}           — число ответов;
+- http_request_duration_seconds{method,route}        — гистограмма времени ответа;
+- http_request_db_seconds{method,route}              — гистограмма времени в БД за запрос;
+- http_request_db_queries{method,route}              — гистограмма числа SQL-запросов за запрос;
+- db_rows_total{method,route}                        — строк, вернувшихся из БД / затронутых
+                                                       (без серверных курсоров выгрузки);
+- http_requests_n_plus_one_total{method,route}       — запросы с подозрением на N+1.
+
+SQL считается событиями before/after_cursor_execute на обоих движках.
+Статистика текущего HTTP-запроса лежит в contextvar: SQLAlchemy запускает
+синхронную часть asyncio-сессии в greenlet с тем же контекстом
+(gr_context), а run_sync / run_in_threadpool копируют контекст,
+так что события видят свой запрос. SQL вне HTTP-запроса (LISTEN, фоновые
+задачи) не учитывается.
+
+N+1: если один и тот же SQL выполнен за запрос METRICS_N_PLUS_ONE раз и больше
+(типично для ленивых relationship() в цикле), запрос считается подозрительным
+и пишется предупреждение в лог с маршрутом и текстом SQL.
+
+Метрики — в памяти воркера: при нескольких воркерах uvicorn Prometheus
+видит каждый процесс отдельно (как и /debug/pool).
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from typing import Dict, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1").strip().lower() in ("1", "true", "yes", "on")
+# повторов одного SQL за HTTP-запрос, после которых запрос считается N+1
+METRICS_N_PLUS_ONE = int(os.getenv("METRICS_N_PLUS_ONE", "10"))
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# маршрут не найден (404) — один общий label, чтобы не плодить серии
+UNMATCHED_ROUTE = "<unmatched>"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    """Кумулятивная гистограмма Prometheus для одного набора labels."""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name: str, labels: str) -> list:
+        out = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            out.append(f'{name}_bucket{{{labels},le="{_number(bound)}"}} {cumulative}')
+        out.append(f'{name}_bucket{{{labels},le="+Inf"}} {self.count}')
+        out.append(f"{name}_sum{{{labels}}} {_number(self.sum)}")
+        out.append(f"{name}_count{{{labels}}} {self.count}")
+        return out
+
+
+class RequestStats:
+    """SQL одного HTTP-запроса (заполняется событиями движков)."""
+
+    __slots__ = ("scope", "queries", "db_seconds", "rows", "statements")
+
+    def __init__(self, scope: dict):
+        self.scope = scope          # ASGI scope: маршрут появляется в нём после роутинга
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.rows = 0
+        self.statements = Counter()
+
+
+class Registry:
+    """Все метрики воркера. Запись — под блокировкой: SQL идёт и из потоков."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests: Dict[Tuple[str, str, int], int] = defaultdict(int)
+        self.latency: Dict[Tuple[str, str], Histogram] = {}
+        self.db_time: Dict[Tuple[str, str], Histogram] = {}
+        self.db_queries: Dict[Tuple[str, str], Histogram] = {}
+        self.rows: Dict[Tuple[str, str], int] = defaultdict(int)
+        self.n_plus_one: Dict[Tuple[str, str], int] = defaultdict(int)
+
+    def record(self, method: str, route: str, status: int, seconds: float, stats: RequestStats) -> None:
+        key = (method, route)
+        with self._lock:
+            self.requests[(method, route, status)] += 1
+            self.latency.setdefault(key, Histogram(LATENCY_BUCKETS)).observe(seconds)
+            self.db_time.setdefault(key, Histogram(LATENCY_BUCKETS)).observe(stats.db_seconds)
+            self.db_queries.setdefault(key, Histogram(QUERY_BUCKETS)).observe(stats.queries)
+            self.rows[key] += stats.rows
+
+        if stats.statements:
+            statement, repeats = stats.statements.most_common(1)[0]
+            if repeats >= METRICS_N_PLUS_ONE:
+                with self._lock:
+                    self.n_plus_one[key] += 1
+                logger.warning(
+                    "possible N+1 on %s %s: %d queries, %d x %s",
+                    method, route, stats.queries, repeats, " ".join(statement.split())[:200],
+                )
+
+    def render(self) -> str:
+        with self._lock:
+            lines = []
+            _counter(lines, "http_requests_total", "HTTP responses", {
+                _labels(method=m, route=r, status=str(s)): v for (m, r, s), v in self.requests.items()
+            })
+            _histograms(lines, "http_request_duration_seconds", "HTTP request latency", self.latency)
+            _histograms(lines, "http_request_db_seconds", "Time spent in SQL per request", self.db_time)
+            _histograms(lines, "http_request_db_queries", "SQL statements per request", self.db_queries)
+            _counter(lines, "db_rows_total", "Rows returned or affected by SQL", {
+                _labels(method=m, route=r): v for (m, r), v in self.rows.items()
+            })
+            _counter(lines, "http_requests_n_plus_one_total", "Requests with a repeated SQL statement", {
+                _labels(method=m, route=r): v for (m, r), v in self.n_plus_one.items()
+            })
+        return "\n".join(lines) + "\n"
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _labels(**labels: str) -> str:
+    def escape(value: str) -> str:
+        return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    return ",".join(f'{name}="{escape(value)}"' for name, value in labels.items())
+
+
+def _counter(lines: list, name: str, help_text: str, values: Dict[str, int]) -> None:
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} counter")
+    lines.extend(f"{name}{{{labels}}} {value}" for labels, value in sorted(values.items()))
+
+
+def _histograms(lines: list, name: str, help_text: str, values: Dict[Tuple[str, str], Histogram]) -> None:
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} histogram")
+    for (method, route), histogram in sorted(values.items()):
+        lines.extend(histogram.lines(name, _labels(method=method, route=route)))
+
+
+registry = Registry()
+_current: ContextVar[Optional[RequestStats]] = ContextVar("metrics_request", default=None)
+
+
+def _route_path(scope: dict) -> str:
+    return getattr(scope.get("route"), "path", UNMATCHED_ROUTE)
+
+
+def current_route() -> Optional[str]:
+    """'GET /reports/shortages' для SQL внутри HTTP-запроса, иначе None."""
+    stats = _current.get()
+    if stats is None:
+        return None
+    return f"{stats.scope['method']} {_route_path(stats.scope)}"
+
+
+# ===== SQLAlchemy =====
+
+# время старта — на контексте выполнения конкретного запроса, а не на соединении:
+# при ошибке after_cursor_execute не вызывается, и отметка не должна пережить запрос
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None and context is not None:
+        context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is None:
+        return
+    started = getattr(context, "_metrics_started", None)
+    if started is not None:
+        stats.db_seconds += time.perf_counter() - started
+    stats.queries += 1
+    stats.rows += max(cursor.rowcount or 0, 0)
+    stats.statements[statement] += 1
+
+
+def instrument(*engines) -> None:
+    """Подключить счётчики SQL к движкам (для async — к его sync_engine)."""
+    for engine in engines:
+        engine = getattr(engine, "sync_engine", engine)
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+# ===== ASGI =====
+
+class MetricsMiddleware:
+    """
+    Чистый ASGI middleware (без BaseHTTPMiddleware — тот гоняет тело ответа
+    через отдельную задачу): время до конца отправки ответа, статус
+    и SQL-статистика запроса. Маршрут берётся из scope["route"], который
+    выставляет роутер FastAPI.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope)
+        token = _current.set(stats)
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            registry.record(
+                scope["method"],
+                _route_path(scope),
+                status_code,
+                time.perf_counter() - started,
+                stats,
+            )
@@ -1,12 +1,17 @@
 # app/models.py
 from sqlalchemy import (
+    BigInteger,
     Column,
     Integer,
     String,
     Date,
+    DateTime,
     Numeric,
     ForeignKey,
+    Index,
     UniqueConstraint,
+    func,
+    text,
 )
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
@@ -45,8 +50,48 @@ class Category(Base):
     materials = relationship("Material", back_populates="category")
 
 
+class CategoryClosure(Base):
+    """
+    Замыкание иерархии категорий: все пары предок — потомок (и сама категория
+    с depth = 0). Поддерживается триггерами на categories (см. миграцию
+    cd0bb090c0cd), вручную не пишется.
+    """
+    __tablename__ = "category_closure"
+    __table_args__ = (
+        Index("ix_category_closure_descendant_id", "descendant_id"),
+    )
+
+    ancestor_id = Column(
+        Integer,
+        ForeignKey("categories.category_id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    descendant_id = Column(
+        Integer,
+        ForeignKey("categories.category_id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    depth = Column(Integer, nullable=False)
+
+
 class Material(Base):
     __tablename__ = "materials"
+    __table_args__ = (
+        Index("ix_materials_category_id", "category_id"),
+        # поиск по фрагментам названия / артикула (pg_trgm)
+        Index(
+            "ix_materials_name_trgm",
+            "name",
+            postgresql_using="gin",
+            postgresql_ops={"name": "gin_trgm_ops"},
+        ),
+        Index(
+            "ix_materials_sku_trgm",
+            "sku",
+            postgresql_using="gin",
+            postgresql_ops={"sku": "gin_trgm_ops"},
+        ),
+    )
 
     material_id = Column(Integer, primary_key=True, index=True)
     sku = Column(String, nullable=False, unique=True)
@@ -68,6 +113,12 @@ class Material(Base):
     stock_movements = relationship("StockMovement", back_populates="material")
 
 
+# автодополнение: LIKE 'префикс%' без учёта регистра; COLLATE "C" — чтобы индекс
+# годился и для диапазона по префиксу, и для ORDER BY (порядок байтов)
+Index("ix_materials_sku_prefix", func.lower(Material.sku).collate("C"))
+Index("ix_materials_name_prefix", func.lower(Material.name).collate("C"))
+
+
 # ===================== SUPPLIERS & PRICES =====================
 
 class Supplier(Base):
@@ -97,6 +148,7 @@ class SupplierMaterial(Base):
     __tablename__ = "supplier_materials"
     __table_args__ = (
         UniqueConstraint("supplier_id", "material_id", name="uq_supplier_material"),
+        Index("ix_supplier_materials_material_id", "material_id"),
     )
 
     sup_id = Column(Integer, primary_key=True, index=True)
@@ -123,6 +175,18 @@ class SupplierMaterialPrice(Base):
             "price_date",
             name="uq_supplier_price_date",
         ),
+        Index(
+            "ix_supplier_material_prices_material_supplier_date",
+            "material_id",
+            "supplier_id",
+            text("price_date DESC"),
+        ),
+        Index(
+            "ix_supplier_material_prices_supplier_material_date",
+            "supplier_id",
+            "material_id",
+            text("price_date DESC"),
+        ),
     )
 
     price_id = Column(Integer, primary_key=True, index=True)
@@ -154,6 +218,9 @@ class Project(Base):
 
 class Warehouse(Base):
     __tablename__ = "warehouses"
+    __table_args__ = (
+        Index("ix_warehouses_project_id", "project_id"),
+    )
 
     warehouse_id = Column(Integer, primary_key=True, index=True)
     project_id = Column(Integer, ForeignKey("projects.project_id"), nullable=False)
@@ -247,17 +314,45 @@ class POItem(Base):
 # ===================== STOCK MOVEMENTS =====================
 
 class StockMovement(Base):
+    """
+    Журнал движений. Таблица секционирована по месяцам move_date
+    (см. миграцию 3ee160efdb7a и partitions.py), поэтому move_date
+    входит в первичный ключ.
+    """
     __tablename__ = "stock_movements"
+    __table_args__ = (
+        Index("ix_stock_movements_material_date", "material_id", "move_date"),
+        Index(
+            "ix_stock_movements_to_wh_material_date",
+            "to_warehouse_id",
+            "material_id",
+            "move_date",
+        ),
+        Index(
+            "ix_stock_movements_from_wh_material_date",
+            "from_warehouse_id",
+            "material_id",
+            "move_date",
+        ),
+        Index("ix_stock_movements_move_date", "move_date"),
+        Index(
+            "ix_stock_movements_related_po_id",
+            "related_po_id",
+            postgresql_where=text("related_po_id IS NOT NULL"),
+        ),
+        {"postgresql_partition_by": "RANGE (move_date)"},
+    )
 
-    move_id = Column(Integer, primary_key=True, index=True)
+    move_id = Column(Integer, primary_key=True, autoincrement=True, index=True)
     move_type = Column(String, nullable=False)  # приход / выдача / перемещение / корректировка
-    move_date = Column(Date, nullable=False)
+    move_date = Column(Date, primary_key=True, nullable=False)
     status = Column(String, nullable=True)
 
     supplier_id = Column(Integer, ForeignKey("suppliers.supplier_id"), nullable=True)
     from_warehouse_id = Column(Integer, ForeignKey("warehouses.warehouse_id"), nullable=True)
     to_warehouse_id = Column(Integer, ForeignKey("warehouses.warehouse_id"), nullable=True)
 
+    project_id = Column(Integer, ForeignKey("projects.project_id"), nullable=True)
     related_po_id = Column(Integer, ForeignKey("purchase_orders.po_id"), nullable=True)
     material_id = Column(Integer, ForeignKey("materials.material_id"), nullable=False)
 
@@ -267,11 +362,14 @@ class StockMovement(Base):
     ext_doc_no = Column(String, nullable=True)
     ext_doc_date = Column(Date, nullable=True)
     vehicle_number = Column(String, nullable=True)
+    driver_name = Column(String, nullable=True)
     shipped_by_name = Column(String, nullable=True)
     accepted_by_name = Column(String, nullable=True)
     ship_date = Column(Date, nullable=True)
     load_date = Column(Date, nullable=True)
     file_url = Column(String, nullable=True)
+    file_mime = Column(String, nullable=True)
+    file_hash = Column(String, nullable=True)
 
     supplier = relationship("Supplier", back_populates="stock_movements")
     from_warehouse = relationship(
@@ -286,3 +384,112 @@ class StockMovement(Base):
     )
     purchase_order = relationship("PurchaseOrder", back_populates="stock_movements")
     material = relationship("Material", back_populates="stock_movements")
+
+
+# ===================== STOCK BALANCES =====================
+
+class StockBalance(Base):
+    """
+    Текущие остатки по складу×материалу.
+    Обновляются в той же транзакции, что и вставка движения
+    (см. balances.py), поэтому не нужно агрегировать весь журнал.
+    """
+    __tablename__ = "stock_balances"
+    __table_args__ = (
+        Index("ix_stock_balances_material_id", "material_id"),
+    )
+
+    warehouse_id = Column(Integer, ForeignKey("warehouses.warehouse_id"), primary_key=True)
+    material_id = Column(Integer, ForeignKey("materials.material_id"), primary_key=True)
+
+    qty = Column(Numeric, nullable=False, default=0)
+
+    warehouse = relationship("Warehouse")
+    material = relationship("Material")
+
+
+# ===================== VALUATION =====================
+
+class StockValuation(Base):
+    """
+    Стоимость запасов по складу×материалу по средневзвешенной цене.
+    Обновляется в той же транзакции, что и вставка движений (см. valuation.py);
+    value = qty * avg_cost.
+    """
+    __tablename__ = "stock_valuation"
+    __table_args__ = (
+        Index("ix_stock_valuation_material_id", "material_id"),
+    )
+
+    warehouse_id = Column(Integer, ForeignKey("warehouses.warehouse_id"), primary_key=True)
+    material_id = Column(Integer, ForeignKey("materials.material_id"), primary_key=True)
+
+    qty = Column(Numeric, nullable=False, default=0)
+    avg_cost = Column(Numeric, nullable=False, default=0)
+    value = Column(Numeric, nullable=False, default=0)
+
+
+class StockCostLayer(Base):
+    """
+    Открытые FIFO-слои: остаток каждого поступления по его себестоимости.
+    Ведутся только при VALUATION_FIFO; израсходованные слои удаляются.
+    """
+    __tablename__ = "stock_cost_layers"
+    __table_args__ = (
+        Index("ix_stock_cost_layers_wh_material_layer", "warehouse_id", "material_id", "layer_id"),
+        Index("ix_stock_cost_layers_material_id", "material_id"),
+    )
+
+    layer_id = Column(BigInteger, primary_key=True, autoincrement=True)
+    warehouse_id = Column(Integer, ForeignKey("warehouses.warehouse_id"), nullable=False)
+    material_id = Column(Integer, ForeignKey("materials.material_id"), nullable=False)
+
+    received_date = Column(Date, nullable=False)
+    qty = Column(Numeric, nullable=False)           # ещё не израсходовано
+    unit_cost = Column(Numeric, nullable=False)
+
+
+# ===================== BALANCE SNAPSHOTS =====================
+
+class StockSnapshotPeriod(Base):
+    """
+    Закрытые периоды: на каждую дату period_end есть снимок остатков
+    в stock_balance_snapshots (см. snapshots.py).
+    """
+    __tablename__ = "stock_snapshot_periods"
+
+    period_end = Column(Date, primary_key=True)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+
+class StockBalanceSnapshot(Base):
+    """
+    Остаток склад×материал на конец дня period_end (все движения с move_date <= period_end).
+    Движения задним числом дописываются во все более поздние снимки в той же транзакции.
+    """
+    __tablename__ = "stock_balance_snapshots"
+
+    period_end = Column(
+        Date,
+        ForeignKey("stock_snapshot_periods.period_end", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    warehouse_id = Column(Integer, ForeignKey("warehouses.warehouse_id"), primary_key=True)
+    material_id = Column(Integer, ForeignKey("materials.material_id"), primary_key=True)
+
+    qty = Column(Numeric, nullable=False)
+
+
+# ===================== TABLE VERSIONS =====================
+
+class TableVersion(Base):
+    """
+    Версия таблицы: увеличивается триггером bump_table_version() на любую
+    запись в таблицу (см. миграцию 3e3f4e28e515) и рассылается через
+    NOTIFY table_versions. Используется для сброса кэшей справочников.
+    """
+    __tablename__ = "table_versions"
+
+    table_name = Column(String, primary_key=True)
+    version = Column(BigInteger, nullable=False)
+    updated_at = Column(DateTime(timezone=True), nullable=False)
@@ -0,0 +1,139 @@
+# app/movements.py
+"""
+Массовая загрузка движений (сканеры на объектах, синхронизация с 1С).
+
+Строки валидируются схемой StockMovementCreate и вставляются пачками
+одним INSERT ... VALUES (...), (...) RETURNING move_id (режим insertmanyvalues
+в SQLAlchemy 2.x), остатки обновляются одним upsert на пачку.
+Если пачка падает на ограничениях БД (например, несуществующий склад),
+она повторяется построчно в SAVEPOINT-ах, чтобы отсеять только плохие строки.
+
+NDJSON разбирается построчно: нечитаемая строка становится ошибкой с её
+индексом (номер среди непустых строк), остальные строки загружаются.
+"""
+
+import json
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+try:
+    from . import balances, models, schemas, snapshots, valuation
+except ImportError:
+    import balances, models, schemas, snapshots, valuation
+
+
+BULK_BATCH_SIZE = 5000
+
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+
+class InvalidLine:
+    """Строка NDJSON, которая не разобралась как JSON (ошибка уровня строки)."""
+
+    __slots__ = ("detail",)
+
+    def __init__(self, detail: str):
+        self.detail = detail
+
+
+def _parse_line(line: bytes) -> Any:
+    try:
+        return json.loads(line)
+    except ValueError as e:  # JSONDecodeError и UnicodeDecodeError
+        return InvalidLine(f"Invalid JSON: {e}")
+
+
+def parse_bulk_body(body: bytes, content_type: str) -> List[Any]:
+    """
+    Разбирает тело запроса: JSON-массив или NDJSON (по одному объекту на строку).
+    Нечитаемая строка NDJSON возвращается как InvalidLine на своём месте;
+    JSON-массив, который не разбирается целиком, — ValueError.
+    """
+    if content_type.split(";")[0].strip().lower() in NDJSON_CONTENT_TYPES:
+        return [_parse_line(line) for line in body.splitlines() if line.strip()]
+
+    data = json.loads(body)
+    if not isinstance(data, list):
+        raise ValueError("Expected a JSON array of stock movements")
+    return data
+
+
+def _insert_rows(db: Session, rows: List[Dict[str, Any]]) -> List[int]:
+    """
+    Вставляет строки одним пакетным INSERT ... RETURNING и обновляет остатки,
+    закрытые снимки (движения задним числом) и стоимость запасов.
+    Возвращает move_id в порядке входных строк.
+    """
+    # Core-insert по таблице, без ORM bulk-persistence: заметно меньше накладных расходов
+    table = models.StockMovement.__table__
+    stmt = insert(table).returning(table.c.move_id, sort_by_parameter_order=True)
+    move_ids = list(db.execute(stmt, rows).scalars())
+    posted = [SimpleNamespace(**row) for row in rows]
+    balances.apply_deltas(db, balances.movement_deltas(posted))
+    snapshots.apply_movements(db, posted)
+    valuation.apply_movements(db, posted)
+    return move_ids
+
+
+def _error_detail(exc: DBAPIError) -> str:
+    # у asyncpg исходная ошибка драйвера лежит в __cause__ обёртки DBAPI
+    orig = exc.orig.__cause__ or exc.orig if exc.orig is not None else exc
+    return str(orig).strip()
+
+
+def bulk_insert(db: Session, items: List[Any]) -> Dict[str, Any]:
+    """
+    Валидирует и вставляет движения пачками по BULK_BATCH_SIZE.
+    Ошибки возвращаются по каждой строке (index — позиция во входном массиве),
+    хорошие строки при этом сохраняются.
+    """
+    move_ids: List[Optional[int]] = [None] * len(items)
+    errors: List[Dict[str, Any]] = []
+
+    valid: List[tuple] = []  # (index, row)
+    for index, raw in enumerate(items):
+        if isinstance(raw, InvalidLine):
+            errors.append({"index": index, "detail": raw.detail})
+            continue
+        if not isinstance(raw, dict):
+            errors.append({"index": index, "detail": "Expected a JSON object"})
+            continue
+        try:
+            mv_in = schemas.StockMovementCreate(**raw)
+        except ValidationError as e:
+            errors.append({"index": index, "detail": jsonable_encoder(e.errors())})
+            continue
+        valid.append((index, mv_in.model_dump()))
+
+    for start in range(0, len(valid), BULK_BATCH_SIZE):
+        batch = valid[start:start + BULK_BATCH_SIZE]
+        try:
+            ids = _insert_rows(db, [row for _, row in batch])
+            db.commit()
+            for (index, _), move_id in zip(batch, ids):
+                move_ids[index] = move_id
+            continue
+        except DBAPIError:
+            db.rollback()
+
+        # пачка не прошла целиком: повторяем построчно, чтобы найти виноватых
+        for index, row in batch:
+            try:
+                with db.begin_nested():
+                    move_ids[index] = _insert_rows(db, [row])[0]
+            except DBAPIError as e:
+                errors.append({"index": index, "detail": _error_detail(e)})
+        db.commit()
+
+    errors.sort(key=lambda err: err["index"])
+    return {
+        "inserted": sum(1 for move_id in move_ids if move_id is not None),
+        "move_ids": move_ids,
+        "errors": errors,
+    }
@@ -0,0 +1,157 @@
+# app/offers.py
+"""
+Актуальные предложения поставщиков по материалам.
+
+Предложение = последняя цена поставщика по материалу (DISTINCT ON по индексу
+ix_supplier_material_prices_material_supplier_date) + условия из
+supplier_materials (срок поставки, минимальная партия). Предложения по
+материалу ранжируются: дешевле, затем быстрее.
+
+Кэш — по материалу: при добавлении цены сбрасывается только запись этого
+материала — сразу в своём воркере и по NOTIFY table_changes
+('<таблица>:<material_id>', миграция 0c6e5a9d3f18) во всех остальных;
+изменение поставщика (название) сбрасывает весь кэш. Пока подписки нет,
+кэш не читается. Пакетный запрос добирает из БД одним запросом только
+материалы, которых нет в кэше.
+"""
+
+import os
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Union
+
+from sqlalchemy import Select, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+try:
+    from . import models, refcache
+    from .cache import REPORT_CACHE_TTL, TTLCache
+except ImportError:
+    import models, refcache
+    from cache import REPORT_CACHE_TTL, TTLCache
+
+
+# сколько материалов держать в кэше предложений
+OFFER_CACHE_SIZE = int(os.getenv("OFFER_CACHE_SIZE", "10000"))
+
+offer_cache = TTLCache(ttl=REPORT_CACHE_TTL, maxsize=OFFER_CACHE_SIZE)
+# таблицы, от которых зависят предложения (см. on_change)
+OFFER_TABLES = ("supplier_material_prices", "supplier_materials", "suppliers")
+
+
+def build_offers_query(material_ids: Union[Iterable[int], Select]):
+    """
+    Последняя цена каждого поставщика по каждому из материалов,
+    с условиями поставки и местом в рейтинге (rank = 1 — лучшее предложение).
+    material_ids — список или подзапрос с одной колонкой material_id.
+    """
+    if not isinstance(material_ids, Select):
+        material_ids = list(material_ids)
+    price = models.SupplierMaterialPrice
+    link = models.SupplierMaterial
+    supplier = models.Supplier
+
+    latest = (
+        select(price)
+        .where(price.material_id.in_(material_ids))
+        .distinct(price.material_id, price.supplier_id)
+        .order_by(price.material_id, price.supplier_id, price.price_date.desc())
+        .subquery("latest")
+    )
+
+    ranking = (
+        latest.c.price.asc(),
+        link.lead_time_days.asc().nulls_last(),
+        latest.c.supplier_id,
+    )
+    return (
+        select(
+            latest.c.material_id,
+            latest.c.supplier_id,
+            supplier.name.label("supplier_name"),
+            latest.c.price,
+            latest.c.currency,
+            latest.c.price_date,
+            link.lead_time_days,
+            link.min_order_qty,
+            func.row_number()
+            .over(partition_by=latest.c.material_id, order_by=ranking)
+            .label("rank"),
+        )
+        .join(supplier, supplier.supplier_id == latest.c.supplier_id)
+        .outerjoin(
+            link,
+            (link.supplier_id == latest.c.supplier_id)
+            & (link.material_id == latest.c.material_id),
+        )
+        .order_by(latest.c.material_id, *ranking)
+    )
+
+
+async def lookup(db: AsyncSession, material_ids: Iterable[int]) -> Dict[int, List[dict]]:
+    """
+    Предложения по набору материалов: {material_id: [offer, ...]}.
+    Материалы без цен получают пустой список.
+    """
+    material_ids = list(dict.fromkeys(material_ids))
+    offers = {}
+    missing = []
+    coherent = refcache.is_coherent()
+    for material_id in material_ids:
+        cached = offer_cache.get(material_id) if coherent else None
+        if cached is None:
+            missing.append(material_id)
+        else:
+            offers[material_id] = cached
+
+    if missing:
+        generation = offer_cache.generation
+        fetched = {material_id: [] for material_id in missing}
+        result = await db.execute(build_offers_query(missing))
+        for row in result.mappings():
+            fetched[row["material_id"]].append(dict(row))
+        for material_id, rows in fetched.items():
+            offer_cache.set(material_id, rows, generation)
+        offers.update(fetched)
+    return {material_id: offers[material_id] for material_id in material_ids}
+
+
+def invalidate(material_id: int) -> None:
+    """Сбросить предложения материала после записи цены / условий поставщика."""
+    offer_cache.invalidate(material_id)
+
+
+def on_change(table: str, key: Optional[str] = None) -> None:
+    """Обработчик refcache.subscribe: key — material_id из уведомления, None — сбросить всё."""
+    offer_cache.invalidate(int(key) if key is not None else None)
+
+
+# ===== ЦЕНЫ НА ДАТУ =====
+
+def build_prices_as_of_query(
+    as_of: date,
+    supplier_id: Optional[int] = None,
+    material_id: Optional[int] = None,
+):
+    """
+    Цена каждой пары поставщик×материал, действовавшая на дату as_of
+    (последняя запись с price_date <= as_of). Пара, у которой до этой даты
+    цен не было, не попадает.
+
+    DISTINCT ON (supplier_id, material_id) ... ORDER BY price_date DESC идёт
+    по индексу ix_supplier_material_prices_supplier_material_date в его порядке:
+    для одной пары — одна проба индекса, для страницы keyset-пагинации по паре —
+    только строки пар этой страницы (условие на ключ проталкивается внутрь).
+    С одним material_id — по ix_supplier_material_prices_material_supplier_date.
+    """
+    price = models.SupplierMaterialPrice
+    stmt = (
+        select(price)
+        .where(price.price_date <= as_of)
+        .distinct(price.supplier_id, price.material_id)
+        .order_by(price.supplier_id, price.material_id, price.price_date.desc())
+    )
+    if supplier_id is not None:
+        stmt = stmt.where(price.supplier_id == supplier_id)
+    if material_id is not None:
+        stmt = stmt.where(price.material_id == material_id)
+    return stmt.subquery("as_of")
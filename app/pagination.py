@@ -0,0 +1,136 @@
+# app/pagination.py
+"""
+Keyset (cursor) пагинация для списочных эндпоинтов.
+
+Вместо OFFSET используем условие по ключу сортировки:
+    WHERE (pk1, pk2, ...) > (:last_pk1, :last_pk2, ...) ORDER BY pk1, pk2, ... LIMIT n
+Такой запрос идёт по индексу первичного ключа, поэтому время ответа
+не зависит от того, насколько "далеко" клиент пролистал.
+
+Тело ответа остаётся списком (как и раньше), а курсор следующей страницы
+отдаётся в заголовке X-Next-Cursor. Если заголовка нет — это последняя страница.
+"""
+
+import base64
+import binascii
+import json
+from typing import Any, List, Optional, Sequence
+
+from fastapi import HTTPException, Query, Response, status
+from sqlalchemy import tuple_
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+BIGINT_MIN, BIGINT_MAX = -2 ** 63, 2 ** 63 - 1
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """
+    Упаковывает значения ключа последней строки в непрозрачную строку.
+    """
+    raw = json.dumps(list(values), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _is_key_value(value: Any) -> bool:
+    # ключи всех списков — целые id (integer / bigint); bool — подкласс int
+    return (
+        isinstance(value, int)
+        and not isinstance(value, bool)
+        and BIGINT_MIN <= value <= BIGINT_MAX
+    )
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """
+    Распаковывает курсор. Если он битый, не подходит к эндпоинту или
+    содержит не целые значения ключа — 400 (до запроса в базу).
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, ValueError):
+        values = None
+
+    if (
+        not isinstance(values, list)
+        or len(values) != size
+        or not all(_is_key_value(value) for value in values)
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor",
+        )
+    return values
+
+
+class Page:
+    """
+    Зависимость FastAPI с параметрами страницы: limit и after.
+    Использование в обработчике:
+
+        async def list_units(page: Page = Depends(), db: AsyncSession = Depends(get_db)):
+            return await page.fetch(db, select(models.Unit), models.Unit.unit_id)
+    """
+
+    def __init__(
+        self,
+        response: Response,
+        limit: int = Query(
+            DEFAULT_LIMIT,
+            ge=1,
+            le=MAX_LIMIT,
+            description="Сколько строк вернуть",
+        ),
+        after: Optional[str] = Query(
+            None,
+            description="Курсор из заголовка X-Next-Cursor предыдущей страницы",
+        ),
+    ):
+        self.response = response
+        self.limit = limit
+        self.after = after
+
+    def statement(self, stmt, *key_columns):
+        """
+        Добавляет к SELECT keyset-условие, сортировку и лимит.
+        key_columns — колонки первичного ключа в порядке сортировки.
+        """
+        if self.after is not None:
+            values = decode_cursor(self.after, len(key_columns))
+            if len(key_columns) == 1:
+                stmt = stmt.where(key_columns[0] > values[0])
+            else:
+                stmt = stmt.where(tuple_(*key_columns) > tuple_(*values))
+
+        # берём на одну строку больше, чтобы понять, есть ли следующая страница
+        return stmt.order_by(*key_columns).limit(self.limit + 1)
+
+    def finish(self, rows: list, *key_columns) -> list:
+        """
+        Обрезает лишнюю строку и, если она была, ставит X-Next-Cursor.
+        rows — ORM-объекты или Row с атрибутами по именам колонок ключа.
+        """
+        if len(rows) > self.limit:
+            rows = rows[: self.limit]
+            last = rows[-1]
+            self.response.headers[NEXT_CURSOR_HEADER] = encode_cursor(
+                [getattr(last, col.key) for col in key_columns]
+            )
+        return rows
+
+    async def fetch(self, db, stmt, *key_columns) -> list:
+        """
+        Выполняет постраничный SELECT одной ORM-сущности в AsyncSession.
+        """
+        result = await db.execute(self.statement(stmt, *key_columns))
+        return self.finish(list(result.scalars()), *key_columns)
+
+    async def fetch_rows(self, db, stmt, *key_columns) -> list:
+        """
+        То же для SELECT по колонкам: возвращает Row (кортежи), без ORM-объектов.
+        Колонки ключа должны быть среди выбранных.
+        """
+        result = await db.execute(self.statement(stmt, *key_columns))
+        return self.finish(list(result), *key_columns)
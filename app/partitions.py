@@ -0,0 +1,155 @@
+# app/partitions.py
+"""
+Обслуживание секций таблицы stock_movements (PARTITION BY RANGE (move_date)).
+
+Одна секция на календарный месяц: stock_movements_y2025m01 хранит движения
+с 2025-01-01 по 2025-01-31. Строки с датами, для которых секции нет, попадают
+в stock_movements_default.
+
+Запускать регулярно (cron / планировщик), например раз в сутки:
+
+    python -m partitions --ahead 3                      # секции на 3 месяца вперёд
+    python -m partitions --detach-older-than 36         # отсоединить секции старше 3 лет
+
+Отсоединённая секция остаётся обычной таблицей (архив): её можно выгрузить
+и удалить вручную или присоединить обратно. Отчёты и пересчёт остатков
+(python -m balances) видят только присоединённые секции.
+"""
+
+import argparse
+import re
+from datetime import date
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+try:
+    from .db import SessionLocal
+except ImportError:
+    from db import SessionLocal
+
+
+PARENT_TABLE = "stock_movements"
+DEFAULT_PARTITION = "stock_movements_default"
+PARTITION_NAME_RE = re.compile(r"^stock_movements_y(\d{4})m(\d{2})$")
+
+
+def add_months(d: date, months: int) -> date:
+    """Первое число месяца, отстоящего от d на months месяцев."""
+    idx = d.year * 12 + d.month - 1 + months
+    return date(idx // 12, idx % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT_TABLE}_y{month.year:04d}m{month.month:02d}"
+
+
+def list_partitions(db: Session) -> List[date]:
+    """Месяцы присоединённых помесячных секций (по возрастанию)."""
+    names = db.execute(
+        text(
+            """
+            SELECT c.relname
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = CAST(:parent AS regclass)
+            """
+        ),
+        {"parent": PARENT_TABLE},
+    ).scalars()
+    months = []
+    for name in names:
+        match = PARTITION_NAME_RE.match(name)
+        if match:
+            months.append(date(int(match.group(1)), int(match.group(2)), 1))
+    return sorted(months)
+
+
+def create_partition(db: Session, month: date) -> int:
+    """
+    Создать секцию на месяц month. Строки этого месяца, уже попавшие
+    в DEFAULT, переносятся в новую секцию (иначе ATTACH не пройдёт).
+    Возвращает число перенесённых строк.
+    """
+    name = partition_name(month)
+    bounds = {"lo": month, "hi": add_months(month, 1)}
+
+    db.execute(
+        text(
+            f"CREATE TABLE {name} "
+            f"(LIKE {PARENT_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+        )
+    )
+    moved = db.execute(
+        text(
+            f"""
+            WITH moved AS (
+                DELETE FROM {DEFAULT_PARTITION}
+                WHERE move_date >= :lo AND move_date < :hi
+                RETURNING *
+            )
+            INSERT INTO {name} SELECT * FROM moved
+            """
+        ),
+        bounds,
+    ).rowcount
+    # индексы и внешние ключи родителя создаются на секции при присоединении
+    db.execute(
+        text(
+            f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {name} "
+            f"FOR VALUES FROM ('{bounds['lo'].isoformat()}') TO ('{bounds['hi'].isoformat()}')"
+        )
+    )
+    return moved
+
+
+def ensure_partitions(db: Session, months_ahead: int = 3, today: Optional[date] = None) -> List[str]:
+    """
+    Создать недостающие секции от текущего месяца до months_ahead месяцев вперёд.
+    Возвращает имена созданных секций.
+    """
+    this_month = (today or date.today()).replace(day=1)
+    existing = set(list_partitions(db))
+    created = []
+    for offset in range(months_ahead + 1):
+        month = add_months(this_month, offset)
+        if month not in existing:
+            create_partition(db, month)
+            created.append(partition_name(month))
+    return created
+
+
+def detach_older_than(db: Session, months: int, today: Optional[date] = None) -> List[str]:
+    """
+    Отсоединить секции, целиком лежащие раньше чем months месяцев назад.
+    Возвращает имена отсоединённых секций.
+    """
+    cutoff = add_months((today or date.today()).replace(day=1), -months)
+    detached = []
+    for month in list_partitions(db):
+        if month < cutoff:
+            name = partition_name(month)
+            db.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+            detached.append(name)
+    return detached
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Обслуживание секций stock_movements")
+    parser.add_argument("--ahead", type=int, default=3,
+                        help="сколько месяцев вперёд должно быть секций")
+    parser.add_argument("--detach-older-than", type=int, metavar="MONTHS",
+                        help="отсоединить секции старше MONTHS месяцев")
+    args = parser.parse_args()
+
+    session = SessionLocal()
+    try:
+        for name in ensure_partitions(session, args.ahead):
+            print(f"created {name}")
+        if args.detach_older_than is not None:
+            for name in detach_older_than(session, args.detach_older_than):
+                print(f"detached {name}")
+        session.commit()
+    finally:
+        session.close()
@@ -0,0 +1,241 @@
+# app/purchasing.py
+"""
+Заявки на поставку: создание с позициями и автопополнение по нехваткам.
+
+Заявки и все их позиции вставляются в одной транзакции: шапки —
+INSERT ... RETURNING po_id, позиции — одним пакетным
+INSERT ... VALUES (...), (...) RETURNING po_item_id (insertmanyvalues, как
+в movements.py). Два запроса и один commit на любое число заявок; при ошибке
+не остаётся заявки без части позиций.
+
+Автопополнение (plan_replenishment) — один запрос по всей сети:
+- нехватки склад×материал из reports.build_shortage_query (остаток < min_stock);
+- минус то, что уже заказано по открытым заявкам (статус не RECEIVED / CANCELLED),
+  поэтому повторный запуск не дублирует черновики;
+- к каждой нехватке — последние цены всех поставщиков материала с условиями
+  (offers.build_offers_query); заказывается max(нехватка, min_order_qty),
+  выбирается поставщик с наименьшей суммой такого заказа, при равенстве —
+  с меньшим сроком поставки;
+- строки группируются в черновики (status DRAFT): одна заявка на поставщик×склад,
+  expected_date — по самому долгому сроку поставки в заявке.
+Материалы без единой цены возвращаются отдельно (unassigned).
+"""
+
+from collections import Counter
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+try:
+    from . import models, offers, reports, schemas
+except ImportError:
+    import models, offers, reports, schemas
+
+
+DRAFT_STATUS = "DRAFT"
+# заказанное по заявкам с этими статусами уже не ждём
+CLOSED_STATUSES = ("RECEIVED", "CANCELLED")
+# ключ pg_advisory_xact_lock: два планировщика не пишут черновики одновременно
+REPLENISH_LOCK_KEY = 0x5245504C  # 'REPL'
+
+ORDER_COLUMNS = ("supplier_id", "warehouse_id", "order_date", "expected_date", "status")
+ITEM_COLUMNS = ("po_id", "material_id", "qty_ordered", "unit_price", "currency")
+
+
+def duplicate_materials(items: Iterable[schemas.PurchaseOrderItemCreate]) -> List[int]:
+    """material_id, встречающиеся в позициях больше одного раза (uq_po_material)."""
+    counts = Counter(item.material_id for item in items)
+    return sorted(material_id for material_id, n in counts.items() if n > 1)
+
+
+def insert_orders(db: Session, orders: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Вставляет заявки с позициями (без commit): order — поля шапки и "items",
+    позиция — поля POItem без po_id (лишние ключи не пишутся, но остаются в ответе).
+    Возвращает те же заявки с po_id и po_item_id.
+    """
+    if not orders:
+        return []
+    orders_table = models.PurchaseOrder.__table__
+    po_ids = db.execute(
+        insert(orders_table).returning(orders_table.c.po_id, sort_by_parameter_order=True),
+        [{column: order.get(column) for column in ORDER_COLUMNS} for order in orders],
+    ).scalars().all()
+
+    result, items = [], []
+    for order, po_id in zip(orders, po_ids):
+        order_items = [{**item, "po_id": po_id} for item in order.get("items", [])]
+        items.extend(order_items)
+        result.append({**order, "po_id": po_id, "items": order_items})
+
+    if items:
+        table = models.POItem.__table__
+        stmt = insert(table).returning(table.c.po_item_id, sort_by_parameter_order=True)
+        rows = [{column: item[column] for column in ITEM_COLUMNS} for item in items]
+        for item, po_item_id in zip(items, db.execute(stmt, rows).scalars()):
+            item["po_item_id"] = po_item_id
+    return result
+
+
+def create_order(db: Session, po_in: schemas.PurchaseOrderCreate) -> Dict[str, Any]:
+    """
+    Одна заявка с позициями (без commit) — dict для schemas.PurchaseOrderWithItems.
+    Повторы материалов нужно отсеять заранее (duplicate_materials).
+    """
+    return insert_orders(db, [po_in.model_dump()])[0]
+
+
+# ===== REPLENISHMENT =====
+
+def build_replenishment_query(
+    project_id: Optional[int] = None,
+    warehouse_id: Optional[int] = None,
+    category_id: Optional[int] = None,
+):
+    """
+    Что заказать: по строке на склад×материал с лучшим поставщиком
+    (supplier_id NULL — цен нет ни у кого).
+    """
+    po = models.PurchaseOrder
+    item = models.POItem
+
+    shortage = reports.build_shortage_query(project_id, warehouse_id, category_id).subquery("shortage")
+    on_order = (
+        select(
+            po.warehouse_id,
+            item.material_id,
+            func.sum(item.qty_ordered).label("qty"),
+        )
+        .join(po, po.po_id == item.po_id)
+        .where(func.coalesce(po.status, "").not_in(CLOSED_STATUSES))
+        .group_by(po.warehouse_id, item.material_id)
+        .subquery("on_order")
+    )
+    ordered = func.coalesce(on_order.c.qty, 0)
+    need = (
+        select(
+            shortage.c.warehouse_id,
+            shortage.c.material_id,
+            shortage.c.deficit,
+            ordered.label("on_order"),
+            (shortage.c.deficit - ordered).label("need"),
+        )
+        .outerjoin(
+            on_order,
+            (on_order.c.warehouse_id == shortage.c.warehouse_id)
+            & (on_order.c.material_id == shortage.c.material_id),
+        )
+        .where(shortage.c.deficit > ordered)
+        .cte("need")
+    )
+
+    offer = offers.build_offers_query(select(need.c.material_id).distinct()).subquery("offer")
+    qty = func.greatest(need.c.need, func.coalesce(offer.c.min_order_qty, 0))
+    candidates = (
+        select(
+            need.c.warehouse_id,
+            need.c.material_id,
+            need.c.deficit,
+            need.c.on_order,
+            need.c.need,
+            offer.c.supplier_id,
+            offer.c.price,
+            offer.c.currency,
+            offer.c.lead_time_days,
+            qty.label("qty"),
+            func.row_number()
+            .over(
+                partition_by=(need.c.warehouse_id, need.c.material_id),
+                order_by=(
+                    (qty * offer.c.price).asc(),
+                    offer.c.lead_time_days.asc().nulls_last(),
+                    offer.c.supplier_id,
+                ),
+            )
+            .label("choice"),
+        )
+        .outerjoin(offer, offer.c.material_id == need.c.material_id)
+        .subquery("candidates")
+    )
+    return (
+        select(candidates)
+        .where(candidates.c.choice == 1)
+        .order_by(
+            candidates.c.supplier_id.nulls_last(),
+            candidates.c.warehouse_id,
+            candidates.c.material_id,
+        )
+    )
+
+
+def group_plan(rows: Iterable, order_date: date) -> Tuple[List[dict], List[dict]]:
+    """
+    Строки build_replenishment_query -> черновики заявок (поставщик×склад)
+    и нехватки без поставщика.
+    """
+    orders: Dict[Tuple[int, int], dict] = {}
+    lead_times: Dict[Tuple[int, int], List[int]] = {}
+    unassigned = []
+    for row in rows:
+        if row.supplier_id is None:
+            unassigned.append({
+                "warehouse_id": row.warehouse_id,
+                "material_id": row.material_id,
+                "need": row.need,
+            })
+            continue
+        key = (row.supplier_id, row.warehouse_id)
+        order = orders.setdefault(key, {
+            "po_id": None,
+            "supplier_id": row.supplier_id,
+            "warehouse_id": row.warehouse_id,
+            "order_date": order_date,
+            "expected_date": None,
+            "status": DRAFT_STATUS,
+            "items": [],
+        })
+        order["items"].append({
+            "material_id": row.material_id,
+            "qty_ordered": row.qty,
+            "unit_price": row.price,
+            "currency": row.currency,
+            "deficit": row.deficit,
+            "on_order": row.on_order,
+            "need": row.need,
+            "lead_time_days": row.lead_time_days,
+        })
+        if row.lead_time_days is not None:
+            lead_times.setdefault(key, []).append(row.lead_time_days)
+
+    for key, days in lead_times.items():
+        orders[key]["expected_date"] = order_date + timedelta(days=max(days))
+    return list(orders.values()), unassigned
+
+
+async def plan_replenishment(
+    db: AsyncSession,
+    project_id: Optional[int] = None,
+    warehouse_id: Optional[int] = None,
+    category_id: Optional[int] = None,
+    dry_run: bool = False,
+    today: Optional[date] = None,
+) -> Dict[str, Any]:
+    """
+    Считает план пополнения и (если не dry_run) сохраняет черновики заявок
+    одной транзакцией. Возвращает dict для schemas.ReplenishmentPlan.
+    """
+    if not dry_run:
+        # план и запись — под одной блокировкой, иначе параллельный запуск
+        # не увидит чужие черновики в "уже заказано" и продублирует их
+        await db.execute(select(func.pg_advisory_xact_lock(REPLENISH_LOCK_KEY)))
+
+    result = await db.execute(build_replenishment_query(project_id, warehouse_id, category_id))
+    orders, unassigned = group_plan(result, today or date.today())
+
+    if not dry_run and orders:
+        orders = await db.run_sync(insert_orders, orders)
+    await db.commit()
+    return {"dry_run": dry_run, "orders": orders, "unassigned": unassigned}
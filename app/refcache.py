@@ -0,0 +1,249 @@
+# app/refcache.py
+"""
+Кэш справочников (units, categories, materials, suppliers, projects, warehouses)
+в памяти воркера.
+
+Страницы списков кэшируются по (limit, after) вместе с курсором следующей
+страницы, поэтому повторное чтение справочника не ходит в БД вообще.
+
+Согласованность между воркерами: триггеры на справочных таблицах
+(миграция 3e3f4e28e515) при каждой записи шлют NOTIFY table_versions.
+Каждый воркер держит одно соединение с LISTEN и по уведомлению сбрасывает
+кэш таблицы. Пока подписки нет (старт, обрыв соединения) кэш не используется —
+запросы идут в БД, так что устаревшие данные не отдаются.
+Свой же воркер сбрасывает кэш сразу после commit (invalidate()), не дожидаясь
+уведомления.
+
+Кэши, которые зависят не только от справочников (отчёты, предложения
+поставщиков), подписываются на таблицы через subscribe(): обработчик
+вызывается по уведомлению table_versions или table_changes (таблицы без
+версии, например stock_movements: '<таблица>' или '<таблица>:<ключ>') и при
+(пере)подключении — с key=None, то есть "сбросить всё". Пока подписки нет,
+такие кэши тоже не читаются (is_coherent()).
+
+Та же подписка ведёт версии таблиц (version, updated_at) из table_versions —
+по ним etags.py отвечает 304 Not Modified без запроса к БД.
+
+Через PgBouncer в режиме transaction LISTEN не работает — для подписки нужен
+прямой адрес Postgres в LISTEN_DATABASE_URL.
+"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import asyncpg
+from sqlalchemy import inspect, select, text
+from sqlalchemy.engine import make_url
+
+try:
+    from .cache import TTLCache
+    from .db import ASYNC_DATABASE_URL
+    from .pagination import NEXT_CURSOR_HEADER
+except ImportError:
+    from cache import TTLCache
+    from db import ASYNC_DATABASE_URL
+    from pagination import NEXT_CURSOR_HEADER
+
+
+logger = logging.getLogger(__name__)
+
+REFERENCE_TABLES = ["units", "categories", "materials", "suppliers", "projects", "warehouses"]
+NOTIFY_CHANNEL = "table_versions"
+CHANGES_CHANNEL = "table_changes"
+
+# страховочное время жизни записи (основной сброс — по уведомлениям), сек.
+REFCACHE_TTL = float(os.getenv("REFCACHE_TTL", "300"))
+# сколько страниц держать на таблицу
+REFCACHE_SIZE = int(os.getenv("REFCACHE_SIZE", "1000"))
+LISTEN_DATABASE_URL = os.getenv("LISTEN_DATABASE_URL", ASYNC_DATABASE_URL)
+# как часто проверять живость LISTEN-соединения и пауза перед переподключением, сек.
+LISTEN_HEARTBEAT_S = 10
+LISTEN_RETRY_S = 5
+
+_caches = {table: TTLCache(ttl=REFCACHE_TTL, maxsize=REFCACHE_SIZE) for table in REFERENCE_TABLES}
+# table_name -> (version, updated_at); заполняется при подписке и по уведомлениям
+_versions: Dict[str, Tuple[int, datetime]] = {}
+# table -> обработчики (table, key) зависимых кэшей; key=None — сбросить всё
+_subscribers: Dict[str, List[Callable[[str, Optional[str]], None]]] = defaultdict(list)
+_listening = False
+_listener_task: Optional[asyncio.Task] = None
+
+
+def invalidate(table: str) -> None:
+    """
+    Сброс после записи этим воркером: кэш таблицы и известная версия
+    (следующий запрос прочитает версию из БД, не дожидаясь уведомления).
+    """
+    _versions.pop(table, None)
+    if table in _caches:
+        _caches[table].invalidate()
+
+
+def invalidate_all() -> None:
+    _versions.clear()
+    for table_cache in _caches.values():
+        table_cache.invalidate()
+    for table, callbacks in _subscribers.items():
+        for callback in callbacks:
+            callback(table, None)
+
+
+def subscribe(tables: Iterable[str], callback: Callable[[str, Optional[str]], None]) -> None:
+    """
+    Вызывать callback(table, key) при каждом изменении любой из tables
+    (в любом воркере). key — ключ из уведомления table_changes или None.
+    """
+    for table in tables:
+        _subscribers[table].append(callback)
+
+
+def _notify_subscribers(table: str, key: Optional[str]) -> None:
+    for callback in _subscribers.get(table, ()):
+        try:
+            callback(table, key)
+        except Exception:
+            logger.exception("cache invalidation for %s failed", table)
+
+
+def _remember_version(table: str, version: int, updated_at: datetime) -> None:
+    known = _versions.get(table)
+    if known is None or known[0] < version:
+        _versions[table] = (version, updated_at)
+
+
+def is_coherent() -> bool:
+    """Есть ли подписка на изменения (иначе кэш не используется)."""
+    return _listening
+
+
+def _on_notify(connection, pid, channel, payload) -> None:
+    # '<таблица>:<версия>:<epoch updated_at>' (до миграции 3d87de7c0bde — без epoch)
+    table, _, rest = payload.partition(":")
+    if table in _caches:
+        _caches[table].invalidate()
+    version, _, epoch = rest.partition(":")
+    if epoch:
+        _remember_version(
+            table, int(version), datetime.fromtimestamp(float(epoch), timezone.utc)
+        )
+    else:
+        _versions.pop(table, None)
+    _notify_subscribers(table, None)
+
+
+def _on_change(connection, pid, channel, payload) -> None:
+    # '<таблица>' или '<таблица>:<ключ>' — таблицы без версии
+    table, _, key = payload.partition(":")
+    _notify_subscribers(table, key or None)
+
+
+async def _listen_forever() -> None:
+    global _listening
+    dsn = make_url(LISTEN_DATABASE_URL).set(drivername="postgresql").render_as_string(
+        hide_password=False
+    )
+    while True:
+        conn = None
+        try:
+            conn = await asyncpg.connect(dsn)
+            await conn.add_listener(NOTIFY_CHANNEL, _on_notify)
+            await conn.add_listener(CHANGES_CHANNEL, _on_change)
+            # пока подписки не было, справочники могли поменяться
+            invalidate_all()
+            for row in await conn.fetch(
+                "SELECT table_name, version, updated_at FROM table_versions"
+            ):
+                _remember_version(row["table_name"], row["version"], row["updated_at"])
+            _listening = True
+            while True:
+                await asyncio.sleep(LISTEN_HEARTBEAT_S)
+                await conn.execute("SELECT 1")
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.warning("reference cache listener lost, retrying", exc_info=True)
+        finally:
+            _listening = False
+            if conn is not None:
+                conn.terminate()
+        await asyncio.sleep(LISTEN_RETRY_S)
+
+
+def start() -> None:
+    """Запустить подписку на изменения (из lifespan приложения)."""
+    global _listener_task
+    if _listener_task is None:
+        _listener_task = asyncio.get_running_loop().create_task(_listen_forever())
+
+
+async def stop() -> None:
+    global _listener_task
+    if _listener_task is not None:
+        _listener_task.cancel()
+        try:
+            await _listener_task
+        except asyncio.CancelledError:
+            pass
+        _listener_task = None
+    invalidate_all()
+
+
+def _as_dict(obj) -> dict:
+    return {attr.key: getattr(obj, attr.key) for attr in inspect(type(obj)).column_attrs}
+
+
+async def cached(table: str, key, load):
+    """
+    Значение из кэша таблицы table или результат await load() (и запись в кэш).
+    Пока нет подписки на изменения — всегда load().
+    """
+    if not _listening:
+        return await load()
+
+    table_cache = _caches[table]
+    value = table_cache.get(key)
+    if value is not None:
+        return value
+    generation = table_cache.generation
+    value = await load()
+    table_cache.set(key, value, generation)
+    return value
+
+
+async def fetch_page(page, db, model, key_column) -> list:
+    """
+    То же, что page.fetch(db, select(model), key_column), но через кэш таблицы.
+    """
+    async def load():
+        rows = [_as_dict(obj) for obj in await page.fetch(db, select(model), key_column)]
+        return rows, page.response.headers.get(NEXT_CURSOR_HEADER)
+
+    rows, next_cursor = await cached(model.__tablename__, ("page", page.limit, page.after), load)
+    if next_cursor is not None:
+        page.response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return rows
+
+
+async def table_version(db, table: str) -> Optional[Tuple[int, datetime]]:
+    """
+    Текущая (version, updated_at) таблицы: из памяти, если есть подписка,
+    иначе — одним запросом к table_versions. None — таблица без версии.
+    """
+    if _listening and table in _versions:
+        return _versions[table]
+
+    row = (
+        await db.execute(
+            text("SELECT version, updated_at FROM table_versions WHERE table_name = :table"),
+            {"table": table},
+        )
+    ).first()
+    if row is None:
+        return None
+    if _listening:
+        _remember_version(table, row.version, row.updated_at)
+    return row.version, row.updated_at
@@ -0,0 +1,403 @@
+# app/reports.py
+"""
+Отчёты по остаткам.
+
+Нехватки (shortages): политика минимального остатка (warehouse_material_policy)
+сравнивается с текущим остатком из stock_balances одним запросом по всем парам
+склад×материал. Журнал движений при этом не агрегируется, поэтому время ответа
+не зависит от числа движений.
+
+Доноры (donors): нехватки закрываются перемещениями со складов, где остаток
+материала выше их собственного min_stock (излишек). Распределение жадное —
+самая большая нехватка берёт из самого большого излишка — и тоже считается
+одним запросом: нарастающие суммы нехваток и излишков по материалу
+раскладываются на отрезки одной оси, перемещение — их пересечение.
+
+Стоимость запасов (valuation): суммы по stock_valuation (средняя цена) или
+stock_cost_layers (FIFO), которые ведутся при записи движений (valuation.py),
+с разрезом по складу, проекту или категории (с подкатегориями).
+
+Результаты кэшируются в памяти воркера (см. cache.py). Свой воркер вызывает
+invalidate() сразу после записи движений и политик, остальные — по уведомлению
+об изменении таблиц STOCK_TABLES (refcache.subscribe). Пока подписки нет,
+кэш не читается.
+"""
+
+from typing import List, Optional
+
+from sqlalchemy import distinct, func, literal, null, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+try:
+    from . import models, refcache
+    from .cache import TTLCache
+except ImportError:
+    import models, refcache
+    from cache import TTLCache
+
+
+shortage_cache = TTLCache()
+donor_cache = TTLCache()
+valuation_cache = TTLCache()
+
+# кэши, зависящие от остатков и политик
+STOCK_CACHES = [shortage_cache, donor_cache, valuation_cache]
+# таблицы, от которых зависят отчёты (остатки и стоимость меняются вместе с движениями)
+STOCK_TABLES = (
+    "stock_movements", "warehouse_material_policy", "categories",
+    "materials", "warehouses", "projects",
+)
+
+
+def invalidate() -> None:
+    """Сбросить кэши отчётов после изменения движений / остатков / политик."""
+    for report_cache in STOCK_CACHES:
+        report_cache.invalidate()
+
+
+def on_change(table: str, key: Optional[str] = None) -> None:
+    """Обработчик refcache.subscribe: изменение любой из STOCK_TABLES в любом воркере."""
+    invalidate()
+
+
+def build_shortage_query(
+    project_id: Optional[int] = None,
+    warehouse_id: Optional[int] = None,
+    category_id: Optional[int] = None,
+):
+    """
+    Пары склад×материал, у которых остаток ниже min_stock.
+    Отсутствующая строка в stock_balances означает нулевой остаток.
+    category_id — категория вместе со всеми подкатегориями.
+    """
+    policy = models.WarehouseMaterialPolicy
+    balance = models.StockBalance
+    warehouse = models.Warehouse
+    material = models.Material
+
+    qty = func.coalesce(balance.qty, 0)
+    stmt = (
+        select(
+            policy.warehouse_id,
+            warehouse.name.label("warehouse_name"),
+            warehouse.project_id,
+            policy.material_id,
+            material.sku,
+            material.name.label("material_name"),
+            material.category_id,
+            policy.min_stock,
+            qty.label("qty"),
+            (policy.min_stock - qty).label("deficit"),
+        )
+        .join(warehouse, warehouse.warehouse_id == policy.warehouse_id)
+        .join(material, material.material_id == policy.material_id)
+        .outerjoin(
+            balance,
+            (balance.warehouse_id == policy.warehouse_id)
+            & (balance.material_id == policy.material_id),
+        )
+        .where(policy.min_stock.is_not(None), qty < policy.min_stock)
+        .order_by(policy.warehouse_id, policy.material_id)
+    )
+    if project_id is not None:
+        stmt = stmt.where(warehouse.project_id == project_id)
+    if warehouse_id is not None:
+        stmt = stmt.where(policy.warehouse_id == warehouse_id)
+    if category_id is not None:
+        closure = models.CategoryClosure
+        stmt = stmt.join(closure, closure.descendant_id == material.category_id).where(
+            closure.ancestor_id == category_id
+        )
+    return stmt
+
+
+async def shortages(
+    db: AsyncSession,
+    project_id: Optional[int] = None,
+    warehouse_id: Optional[int] = None,
+    category_id: Optional[int] = None,
+) -> List[dict]:
+    key = (project_id, warehouse_id, category_id)
+    cached = shortage_cache.get(key) if refcache.is_coherent() else None
+    if cached is not None:
+        return cached
+
+    generation = shortage_cache.generation
+    result = await db.execute(build_shortage_query(project_id, warehouse_id, category_id))
+    rows = [dict(row) for row in result.mappings()]
+    shortage_cache.set(key, rows, generation)
+    return rows
+
+
+def build_donor_query(
+    warehouse_id: Optional[int] = None,
+    material_id: Optional[int] = None,
+):
+    """
+    Предлагаемые перемещения (TRANSFER) излишков в склады с нехваткой.
+    warehouse_id / material_id ограничивают набор нехваток (получателей);
+    донорами остаются все склады.
+    """
+    policy = models.WarehouseMaterialPolicy.__table__
+    balance = models.StockBalance.__table__
+
+    # вся матрица склад×материал (есть остаток и/или политика) — один проход
+    # по обеим таблицам; нет строки остатка — ноль, нет политики — минимум ноль
+    matrix = (
+        select(
+            func.coalesce(balance.c.warehouse_id, policy.c.warehouse_id).label("warehouse_id"),
+            func.coalesce(balance.c.material_id, policy.c.material_id).label("material_id"),
+            func.coalesce(balance.c.qty, 0).label("qty"),
+            policy.c.min_stock,
+        )
+        .select_from(
+            balance.join(
+                policy,
+                (policy.c.warehouse_id == balance.c.warehouse_id)
+                & (policy.c.material_id == balance.c.material_id),
+                full=True,
+            )
+        )
+        .cte("matrix")
+    )
+
+    need = select(
+        matrix.c.warehouse_id,
+        matrix.c.material_id,
+        (matrix.c.min_stock - matrix.c.qty).label("amount"),
+    ).where(matrix.c.qty < matrix.c.min_stock)
+    if warehouse_id is not None:
+        need = need.where(matrix.c.warehouse_id == warehouse_id)
+    if material_id is not None:
+        need = need.where(matrix.c.material_id == material_id)
+    need = need.cte("need")
+
+    need_total = (
+        select(need.c.material_id, func.sum(need.c.amount).label("total"))
+        .group_by(need.c.material_id)
+        .cte("need_total")
+    )
+
+    # излишки: остаток выше своего min_stock, только по материалам,
+    # которых где-то не хватает
+    spare = func.coalesce(matrix.c.min_stock, 0)
+    have = (
+        select(
+            matrix.c.warehouse_id,
+            matrix.c.material_id,
+            (matrix.c.qty - spare).label("amount"),
+            need_total.c.total,
+        )
+        .join(need_total, need_total.c.material_id == matrix.c.material_id)
+        .where(matrix.c.qty > spare)
+        .cte("have")
+    )
+
+    def queue(cte):
+        # строка занимает отрезок (hi - amount, hi] в очереди по материалу
+        # (по убыванию amount); hi внутри материала строго возрастает
+        return func.sum(cte.c.amount).over(
+            partition_by=cte.c.material_id,
+            order_by=(cte.c.amount.desc(), cte.c.warehouse_id),
+        )
+
+    need_q = select(
+        need.c.warehouse_id, need.c.material_id, queue(need).label("hi")
+    ).cte("need_queue")
+
+    # излишки, начинающиеся дальше суммарной нехватки материала, не понадобятся
+    have_ranked = select(
+        have.c.warehouse_id,
+        have.c.material_id,
+        queue(have).label("hi"),
+        have.c.amount,
+        have.c.total,
+    ).subquery("have_ranked")
+    have_q = (
+        select(have_ranked.c.warehouse_id, have_ranked.c.material_id, have_ranked.c.hi)
+        .where(have_ranked.c.hi - have_ranked.c.amount < have_ranked.c.total)
+        .cte("have_queue")
+    )
+
+    # Все концы отрезков обеих очередей делят ось на куски (prev_point, point].
+    # Кусок принадлежит той нехватке и тому излишку, чей hi — ближайший
+    # сверху, т.е. минимум hi по точкам >= point (нарастающий min при обходе
+    # по убыванию — линейно, без попарного сравнения отрезков).
+    points = union_all(
+        select(
+            need_q.c.material_id,
+            need_q.c.hi.label("point"),
+            need_q.c.hi.label("need_hi"),
+            null().label("have_hi"),
+        ),
+        select(
+            have_q.c.material_id,
+            have_q.c.hi,
+            null(),
+            have_q.c.hi,
+        ),
+    ).subquery("points")
+
+    by_point_desc = {"partition_by": points.c.material_id, "order_by": points.c.point.desc()}
+    pieces = select(
+        points.c.material_id,
+        (
+            points.c.point
+            - func.coalesce(
+                func.lag(points.c.point).over(
+                    partition_by=points.c.material_id, order_by=points.c.point
+                ),
+                0,
+            )
+        ).label("qty"),
+        func.min(points.c.need_hi).over(**by_point_desc).label("need_hi"),
+        func.min(points.c.have_hi).over(**by_point_desc).label("have_hi"),
+    ).subquery("pieces")
+
+    # куски за пределами меньшей из очередей (need_hi или have_hi пуст) отпадают на join
+    return (
+        select(
+            literal("TRANSFER").label("move_type"),
+            pieces.c.material_id,
+            have_q.c.warehouse_id.label("from_warehouse_id"),
+            need_q.c.warehouse_id.label("to_warehouse_id"),
+            func.sum(pieces.c.qty).label("qty"),
+        )
+        .join(
+            need_q,
+            (need_q.c.material_id == pieces.c.material_id) & (need_q.c.hi == pieces.c.need_hi),
+        )
+        .join(
+            have_q,
+            (have_q.c.material_id == pieces.c.material_id) & (have_q.c.hi == pieces.c.have_hi),
+        )
+        .where(pieces.c.qty > 0)
+        .group_by(
+            pieces.c.material_id,
+            need_q.c.hi,
+            need_q.c.warehouse_id,
+            have_q.c.hi,
+            have_q.c.warehouse_id,
+        )
+        .order_by(pieces.c.material_id, need_q.c.hi, have_q.c.hi)
+    )
+
+
+async def donors(
+    db: AsyncSession,
+    warehouse_id: Optional[int] = None,
+    material_id: Optional[int] = None,
+) -> List[dict]:
+    key = (warehouse_id, material_id)
+    cached = donor_cache.get(key) if refcache.is_coherent() else None
+    if cached is not None:
+        return cached
+
+    generation = donor_cache.generation
+    result = await db.execute(build_donor_query(warehouse_id, material_id))
+    rows = [dict(row) for row in result.mappings()]
+    donor_cache.set(key, rows, generation)
+    return rows
+
+
+def build_valuation_query(
+    group_by: str = "warehouse",
+    project_id: Optional[int] = None,
+    warehouse_id: Optional[int] = None,
+    category_id: Optional[int] = None,
+    method: str = "avg",
+):
+    """
+    Стоимость запасов по группам group_by (warehouse / project / category): id и name группы,
+    число материалов, qty и value. method="fifo" — по открытым FIFO-слоям
+    (qty — количество, покрытое слоями). По категории материал входит
+    в свою категорию и во все её предки; с фильтром category_id — только
+    категории его поддерева.
+    """
+    warehouse = models.Warehouse
+    material = models.Material
+
+    if method == "fifo":
+        layer = models.StockCostLayer
+        stock = select(
+            layer.warehouse_id,
+            layer.material_id,
+            layer.qty,
+            (layer.qty * layer.unit_cost).label("value"),
+        ).subquery("stock")
+    else:
+        valuation = models.StockValuation
+        stock = select(
+            valuation.warehouse_id,
+            valuation.material_id,
+            valuation.qty,
+            valuation.value,
+        ).subquery("stock")
+
+    stmt = select(stock).join(warehouse, warehouse.warehouse_id == stock.c.warehouse_id)
+    if group_by == "category":
+        rollup = aliased(models.CategoryClosure, name="rollup")
+        category = models.Category
+        key, name = rollup.ancestor_id, category.name
+        stmt = (
+            stmt.join(material, material.material_id == stock.c.material_id)
+            .join(rollup, rollup.descendant_id == material.category_id)
+            .join(category, category.category_id == rollup.ancestor_id)
+        )
+    elif group_by == "project":
+        project = models.Project
+        key, name = warehouse.project_id, project.name
+        stmt = stmt.join(project, project.project_id == warehouse.project_id)
+    else:
+        key, name = warehouse.warehouse_id, warehouse.name
+
+    if project_id is not None:
+        stmt = stmt.where(warehouse.project_id == project_id)
+    if warehouse_id is not None:
+        stmt = stmt.where(stock.c.warehouse_id == warehouse_id)
+    if category_id is not None:
+        subtree = aliased(models.CategoryClosure, name="subtree")
+        if group_by == "category":
+            # группы — только категории поддерева (их материалы и так из него)
+            stmt = stmt.join(subtree, subtree.descendant_id == key)
+        else:
+            stmt = (
+                stmt.join(material, material.material_id == stock.c.material_id)
+                .join(subtree, subtree.descendant_id == material.category_id)
+            )
+        stmt = stmt.where(subtree.ancestor_id == category_id)
+
+    return (
+        stmt.with_only_columns(
+            key.label("id"),
+            name.label("name"),
+            func.count(distinct(stock.c.material_id)).label("materials"),
+            func.sum(stock.c.qty).label("qty"),
+            func.sum(stock.c.value).label("value"),
+        )
+        .group_by(key, name)
+        .order_by(key)
+    )
+
+
+async def valuation(
+    db: AsyncSession,
+    group_by: str = "warehouse",
+    project_id: Optional[int] = None,
+    warehouse_id: Optional[int] = None,
+    category_id: Optional[int] = None,
+    method: str = "avg",
+) -> List[dict]:
+    key = (group_by, project_id, warehouse_id, category_id, method)
+    cached = valuation_cache.get(key) if refcache.is_coherent() else None
+    if cached is not None:
+        return cached
+
+    generation = valuation_cache.generation
+    result = await db.execute(
+        build_valuation_query(group_by, project_id, warehouse_id, category_id, method)
+    )
+    rows = [dict(row) for row in result.mappings()]
+    valuation_cache.set(key, rows, generation)
+    return rows
@@ -1,8 +1,8 @@
 # app/schemas.py
 
 from datetime import date
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Any, List, Optional
 
 
 # ===== UNITS =====
@@ -19,8 +19,7 @@ class UnitCreate(UnitBase):
 class Unit(UnitBase):
     unit_id: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # ===== CATEGORIES =====
@@ -37,8 +36,36 @@ class CategoryCreate(CategoryBase):
 class Category(CategoryBase):
     category_id: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+
+class CategoryUpdate(BaseModel):
+    """Переименование и/или перенос категории (parent_id = null — в корень)."""
+    name: Optional[str] = None
+    parent_id: Optional[int] = None
+
+
+class CategoryTreeNode(BaseModel):
+    category_id: int
+    name: str
+    parent_id: Optional[int] = None
+    children: List["CategoryTreeNode"] = []
+
+
+class CategoryUnitStock(BaseModel):
+    unit_id: int
+    symbol: Optional[str] = None
+    qty: float
+    materials: int
+
+
+class CategoryStock(BaseModel):
+    """Остаток по категории вместе со всеми подкатегориями — по единицам измерения."""
+    category_id: int
+    name: str
+    parent_id: Optional[int] = None
+    materials: int
+    units: List[CategoryUnitStock]
 
 
 # ===== MATERIALS =====
@@ -57,8 +84,7 @@ class MaterialCreate(MaterialBase):
 class Material(MaterialBase):
     material_id: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # ===== SUPPLIERS =====
@@ -77,8 +103,7 @@ class SupplierCreate(SupplierBase):
 class Supplier(SupplierBase):
     supplier_id: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # ===== SUPPLIER MATERIALS (номенклатура поставщика) =====
@@ -98,8 +123,7 @@ class SupplierMaterialCreate(SupplierMaterialBase):
 class SupplierMaterial(SupplierMaterialBase):
     sup_id: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # ===== SUPPLIER MATERIAL PRICES (история цен) =====
@@ -119,8 +143,29 @@ class SupplierMaterialPriceCreate(SupplierMaterialPriceBase):
 class SupplierMaterialPrice(SupplierMaterialPriceBase):
     price_id: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+
+# ===== OFFERS (актуальные предложения поставщиков) =====
+
+class Offer(BaseModel):
+    supplier_id: int
+    supplier_name: str
+    price: float                # последняя цена поставщика
+    currency: Optional[str] = None
+    price_date: date
+    lead_time_days: Optional[int] = None
+    min_order_qty: Optional[float] = None
+    rank: int                   # 1 — самое дешёвое (при равной цене — быстрее)
+
+
+class MaterialOffers(BaseModel):
+    material_id: int
+    offers: List[Offer]
+
+
+class OfferLookupRequest(BaseModel):
+    material_ids: List[int] = Field(..., min_length=1, max_length=1000)
 
 
 # ===== PROJECTS =====
@@ -140,8 +185,7 @@ class ProjectCreate(ProjectBase):
 class Project(ProjectBase):
     project_id: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # ===== WAREHOUSES =====
@@ -160,8 +204,7 @@ class WarehouseCreate(WarehouseBase):
 class Warehouse(WarehouseBase):
     warehouse_id: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # ===== WAREHOUSE MATERIAL POLICY (минимальные остатки) =====
@@ -177,8 +220,7 @@ class WarehouseMaterialPolicyCreate(WarehouseMaterialPolicyBase):
 
 
 class WarehouseMaterialPolicy(WarehouseMaterialPolicyBase):
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 
@@ -192,15 +234,23 @@ class PurchaseOrderBase(BaseModel):
     status: Optional[str] = None
 
 
+class PurchaseOrderItemCreate(BaseModel):
+    """Позиция, создаваемая вместе с заявкой (po_id ещё нет)."""
+    material_id: int
+    qty_ordered: float
+    unit_price: float
+    currency: str
+
+
 class PurchaseOrderCreate(PurchaseOrderBase):
-    pass
+    # позиции вставляются в той же транзакции, что и заявка; материал — не больше одного раза
+    items: List[PurchaseOrderItemCreate] = Field(default_factory=list, max_length=5000)
 
 
 class PurchaseOrder(PurchaseOrderBase):
     po_id: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # ===== PO ITEMS =====
@@ -220,8 +270,42 @@ class POItemCreate(POItemBase):
 class POItem(POItemBase):
     po_item_id: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+
+class PurchaseOrderWithItems(PurchaseOrder):
+    items: List[POItem]
+
+
+# ===== REPLENISHMENT (автопополнение) =====
+
+class ReplenishmentItem(BaseModel):
+    po_item_id: Optional[int] = None    # нет при dry_run
+    material_id: int
+    qty_ordered: float                  # max(need, min_order_qty поставщика)
+    unit_price: float                   # последняя цена выбранного поставщика
+    currency: Optional[str] = None
+    deficit: float                      # min_stock - остаток
+    on_order: float                     # уже заказано по открытым заявкам
+    need: float                         # deficit - on_order
+    lead_time_days: Optional[int] = None
+
+
+class ReplenishmentOrder(PurchaseOrderBase):
+    po_id: Optional[int] = None         # нет при dry_run
+    items: List[ReplenishmentItem]
+
+
+class UnassignedShortage(BaseModel):
+    warehouse_id: int
+    material_id: int
+    need: float                         # ни у одного поставщика нет цены
+
+
+class ReplenishmentPlan(BaseModel):
+    dry_run: bool
+    orders: List[ReplenishmentOrder]
+    unassigned: List[UnassignedShortage]
 
 
 
@@ -266,5 +350,57 @@ class StockMovementCreate(StockMovementBase):
 class StockMovement(StockMovementBase):
     move_id: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+
+class BulkItemError(BaseModel):
+    index: int                  # позиция строки во входном массиве
+    detail: Any
+
+
+class StockMovementBulkResult(BaseModel):
+    inserted: int
+    move_ids: List[Optional[int]]   # по позициям входа, None — строка не вставлена
+    errors: List[BulkItemError]
+
+
+
+# ===== STOCK BALANCES (текущие остатки) =====
+
+class StockBalance(BaseModel):
+    warehouse_id: int
+    material_id: int
+    qty: float
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+# ===== REPORTS =====
+
+class Shortage(BaseModel):
+    warehouse_id: int
+    warehouse_name: str
+    project_id: int
+    material_id: int
+    sku: str
+    material_name: str
+    category_id: int
+    min_stock: float
+    qty: float
+    deficit: float              # min_stock - qty
+
+
+class ValuationRow(BaseModel):
+    id: int                     # warehouse_id / project_id / category_id
+    name: str
+    materials: int              # разных материалов в группе
+    qty: float
+    value: float                # qty * себестоимость
+
+
+class TransferSuggestion(BaseModel):
+    move_type: str              # всегда 'TRANSFER'
+    material_id: int
+    from_warehouse_id: int      # донор (остаток выше своего min_stock)
+    to_warehouse_id: int        # склад с нехваткой
+    qty: float
@@ -0,0 +1,130 @@
+# app/search.py
+"""
+Поиск материалов по артикулу и названию (GET /materials/search).
+
+Режимы:
+- prefix — автодополнение: сначала артикулы, начинающиеся с q, затем названия,
+  начинающиеся с q, затем (если q не короче MIN_FUZZY_LENGTH) названия,
+  в которых с q начинается любое слово. Первые две выборки идут по
+  btree-индексам lower(...) COLLATE "C" прямо в порядке сортировки
+  и останавливаются на limit строках, поэтому время ответа не зависит от того,
+  сколько материалов подходит под префикс; следующая выборка выполняется,
+  только если предыдущих не хватило до limit.
+- fuzzy — фрагменты и опечатки: индексы триграмм pg_trgm (GIN) по name и sku.
+  Порядок: точное совпадение артикула, затем строки, содержащие q целиком,
+  затем по убыванию похожести (word_similarity для названия, similarity
+  для артикула).
+
+Регистр не учитывается. Индексы — миграция a41f7c2d9e58.
+"""
+
+from typing import Dict, List
+
+from sqlalchemy import func, literal, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+try:
+    from . import models
+except ImportError:
+    import models
+
+
+MODES = ("prefix", "fuzzy")
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+# по 1–2 символам триграммы почти ничего не отсекают — такой запрос ищем как префикс
+MIN_FUZZY_LENGTH = 3
+# экранирующий символ LIKE / ILIKE в Postgres по умолчанию
+LIKE_ESCAPE = "\\"
+
+
+def like_escape(value: str) -> str:
+    """Экранирует %, _ и \\ — символы запроса ищутся буквально."""
+    return (
+        value.replace(LIKE_ESCAPE, LIKE_ESCAPE * 2)
+        .replace("%", LIKE_ESCAPE + "%")
+        .replace("_", LIKE_ESCAPE + "_")
+    )
+
+
+def prefix_queries(q: str, limit: int) -> list:
+    """Выборки режима prefix в порядке приоритета, каждая — не больше limit строк."""
+    material = models.Material
+    needle = like_escape(q.lower())
+    # те же выражения, что в индексах ix_materials_sku_prefix / ix_materials_name_prefix
+    sku_lower = func.lower(material.sku).collate("C")
+    name_lower = func.lower(material.name).collate("C")
+
+    queries = [
+        select(material)
+        .where(sku_lower.like(needle + "%"))
+        .order_by(sku_lower)
+        .limit(limit),
+        select(material)
+        .where(name_lower.like(needle + "%"))
+        .order_by(name_lower)
+        .limit(limit),
+    ]
+    if len(q) >= MIN_FUZZY_LENGTH:
+        # начало любого слова, кроме первого (первое — выборка выше), по индексу
+        # триграмм; без ORDER BY — иначе пришлось бы читать все совпадения
+        queries.append(
+            select(material)
+            .where(material.name.ilike("% " + needle + "%"))
+            .limit(limit)
+        )
+    return queries
+
+
+def fuzzy_query(q: str, limit: int):
+    """Поиск по фрагментам и с опечатками, лучшие совпадения первыми."""
+    material = models.Material
+    needle = "%" + like_escape(q) + "%"
+    contains = or_(
+        material.name.ilike(needle),
+        material.sku.ilike(needle),
+    )
+    score = func.greatest(
+        func.word_similarity(q, material.name),
+        func.similarity(q, material.sku),
+    )
+    return (
+        select(material)
+        .where(
+            or_(
+                contains,
+                # q похож на какое-то слово названия / на артикул (пороги pg_trgm)
+                literal(q).op("<%")(material.name),
+                material.sku.op("%")(q),
+            )
+        )
+        .order_by(
+            (func.lower(material.sku) == q.lower()).desc(),
+            contains.desc(),
+            score.desc(),
+            material.material_id,
+        )
+        .limit(limit)
+    )
+
+
+async def search(
+    db: AsyncSession,
+    q: str,
+    mode: str = "fuzzy",
+    limit: int = DEFAULT_LIMIT,
+) -> List[models.Material]:
+    q = q.strip()
+    if not q:
+        return []
+
+    if mode == "fuzzy" and len(q) >= MIN_FUZZY_LENGTH:
+        return list((await db.execute(fuzzy_query(q, limit))).scalars())
+
+    found: Dict[int, models.Material] = {}
+    for stmt in prefix_queries(q, limit):
+        for material in (await db.execute(stmt)).scalars():
+            found.setdefault(material.material_id, material)
+        if len(found) >= limit:
+            break
+    return list(found.values())[:limit]
@@ -1,4 +1,9 @@
+import argparse
+import csv
+import io
+import multiprocessing
 import random
+import time
 from datetime import date, timedelta  # ← вот это добавили
 
 from sqlalchemy.orm import Session
@@ -6,14 +11,22 @@ from sqlalchemy import text
 
 try:
     # когда запускаем локально как модуль: python -m app.seed
-    from app.db import SessionLocal
-    from app import models
+    from app.db import SessionLocal, engine
+    from app import balances, models, partitions, snapshots, valuation
 except ImportError:
     # когда запускаем в контейнере из /code: python seed.py
-    from db import SessionLocal
+    from db import SessionLocal, engine
+    import balances
     import models
-    
-def seed_big():
+    import partitions
+    import snapshots
+    import valuation
+
+DEFAULT_SEED = 42
+
+
+def seed_big(seed: int = DEFAULT_SEED):
+    random.seed(seed)  # одинаковый seed — одинаковые данные
     db = SessionLocal()
     try:
         print("Truncating tables...")
@@ -166,5 +179,375 @@ def seed_big():
         db.close()
 
 
+
+
+# ===== SCALE SEED (COPY) =====
+# Масштабируемые данные для нагрузочных прогонов: все таблицы, включая проекты,
+# склады, политики, заявки и журнал движений. Всё генерируется из seed
+# (одинаковые seed и scale — одинаковые данные, в том числе при любом числе
+# воркеров) и грузится через COPY с явными id; последовательности потом
+# сдвигаются на max(id).
+#
+#     python -m seed --scale 1 --workers 4     # ~1 млн движений
+#     python -m seed --scale 10 --workers 8    # ~10 млн движений
+
+MOVEMENTS_PER_SCALE = 1_000_000
+HISTORY_MONTHS = 24
+CHUNK_ROWS = 100_000            # движений в одном COPY (и в одной задаче воркера)
+ASSORTMENT = 100                # материалов, которые "живут" на одном складе
+WAREHOUSES_PER_PROJECT = 4      # MAIN + 3 SITE
+PRICE_POINTS = 12               # помесячных цен на пару поставщик×материал
+IN_SHARE, OUT_SHARE = 0.45, 0.35  # остальное — TRANSFER
+
+SCALE_TABLES = (
+    "units", "categories", "suppliers", "materials", "supplier_materials",
+    "supplier_material_prices", "projects", "warehouses", "warehouse_material_policy",
+    "purchase_orders", "po_items", "stock_movements",
+)
+SERIAL_COLUMNS = {
+    "units": "unit_id",
+    "categories": "category_id",
+    "suppliers": "supplier_id",
+    "materials": "material_id",
+    "supplier_materials": "sup_id",
+    "supplier_material_prices": "price_id",
+    "projects": "project_id",
+    "warehouses": "warehouse_id",
+    "purchase_orders": "po_id",
+    "po_items": "po_item_id",
+    "stock_movements": "move_id",
+}
+MOVEMENT_COLUMNS = (
+    "move_id", "move_type", "move_date", "status", "supplier_id",
+    "from_warehouse_id", "to_warehouse_id", "project_id", "material_id", "qty", "unit_price",
+)
+CITIES = ("Алматы", "Астана", "Шымкент", "Караганда", "Актобе", "Атырау")
+
+
+def scale_sizes(scale: float) -> dict:
+    """Размеры таблиц для коэффициента scale (1 — около миллиона движений)."""
+    return {
+        "suppliers": max(10, round(100 * scale)),
+        "materials": max(60, round(5000 * scale)),
+        "projects": max(5, round(20 * scale)),
+        "purchase_orders": max(100, round(20000 * scale)),
+        "movements": max(1, round(MOVEMENTS_PER_SCALE * scale)),
+    }
+
+
+def copy_rows(cursor, table: str, columns, rows) -> int:
+    """
+    COPY строк-кортежей в таблицу (CSV; None -> NULL). Возвращает число строк.
+    """
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    buf.seek(0)
+    cursor.copy_expert(
+        f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buf
+    )
+    return count
+
+
+def _reference_tables(rng: random.Random, sizes: dict, today: date):
+    """
+    Справочники, проекты, склады, политики и заявки.
+    Возвращает [(таблица, колонки, строки)] в порядке загрузки
+    и контекст для генерации движений.
+    """
+    tables = []
+
+    units = [(i, name, symbol) for i, (name, symbol) in enumerate(
+        [("Штука", "шт"), ("Метры", "м"), ("Килограммы", "кг"),
+         ("Квадратные метры", "м2"), ("Кубические метры", "м3"), ("Комплект", "компл")],
+        start=1,
+    )]
+    tables.append(("units", ("unit_id", "name", "symbol"), units))
+
+    # корни, затем по 4 подкатегории — материалы висят на листьях
+    roots = ["Кабельная продукция", "Трубопровод", "Арматура и металлопрокат", "Сухие смеси", "Крепёж"]
+    categories = [(i, name, None) for i, name in enumerate(roots, start=1)]
+    leaves = []
+    for root_id, root in enumerate(roots, start=1):
+        for j in range(1, 5):
+            category_id = len(categories) + 1
+            categories.append((category_id, f"{root} / группа {j}", root_id))
+            leaves.append((category_id, root))
+    tables.append(("categories", ("category_id", "name", "parent_id"), categories))
+
+    suppliers = [
+        (i, f"ТОО Поставщик {i}", f"+7 700 {i // 10000 % 1000:03d} {i // 100 % 100:02d} {i % 100:02d}",
+         f"info{i}@example.kz", f"{100000000000 + i}")
+        for i in range(1, sizes["suppliers"] + 1)
+    ]
+    tables.append(("suppliers", ("supplier_id", "name", "phone", "email", "bin_iin"), suppliers))
+
+    materials = []
+    for i in range(1, sizes["materials"] + 1):
+        category_id, root = rng.choice(leaves)
+        materials.append((i, f"M-{i:05d}", f"{root} #{i}", rng.randint(1, len(units)), category_id))
+    tables.append(("materials", ("material_id", "sku", "name", "unit_id", "category_id"), materials))
+
+    # предложения: поставщик возит 8..40 материалов со своей базовой ценой
+    supplier_materials, prices = [], []
+    offers_by_material = {}
+    offers_by_supplier = {}
+    first_month = partitions.add_months(today.replace(day=1), -(PRICE_POINTS - 1))
+    for supplier_id, *_ in suppliers:
+        count = rng.randint(8, min(40, len(materials)))
+        for material_id in sorted(rng.sample(range(1, len(materials) + 1), count)):
+            base_price = rng.randint(500, 20000)
+            supplier_materials.append((
+                len(supplier_materials) + 1, supplier_id, material_id,
+                rng.choice([3, 5, 7, 10, 14]), rng.choice([10, 20, 50, 100, 200]), "KZT",
+            ))
+            offers_by_material.setdefault(material_id, []).append((supplier_id, base_price))
+            offers_by_supplier.setdefault(supplier_id, []).append((material_id, base_price))
+            for k in range(PRICE_POINTS):
+                prices.append((
+                    len(prices) + 1, supplier_id, material_id,
+                    round(base_price * rng.uniform(0.9, 1.1), 2), "KZT",
+                    partitions.add_months(first_month, k),
+                ))
+    tables.append((
+        "supplier_materials",
+        ("sup_id", "supplier_id", "material_id", "lead_time_days", "min_order_qty", "currency"),
+        supplier_materials,
+    ))
+    tables.append((
+        "supplier_material_prices",
+        ("price_id", "supplier_id", "material_id", "price", "currency", "price_date"),
+        prices,
+    ))
+
+    projects = [
+        (i, f"P-{i:04d}", f"Объект {i}", rng.choice(CITIES), f"Заказчик {rng.randint(1, 50)}", None)
+        for i in range(1, sizes["projects"] + 1)
+    ]
+    tables.append(("projects", ("project_id", "code", "name", "city", "customer", "address"), projects))
+
+    warehouses = []
+    for project_id, code, *_ in projects:
+        for j in range(WAREHOUSES_PER_PROJECT):
+            warehouses.append((
+                len(warehouses) + 1, project_id, f"Склад {code}-{j + 1}",
+                "MAIN" if j == 0 else "SITE", None,
+            ))
+    tables.append(("warehouses", ("warehouse_id", "project_id", "name", "type", "address"), warehouses))
+
+    # ассортимент склада — материалы, у которых есть поставщики; на него же политика
+    offered = sorted(offers_by_material)
+    assortment = {
+        warehouse_id: sorted(rng.sample(offered, min(ASSORTMENT, len(offered))))
+        for warehouse_id, *_ in warehouses
+    }
+    policies = [
+        (warehouse_id, material_id, rng.randint(5, 50) * 10)
+        for warehouse_id, materials_ in assortment.items()
+        for material_id in materials_
+    ]
+    tables.append(("warehouse_material_policy", ("warehouse_id", "material_id", "min_stock"), policies))
+
+    # заявки: материалы поставщика без повторов (uq_po_material)
+    start = partitions.add_months(today.replace(day=1), -HISTORY_MONTHS)
+    history_days = (today - start).days + 1
+    orders, items = [], []
+    supplier_ids = sorted(offers_by_supplier)
+    for po_id in range(1, sizes["purchase_orders"] + 1):
+        supplier_id = rng.choice(supplier_ids)
+        order_date = start + timedelta(days=rng.randrange(history_days))
+        age = (today - order_date).days
+        status = "RECEIVED" if age > 30 else rng.choice(["NEW", "SENT", "RECEIVED"])
+        orders.append((
+            po_id, supplier_id, rng.randint(1, len(warehouses)),
+            order_date, order_date + timedelta(days=rng.choice([3, 5, 7, 10, 14])), status,
+        ))
+        offer = offers_by_supplier[supplier_id]
+        for material_id, base_price in rng.sample(offer, rng.randint(1, min(8, len(offer)))):
+            items.append((
+                len(items) + 1, po_id, material_id, rng.randint(1, 50) * 10,
+                round(base_price * rng.uniform(0.95, 1.05), 2), "KZT",
+            ))
+    tables.append((
+        "purchase_orders",
+        ("po_id", "supplier_id", "warehouse_id", "order_date", "expected_date", "status"),
+        orders,
+    ))
+    tables.append((
+        "po_items",
+        ("po_item_id", "po_id", "material_id", "qty_ordered", "unit_price", "currency"),
+        items,
+    ))
+
+    project_of = {warehouse_id: project_id for warehouse_id, project_id, *_ in warehouses}
+    context = {
+        "total": sizes["movements"],
+        "start": start,
+        "days": history_days,
+        "warehouses": [(warehouse_id, project_of[warehouse_id]) for warehouse_id, *_ in warehouses],
+        "siblings": {
+            warehouse_id: [w for w, p in project_of.items() if p == project_of[warehouse_id] and w != warehouse_id]
+            for warehouse_id in project_of
+        },
+        "assortment": assortment,
+        "offers": offers_by_material,
+    }
+    return tables, context
+
+
+def movement_rows(context: dict, seed: int, chunk: int):
+    """
+    Движения одного куска: move_id с chunk * CHUNK_ROWS + 1. Свой генератор
+    на кусок — результат не зависит от числа воркеров и порядка загрузки.
+    Даты растут вместе с move_id и равномерно покрывают историю.
+    """
+    rng = random.Random(f"{seed}:movements:{chunk}")
+    total, start, days = context["total"], context["start"], context["days"]
+    warehouses, siblings = context["warehouses"], context["siblings"]
+    assortment, offers = context["assortment"], context["offers"]
+    first_id = chunk * CHUNK_ROWS + 1
+    last_id = min(total, first_id + CHUNK_ROWS - 1)
+    dates = {}
+    for move_id in range(first_id, last_id + 1):
+        offset = (move_id - 1) * days // total
+        move_date = dates.get(offset) or dates.setdefault(offset, start + timedelta(days=offset))
+        warehouse_id, project_id = rng.choice(warehouses)
+        material_id = rng.choice(assortment[warehouse_id])
+        kind = rng.random()
+        if kind < IN_SHARE:
+            supplier_id, base_price = rng.choice(offers[material_id])
+            yield (move_id, "IN", move_date, "DONE", supplier_id, None, warehouse_id, project_id,
+                   material_id, rng.randint(10, 500), round(base_price * rng.uniform(0.9, 1.1), 2))
+        elif kind < IN_SHARE + OUT_SHARE or not siblings[warehouse_id]:
+            yield (move_id, "OUT", move_date, "DONE", None, warehouse_id, None, project_id,
+                   material_id, rng.randint(1, 100), None)
+        else:
+            yield (move_id, "TRANSFER", move_date, "DONE", None, warehouse_id,
+                   rng.choice(siblings[warehouse_id]), project_id, material_id, rng.randint(1, 100), None)
+
+
+_worker_context = None
+
+
+def _init_worker(context: dict) -> None:
+    global _worker_context
+    _worker_context = context
+    # соединения родителя после fork не используем
+    engine.dispose(close=False)
+
+
+def _load_movements(task) -> int:
+    seed, chunk = task
+    conn = engine.raw_connection()
+    try:
+        with conn.cursor() as cursor:
+            count = copy_rows(cursor, "stock_movements", MOVEMENT_COLUMNS,
+                              movement_rows(_worker_context, seed, chunk))
+        conn.commit()
+        return count
+    finally:
+        conn.close()
+
+
+def seed_scale(scale: float, workers: int = 1, seed: int = DEFAULT_SEED, today: date = None) -> dict:
+    """
+    Полное заполнение всех таблиц на масштабе scale. Справочники грузятся
+    одной транзакцией, движения — кусками по CHUNK_ROWS в workers процессах,
+    затем пересчитываются stock_balances, stock_valuation, закрываются
+    прошедшие месяцы (снимки остатков) и собирается статистика (ANALYZE).
+    Возвращает число строк по таблицам.
+    """
+    today = today or date.today()
+    sizes = scale_sizes(scale)
+    tables, context = _reference_tables(random.Random(seed), sizes, today)
+    counts = {}
+
+    started = time.perf_counter()
+    db = SessionLocal()
+    try:
+        db.execute(text(
+            f"TRUNCATE TABLE {', '.join(SCALE_TABLES)}, stock_balances, stock_valuation, "
+            "stock_cost_layers, stock_balance_snapshots, stock_snapshot_periods, category_closure "
+            "RESTART IDENTITY CASCADE"
+        ))
+        # секции заранее — движения сразу ложатся по месяцам, а не в DEFAULT
+        existing = set(partitions.list_partitions(db))
+        month = context["start"]
+        while month <= today:
+            if month not in existing:
+                partitions.create_partition(db, month)
+            month = partitions.add_months(month, 1)
+        partitions.ensure_partitions(db, today=today)
+
+        cursor = db.connection().connection.cursor()
+        for table, columns, rows in tables:
+            counts[table] = copy_rows(cursor, table, columns, rows)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    print(f"References loaded in {time.perf_counter() - started:.1f} s")
+
+    started = time.perf_counter()
+    tasks = [(seed, chunk) for chunk in range((sizes["movements"] + CHUNK_ROWS - 1) // CHUNK_ROWS)]
+    if workers > 1:
+        with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(context,)) as pool:
+            counts["stock_movements"] = sum(pool.imap_unordered(_load_movements, tasks))
+    else:
+        _init_worker(context)
+        counts["stock_movements"] = sum(map(_load_movements, tasks))
+    print(f"Movements loaded in {time.perf_counter() - started:.1f} s")
+
+    started = time.perf_counter()
+    db = SessionLocal()
+    try:
+        for table, column in SERIAL_COLUMNS.items():
+            db.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{table}', '{column}'), "
+                f"COALESCE(MAX({column}), 1), MAX({column}) IS NOT NULL) FROM {table}"
+            ))
+        balances.rebuild(db)
+        db.commit()
+        counts["stock_balances"] = db.execute(text("SELECT count(*) FROM stock_balances")).scalar()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    valuation.rebuild()
+    snapshots.close_periods(today.replace(day=1) - timedelta(days=1))
+    with SessionLocal() as db:
+        counts["stock_valuation"] = db.execute(text("SELECT count(*) FROM stock_valuation")).scalar()
+        counts["stock_balance_snapshots"] = db.execute(
+            text("SELECT count(*) FROM stock_balance_snapshots")
+        ).scalar()
+
+    # ANALYZE вне транзакции с изменениями
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("ANALYZE"))
+    print(f"Balances, valuation, snapshots and statistics in {time.perf_counter() - started:.1f} s")
+    return counts
+
+
 if __name__ == "__main__":
-    seed_big()
+    parser = argparse.ArgumentParser(description="Заполнение БД тестовыми данными")
+    parser.add_argument(
+        "--scale",
+        type=float,
+        help="коэффициент масштаба: все таблицы через COPY, 1 — около миллиона движений; "
+        "без него — небольшой набор справочников (seed_big)",
+    )
+    parser.add_argument("--workers", type=int, default=1, help="процессов для загрузки движений")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="seed генератора")
+    args = parser.parse_args()
+
+    if args.scale is None:
+        seed_big(args.seed)
+    else:
+        for table, count in seed_scale(args.scale, args.workers, args.seed).items():
+            print(f"{table}: {count}")
@@ -0,0 +1,200 @@
+# app/slowlog.py
+"""
+Журнал медленных SQL-запросов с автоматическим EXPLAIN (GET /debug/slow-queries).
+
+Включается переменной SLOW_QUERY_MS (порог в миллисекундах, по умолчанию
+выключено). Каждый запрос дольше порога:
+- пишется в лог (WARNING) с параметрами и маршрутом, из которого он пришёл;
+- попадает в кольцевой буфер последних SLOW_QUERY_RING записей.
+
+Для доли SLOW_QUERY_EXPLAIN_SAMPLE таких запросов в фоне снимается
+EXPLAIN (ANALYZE, BUFFERS) — тем же драйвером и с теми же параметрами,
+на отдельном соединении в READ ONLY транзакции с statement_timeout, которая
+затем откатывается. Поэтому план снимается только для SELECT, и одновременно
+не больше одного (пока идёт предыдущий, новые не семплируются — EXPLAIN
+ANALYZE выполняет запрос повторно и сам нагружает базу).
+План дописывается в запись буфера и в лог (INFO).
+"""
+
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from itertools import count
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+
+try:
+    from .metrics import current_route
+except ImportError:
+    from metrics import current_route
+
+logger = logging.getLogger(__name__)
+
+# порог, мс; 0 — журнал выключен
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "0"))
+SLOW_QUERY_RING = int(os.getenv("SLOW_QUERY_RING", "100"))
+# доля медленных SELECT, для которых снимается план (0 — без EXPLAIN)
+SLOW_QUERY_EXPLAIN_SAMPLE = float(os.getenv("SLOW_QUERY_EXPLAIN_SAMPLE", "0.1"))
+SLOW_QUERY_EXPLAIN_TIMEOUT_MS = int(os.getenv("SLOW_QUERY_EXPLAIN_TIMEOUT_MS", "30000"))
+
+MAX_PARAMS_LENGTH = 1000
+# соединения, на которых выполняется сам EXPLAIN, в журнал не попадают
+SKIP_OPTION = "slow_query_skip"
+
+_entries: deque = deque(maxlen=SLOW_QUERY_RING)
+_ids = count(1)
+_lock = threading.Lock()
+_explaining = threading.Event()     # выставлен, пока снимается план
+_tasks = set()                      # ссылки на фоновые asyncio-задачи
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="slowlog-explain")
+_async_engines: Dict[int, object] = {}
+
+
+def entries() -> List[dict]:
+    """Записи буфера, новые первыми."""
+    with _lock:
+        return [dict(entry) for entry in reversed(_entries)]
+
+
+def _is_select(statement: str) -> bool:
+    head = statement.lstrip().split(None, 1)
+    return bool(head) and head[0].upper() in ("SELECT", "WITH")
+
+
+def _explain_sql(statement: str) -> List[str]:
+    return [
+        "SET TRANSACTION READ ONLY",
+        f"SET LOCAL statement_timeout = {SLOW_QUERY_EXPLAIN_TIMEOUT_MS}",
+        "EXPLAIN (ANALYZE, BUFFERS) " + statement,
+    ]
+
+
+def _store_plan(entry: dict, plan: Optional[str], error: Optional[str] = None) -> None:
+    with _lock:
+        if plan is not None:
+            entry["plan"] = plan
+            entry["plan_status"] = "done"
+        else:
+            entry["plan_status"] = f"error: {error}"
+    _explaining.clear()
+    if plan is not None:
+        logger.info("slow query #%d plan:\n%s", entry["id"], plan)
+    else:
+        logger.info("slow query #%d: EXPLAIN failed: %s", entry["id"], error)
+
+
+def _explain_sync(engine, entry: dict, statement: str, parameters) -> None:
+    """EXPLAIN через синхронный движок (psycopg2) в потоке журнала."""
+    try:
+        with engine.connect() as conn:
+            conn = conn.execution_options(**{SKIP_OPTION: True})
+            try:
+                *setup, explain = _explain_sql(statement)
+                for sql in setup:
+                    conn.exec_driver_sql(sql)
+                rows = conn.exec_driver_sql(explain, parameters).scalars().all()
+            finally:
+                conn.rollback()
+        _store_plan(entry, "\n".join(rows))
+    except Exception as e:
+        _store_plan(entry, None, f"{type(e).__name__}: {e}")
+
+
+async def _explain_async(async_engine, entry: dict, statement: str, parameters) -> None:
+    """EXPLAIN через asyncpg — отдельной задачей в event loop воркера."""
+    try:
+        async with async_engine.connect() as conn:
+            conn = await conn.execution_options(**{SKIP_OPTION: True})
+            try:
+                *setup, explain = _explain_sql(statement)
+                for sql in setup:
+                    await conn.exec_driver_sql(sql)
+                rows = (await conn.exec_driver_sql(explain, parameters)).scalars().all()
+            finally:
+                await conn.rollback()
+        _store_plan(entry, "\n".join(rows))
+    except Exception as e:
+        _store_plan(entry, None, f"{type(e).__name__}: {e}")
+
+
+def _schedule_explain(conn, entry: dict, statement: str, parameters) -> None:
+    async_engine = _async_engines.get(id(conn.engine))
+    if async_engine is not None:
+        # синхронная часть asyncio-сессии идёт в greenlet того же потока, что и loop
+        task = asyncio.get_running_loop().create_task(
+            _explain_async(async_engine, entry, statement, parameters)
+        )
+        _tasks.add(task)
+        task.add_done_callback(_tasks.discard)
+    else:
+        _executor.submit(_explain_sync, conn.engine, entry, statement, parameters)
+
+
+# время старта — на контексте выполнения запроса: упавший запрос не доходит
+# до after_cursor_execute, и его отметка не должна остаться на соединении из пула
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._slowlog_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_slowlog_started", None)
+    if started is None:
+        return
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if elapsed_ms < SLOW_QUERY_MS or conn.get_execution_options().get(SKIP_OPTION):
+        return
+
+    explain = (
+        not executemany
+        and _is_select(statement)
+        and random.random() < SLOW_QUERY_EXPLAIN_SAMPLE
+        and not _explaining.is_set()
+    )
+    params = repr(parameters)
+    entry = {
+        "id": next(_ids),
+        "at": datetime.now(timezone.utc).isoformat(),
+        "duration_ms": round(elapsed_ms, 1),
+        "route": current_route(),
+        "statement": statement,
+        "parameters": params if len(params) <= MAX_PARAMS_LENGTH else params[:MAX_PARAMS_LENGTH] + "...",
+        "rows": cursor.rowcount if cursor.rowcount >= 0 else None,
+        "plan": None,
+        "plan_status": "pending" if explain else "not sampled",
+    }
+    with _lock:
+        _entries.append(entry)
+    logger.warning(
+        "slow query #%d %.1f ms on %s: %s; parameters=%s",
+        entry["id"], elapsed_ms, entry["route"] or "-",
+        " ".join(statement.split()), entry["parameters"],
+    )
+
+    if explain:
+        _explaining.set()
+        try:
+            _schedule_explain(conn, entry, statement, parameters)
+        except Exception as e:
+            _store_plan(entry, None, f"{type(e).__name__}: {e}")
+
+
+def instrument(*engines) -> None:
+    """Подключить журнал к движкам, если задан SLOW_QUERY_MS."""
+    if SLOW_QUERY_MS <= 0:
+        return
+    for engine in engines:
+        sync_engine = getattr(engine, "sync_engine", None)
+        if sync_engine is not None:
+            _async_engines[id(sync_engine)] = engine
+        else:
+            sync_engine = engine
+        event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
@@ -0,0 +1,233 @@
+# app/snapshots.py
+"""
+Снимки остатков на конец периода (stock_balance_snapshots) для запросов
+остатков на дату (GET /stock-balances?as_of=YYYY-MM-DD).
+
+Период — календарный месяц, снимок — остатки склад×материал на конец его
+последнего дня. Снимки создаёт служебная команда (запускать регулярно,
+например раз в сутки — закрываются все завершённые месяцы без снимка):
+
+    python -m snapshots                         # по конец прошлого месяца
+    python -m snapshots --through 2025-06-30    # по указанную дату
+    python -m snapshots --rebuild               # пересоздать все снимки
+
+Новый снимок = предыдущий снимок + движения одного месяца, журнал целиком
+не перечитывается. Остаток на дату as_of — ближайший снимок не позже as_of
+плюс движения после него по as_of включительно, то есть не больше месяца
+журнала вместо всей истории. Снимки переживают и отсоединение старых секций
+журнала (python -m partitions --detach-older-than).
+
+Движение задним числом (move_date <= уже закрытого period_end) дописывается
+во все более поздние снимки в той же транзакции, что и вставка (apply_movements),
+как stock_balances. Закрытие периода берёт LOCK TABLE stock_balance_snapshots,
+поэтому ни одно такое движение не теряется и не учитывается дважды.
+"""
+
+import argparse
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import Date, Integer, Numeric, column, delete, func, insert, literal, select, text, union_all, values
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+try:
+    from .db import SessionLocal
+    from . import models
+    from .partitions import add_months
+except ImportError:
+    from db import SessionLocal
+    import models
+    from partitions import add_months
+
+
+SnapshotKey = Tuple[date, int, int]  # (move_date, warehouse_id, material_id)
+
+
+def month_end(d: date) -> date:
+    """Последний день месяца даты d."""
+    return add_months(d, 1) - timedelta(days=1)
+
+
+def nearest_period_query(as_of: date):
+    """period_end ближайшего снимка не позже as_of (NULL — снимков нет)."""
+    period = models.StockSnapshotPeriod
+    return select(func.max(period.period_end)).where(period.period_end <= as_of)
+
+
+def build_balances_as_of_query(
+    as_of: date,
+    period_end: Optional[date] = None,
+    warehouse_id: Optional[int] = None,
+    material_id: Optional[int] = None,
+):
+    """
+    Остатки на конец дня as_of: снимок period_end (ближайший не позже as_of,
+    см. nearest_period_query) плюс движения с period_end < move_date <= as_of.
+    Без снимка — весь журнал по as_of. Нулевые остатки не попадают.
+    """
+    mv = models.StockMovement
+    snapshot = models.StockBalanceSnapshot
+
+    def legs(warehouse_column, sign):
+        stmt = select(
+            warehouse_column.label("warehouse_id"),
+            mv.material_id.label("material_id"),
+            (mv.qty * sign).label("qty"),
+        ).where(warehouse_column.is_not(None), mv.move_date <= as_of)
+        if period_end is not None:
+            stmt = stmt.where(mv.move_date > period_end)
+        if warehouse_id is not None:
+            stmt = stmt.where(warehouse_column == warehouse_id)
+        if material_id is not None:
+            stmt = stmt.where(mv.material_id == material_id)
+        return stmt
+
+    parts = [legs(mv.to_warehouse_id, 1), legs(mv.from_warehouse_id, -1)]
+    if period_end is not None:
+        base = select(snapshot.warehouse_id, snapshot.material_id, snapshot.qty).where(
+            snapshot.period_end == period_end
+        )
+        if warehouse_id is not None:
+            base = base.where(snapshot.warehouse_id == warehouse_id)
+        if material_id is not None:
+            base = base.where(snapshot.material_id == material_id)
+        parts.append(base)
+    journal = union_all(*parts).subquery("journal")
+
+    qty = func.sum(journal.c.qty)
+    return (
+        select(journal.c.warehouse_id, journal.c.material_id, qty.label("qty"))
+        .group_by(journal.c.warehouse_id, journal.c.material_id)
+        .having(qty != 0)
+        .subquery("as_of")
+    )
+
+
+# ===== ДВИЖЕНИЯ ЗАДНИМ ЧИСЛОМ =====
+
+def movement_deltas(movements: Iterable) -> Dict[SnapshotKey, Decimal]:
+    """Изменения остатков по дате движения (правило ног — как в balances.py)."""
+    deltas: Dict[SnapshotKey, Decimal] = defaultdict(Decimal)
+    for mv in movements:
+        qty = Decimal(str(mv.qty))
+        if mv.to_warehouse_id is not None:
+            deltas[(mv.move_date, mv.to_warehouse_id, mv.material_id)] += qty
+        if mv.from_warehouse_id is not None:
+            deltas[(mv.move_date, mv.from_warehouse_id, mv.material_id)] -= qty
+    return deltas
+
+
+def apply_movements(db: Session, movements: Iterable) -> None:
+    """
+    Дописывает только что вставленные движения во все снимки с
+    period_end >= move_date. Вызывается в той же транзакции, что и вставка.
+
+    Сначала берётся ROW EXCLUSIVE на stock_balance_snapshots (конфликтует
+    с блокировкой close_period) и читается последний закрытый период:
+    параллельное закрытие либо уже закоммичено и видно, либо дождётся этой
+    транзакции. Движения после последнего периода (обычный случай) на этом
+    отсеиваются и ничего не пишут; остальные — одним INSERT ... SELECT.
+    """
+    deltas = movement_deltas(movements)
+    if not deltas:
+        return
+    db.execute(text("LOCK TABLE stock_balance_snapshots IN ROW EXCLUSIVE MODE"))
+    last_period = db.execute(select(func.max(models.StockSnapshotPeriod.period_end))).scalar()
+    if last_period is None:
+        return
+    rows = [
+        (move_date, wh_id, mat_id, qty)
+        for (move_date, wh_id, mat_id), qty in sorted(deltas.items())
+        if qty != 0 and move_date <= last_period
+    ]
+    if not rows:
+        return
+
+    period = models.StockSnapshotPeriod
+    snapshot = models.StockBalanceSnapshot
+    delta = values(
+        column("move_date", Date),
+        column("warehouse_id", Integer),
+        column("material_id", Integer),
+        column("qty", Numeric),
+        name="delta",
+    ).data(rows)
+    affected = (
+        select(period.period_end, delta.c.warehouse_id, delta.c.material_id, func.sum(delta.c.qty))
+        .join(delta, delta.c.move_date <= period.period_end)
+        .group_by(period.period_end, delta.c.warehouse_id, delta.c.material_id)
+        # строки снимков блокируются в одном порядке во всех транзакциях
+        .order_by(period.period_end, delta.c.warehouse_id, delta.c.material_id)
+    )
+    stmt = pg_insert(snapshot).from_select(["period_end", "warehouse_id", "material_id", "qty"], affected)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[snapshot.period_end, snapshot.warehouse_id, snapshot.material_id],
+        set_={"qty": snapshot.qty + stmt.excluded.qty},
+    )
+    db.execute(stmt)
+
+
+# ===== ЗАКРЫТИЕ ПЕРИОДОВ =====
+
+def close_period(db: Session, period_end: date) -> int:
+    """
+    Снимок остатков на period_end (без commit): предыдущий снимок + движения после него.
+    Возвращает число строк снимка.
+    """
+    # писатели ждут до commit: их движения задним числом допишутся
+    # в этот снимок уже после его создания
+    db.execute(text("LOCK TABLE stock_balance_snapshots IN SHARE ROW EXCLUSIVE MODE"))
+    previous = db.execute(nearest_period_query(period_end - timedelta(days=1))).scalar()
+    balances = build_balances_as_of_query(period_end, previous)
+
+    db.execute(insert(models.StockSnapshotPeriod).values(period_end=period_end))
+    result = db.execute(
+        insert(models.StockBalanceSnapshot).from_select(
+            ["period_end", "warehouse_id", "material_id", "qty"],
+            select(literal(period_end, Date), balances.c.warehouse_id, balances.c.material_id, balances.c.qty),
+        )
+    )
+    return result.rowcount
+
+
+def close_periods(through: Optional[date] = None, rebuild: bool = False, verbose: bool = False) -> List[date]:
+    """
+    Закрывает все месяцы журнала по through (по умолчанию — конец прошлого месяца),
+    у которых ещё нет снимка; каждый — своей транзакцией, по порядку.
+    rebuild — сначала удалить все снимки. Возвращает закрытые period_end.
+    """
+    through = through or add_months(date.today(), 0) - timedelta(days=1)
+    with SessionLocal() as db:
+        if rebuild:
+            db.execute(delete(models.StockBalanceSnapshot))
+            db.execute(delete(models.StockSnapshotPeriod))
+            db.commit()
+        first = db.execute(select(func.min(models.StockMovement.move_date))).scalar()
+        existing = set(db.execute(select(models.StockSnapshotPeriod.period_end)).scalars())
+
+    closed = []
+    period_end = month_end(first) if first is not None else None
+    while period_end is not None and period_end <= through:
+        if period_end not in existing:
+            with SessionLocal() as db:
+                count = close_period(db, period_end)
+                db.commit()
+            closed.append(period_end)
+            if verbose:
+                print(f"{period_end}: {count} balances")
+        period_end = month_end(period_end + timedelta(days=1))
+    return closed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Снимки остатков на конец месяца")
+    parser.add_argument("--through", type=date.fromisoformat,
+                        help="закрыть месяцы по эту дату (по умолчанию — конец прошлого месяца)")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="удалить все снимки и создать заново")
+    args = parser.parse_args()
+    closed = close_periods(args.through, args.rebuild, verbose=True)
+    print(f"Closed {len(closed)} periods.")
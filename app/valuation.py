@@ -0,0 +1,359 @@
+# app/valuation.py
+"""
+Стоимость запасов: средневзвешенная себестоимость (и FIFO-слои, если включены)
+по складу×материалу.
+
+Движение раскладывается на ноги, как в balances.py: to_warehouse_id — приход
++qty, from_warehouse_id — расход qty (ADJUST с отрицательным qty — расход).
+Сначала проводится расход, затем приход, чтобы перемещение несло себестоимость
+склада-отправителя:
+- расход списывается по текущей средней цене склада, средняя не меняется;
+  в FIFO — из самых старых слоёв;
+- приход оценивается по себестоимости списанного, если это перемещение;
+  иначе по unit_price движения; если цены нет — по текущей средней склада.
+  Средняя: (max(qty, 0) * avg + приход * цена) / (max(qty, 0) + приход);
+  в FIFO приход — новый слой; перемещение переносит слои отправителя как есть,
+  с их датами прихода. Слои склада упорядочены по received_date.
+Расход больше открытых слоёв: недостающее списывается по средней цене,
+а следующий приход сначала гасит этот минус и только остатком открывает слой.
+
+Инкрементально (apply_movements): в той же транзакции, что и вставка движений —
+строки stock_valuation затронутых пар блокируются (FOR UPDATE, в порядке ключа),
+движения проводятся по порядку поступления, результат пишется одним upsert.
+Журнал при этом не читается.
+
+Пересчёт (rebuild, python -m valuation): журнал проводится по (move_date, move_id)
+порциями материалов — материалы друг от друга не зависят, а склады связаны
+перемещениями. Каждая порция — короткая транзакция под
+LOCK TABLE stock_valuation: запись движений на это время ждёт, зато ничего
+не теряется и не учитывается дважды. Инкрементальный порядок — порядок
+поступления документов, поэтому после ввода задним числом средняя может
+немного отличаться от пересчёта.
+"""
+
+import argparse
+import bisect
+import os
+import time
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import bindparam, delete, insert, select, text, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+try:
+    from .db import SessionLocal
+    from . import models
+except ImportError:
+    from db import SessionLocal
+    import models
+
+
+# вести FIFO-слои (после включения — пересчёт: python -m valuation)
+VALUATION_FIFO = os.getenv("VALUATION_FIFO", "").strip().lower() in ("1", "true", "yes", "on")
+REBUILD_CHUNK_MATERIALS = 500
+REBUILD_FETCH_ROWS = 10000
+
+COST_QUANT = Decimal("0.000001")
+VALUE_QUANT = Decimal("0.01")
+ZERO = Decimal(0)
+
+Key = Tuple[int, int]  # (warehouse_id, material_id)
+
+
+@dataclass
+class Layer:
+    layer_id: Optional[int]         # None — ещё не записан
+    received_date: object
+    qty: Decimal
+    unit_cost: Decimal
+
+
+@dataclass
+class CostState:
+    qty: Decimal = ZERO
+    avg_cost: Decimal = ZERO
+    layers: List[Layer] = field(default_factory=list)
+    loaded_layers: Dict[int, Decimal] = field(default_factory=dict)  # layer_id -> qty при загрузке
+
+    @property
+    def value(self) -> Decimal:
+        return (self.qty * self.avg_cost).quantize(VALUE_QUANT)
+
+
+class Ledger:
+    """Состояния пар склад×материал и проводка движений по ним."""
+
+    def __init__(self, fifo: bool = VALUATION_FIFO):
+        self.fifo = fifo
+        self.states: Dict[Key, CostState] = {}
+
+    def state(self, key: Key) -> CostState:
+        state = self.states.get(key)
+        if state is None:
+            state = self.states[key] = CostState()
+        return state
+
+    def _issue(self, key: Key, qty: Decimal) -> Tuple[Decimal, List[Layer]]:
+        """Списать qty; вернуть себестоимость списанного и списанные слои (FIFO)."""
+        state = self.state(key)
+        taken: List[Layer] = []
+        cost = ZERO
+        rest = qty
+        if self.fifo:
+            while rest > 0 and state.layers:
+                layer = state.layers[0]
+                used = min(rest, layer.qty)
+                taken.append(Layer(None, layer.received_date, used, layer.unit_cost))
+                cost += used * layer.unit_cost
+                layer.qty -= used
+                rest -= used
+                if layer.qty <= 0:
+                    state.layers.pop(0)
+        if rest > 0:
+            # без слоёв (или не FIFO) — по средней
+            cost += rest * state.avg_cost
+            if self.fifo:
+                taken.append(Layer(None, None, rest, state.avg_cost))
+        state.qty -= qty
+        return cost, taken
+
+    def _receive(self, key: Key, qty: Decimal, unit_cost: Decimal, move_date, layers: List[Layer]) -> None:
+        state = self.state(key)
+        base = max(state.qty, ZERO)
+        debt = base - state.qty  # списано сверх остатка — уже оценено по средней
+        state.avg_cost = ((base * state.avg_cost + qty * unit_cost) / (base + qty)).quantize(COST_QUANT)
+        state.qty += qty
+        if self.fifo:
+            for layer in layers or [Layer(None, move_date, qty, unit_cost)]:
+                covered = min(debt, layer.qty)
+                debt -= covered
+                if layer.qty > covered:
+                    # слой отправителя сохраняет дату прихода (списанное по средней — без даты)
+                    received_date = layer.received_date or move_date
+                    bisect.insort(
+                        state.layers,
+                        Layer(None, received_date, layer.qty - covered, layer.unit_cost),
+                        key=lambda item: item.received_date,
+                    )
+
+    def post(self, mv) -> None:
+        """
+        Провести движение: любой объект с from_warehouse_id, to_warehouse_id,
+        material_id, qty, unit_price и move_date.
+        """
+        qty = Decimal(str(mv.qty))
+        legs = []
+        if mv.from_warehouse_id is not None:
+            legs.append(((mv.from_warehouse_id, mv.material_id), -qty))
+        if mv.to_warehouse_id is not None:
+            legs.append(((mv.to_warehouse_id, mv.material_id), qty))
+
+        issued: Optional[Tuple[Decimal, Decimal, List[Layer]]] = None
+        for key, amount in legs:
+            if amount < 0:
+                cost, taken = self._issue(key, -amount)
+                issued = (-amount, cost, taken)
+            elif amount > 0:
+                if issued is not None and issued[0] == amount:
+                    # перемещение: себестоимость отправителя
+                    unit_cost = (issued[1] / amount).quantize(COST_QUANT)
+                    layers = issued[2]
+                elif mv.unit_price is not None:
+                    unit_cost, layers = Decimal(str(mv.unit_price)), []
+                else:
+                    unit_cost, layers = self.state(key).avg_cost, []
+                self._receive(key, amount, unit_cost, mv.move_date, layers)
+
+
+def _legs(movements: Iterable) -> List[Key]:
+    keys = set()
+    for mv in movements:
+        if mv.from_warehouse_id is not None:
+            keys.add((mv.from_warehouse_id, mv.material_id))
+        if mv.to_warehouse_id is not None:
+            keys.add((mv.to_warehouse_id, mv.material_id))
+    return sorted(keys)
+
+
+def _load(db: Session, ledger: Ledger, keys: List[Key]) -> None:
+    """Заблокировать и загрузить состояния пар (строки создаются при первом движении)."""
+    table = models.StockValuation.__table__
+    db.execute(
+        pg_insert(table)
+        .values([
+            {"warehouse_id": wh_id, "material_id": mat_id, "qty": 0, "avg_cost": 0, "value": 0}
+            for wh_id, mat_id in keys
+        ])
+        .on_conflict_do_nothing()
+    )
+    key_in = tuple_(table.c.warehouse_id, table.c.material_id).in_(keys)
+    rows = db.execute(
+        select(table.c.warehouse_id, table.c.material_id, table.c.qty, table.c.avg_cost)
+        .where(key_in)
+        .order_by(table.c.warehouse_id, table.c.material_id)
+        .with_for_update()
+    )
+    for wh_id, mat_id, qty, avg_cost in rows:
+        ledger.states[(wh_id, mat_id)] = CostState(qty=qty, avg_cost=avg_cost)
+
+    if ledger.fifo:
+        layers = models.StockCostLayer.__table__
+        rows = db.execute(
+            select(layers)
+            .where(tuple_(layers.c.warehouse_id, layers.c.material_id).in_(keys))
+            .order_by(layers.c.received_date, layers.c.layer_id)
+        )
+        for row in rows:
+            state = ledger.states[(row.warehouse_id, row.material_id)]
+            state.layers.append(Layer(row.layer_id, row.received_date, row.qty, row.unit_cost))
+            state.loaded_layers[row.layer_id] = row.qty
+
+
+def _save(db: Session, ledger: Ledger, upsert: bool = True) -> None:
+    """Записать состояния (и изменения слоёв) из ledger."""
+    table = models.StockValuation.__table__
+    rows = [
+        {
+            "warehouse_id": wh_id,
+            "material_id": mat_id,
+            "qty": state.qty,
+            "avg_cost": state.avg_cost,
+            "value": state.value,
+        }
+        for (wh_id, mat_id), state in sorted(ledger.states.items())
+    ]
+    if rows:
+        stmt = pg_insert(table)
+        if upsert:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.warehouse_id, table.c.material_id],
+                set_={
+                    "qty": stmt.excluded.qty,
+                    "avg_cost": stmt.excluded.avg_cost,
+                    "value": stmt.excluded.value,
+                },
+            )
+        db.execute(stmt, rows)
+
+    if not ledger.fifo:
+        return
+    layers = models.StockCostLayer.__table__
+    removed, changed, added = [], [], []
+    for (wh_id, mat_id), state in ledger.states.items():
+        kept = set()
+        for layer in state.layers:
+            if layer.layer_id is None:
+                added.append({
+                    "warehouse_id": wh_id,
+                    "material_id": mat_id,
+                    "received_date": layer.received_date,
+                    "qty": layer.qty,
+                    "unit_cost": layer.unit_cost,
+                })
+            else:
+                kept.add(layer.layer_id)
+                if layer.qty != state.loaded_layers[layer.layer_id]:
+                    changed.append({"b_layer_id": layer.layer_id, "b_qty": layer.qty})
+        removed.extend(layer_id for layer_id in state.loaded_layers if layer_id not in kept)
+
+    if removed:
+        db.execute(delete(layers).where(layers.c.layer_id.in_(removed)))
+    if changed:
+        db.execute(
+            update(layers)
+            .where(layers.c.layer_id == bindparam("b_layer_id"))
+            .values(qty=bindparam("b_qty")),
+            changed,
+        )
+    if added:
+        db.execute(insert(layers), added)
+
+
+def apply_movements(db: Session, movements: Iterable) -> None:
+    """
+    Проводит только что вставленные движения (в порядке списка).
+    Вызывается в той же транзакции, что и вставка, коммит делает вызывающий код.
+    """
+    movements = list(movements)
+    keys = _legs(movements)
+    if not keys:
+        return
+    ledger = Ledger()
+    _load(db, ledger, keys)
+    for mv in movements:
+        ledger.post(mv)
+    _save(db, ledger)
+
+
+# ===== REBUILD =====
+
+def rebuild_materials(db: Session, material_ids: List[int], fifo: bool = VALUATION_FIFO) -> int:
+    """
+    Пересчитать стоимость материалов material_ids по всему журналу
+    (без commit). Возвращает число проведённых движений.
+    """
+    mv = models.StockMovement
+    # писатели ждут до commit: движение, вставленное после чтения журнала,
+    # проведётся инкрементально уже поверх пересчитанного
+    db.execute(text("LOCK TABLE stock_valuation IN SHARE ROW EXCLUSIVE MODE"))
+
+    ledger = Ledger(fifo)
+    journal = (
+        select(
+            mv.from_warehouse_id,
+            mv.to_warehouse_id,
+            mv.material_id,
+            mv.qty,
+            mv.unit_price,
+            mv.move_date,
+        )
+        .where(mv.material_id.in_(material_ids))
+        .order_by(mv.material_id, mv.move_date, mv.move_id)
+        .execution_options(yield_per=REBUILD_FETCH_ROWS)
+    )
+    posted = 0
+    for row in db.execute(journal):
+        ledger.post(row)
+        posted += 1
+
+    db.execute(delete(models.StockValuation).where(models.StockValuation.material_id.in_(material_ids)))
+    db.execute(delete(models.StockCostLayer).where(models.StockCostLayer.material_id.in_(material_ids)))
+    _save(db, ledger, upsert=False)
+    return posted
+
+
+def rebuild(chunk: int = REBUILD_CHUNK_MATERIALS, fifo: bool = VALUATION_FIFO, verbose: bool = False) -> int:
+    """
+    Полный пересчёт порциями по chunk материалов, каждая — своей транзакцией.
+    Возвращает число проведённых движений.
+    """
+    with SessionLocal() as db:
+        material_ids = list(
+            db.execute(select(models.Material.material_id).order_by(models.Material.material_id)).scalars()
+        )
+    posted = 0
+    started = time.perf_counter()
+    for start in range(0, len(material_ids), chunk):
+        with SessionLocal() as db:
+            posted += rebuild_materials(db, material_ids[start:start + chunk], fifo)
+            db.commit()
+        if verbose:
+            done = min(start + chunk, len(material_ids))
+            print(f"{done}/{len(material_ids)} materials, {posted} movements, "
+                  f"{time.perf_counter() - started:.1f} s")
+    return posted
+
+
+if __name__ == "__main__":
+    # python -m valuation  — пересчитать стоимость запасов по всему журналу
+    parser = argparse.ArgumentParser(description="Пересчёт stock_valuation (и FIFO-слоёв) по журналу")
+    parser.add_argument("--chunk", type=int, default=REBUILD_CHUNK_MATERIALS,
+                        help="материалов в одной транзакции")
+    parser.add_argument("--fifo", action="store_true", default=VALUATION_FIFO,
+                        help="вести FIFO-слои (по умолчанию — VALUATION_FIFO)")
+    args = parser.parse_args()
+    total = rebuild(args.chunk, args.fifo, verbose=True)
+    print(f"Stock valuation rebuilt: {total} movements.")
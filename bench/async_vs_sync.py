@@ -0,0 +1,110 @@
+# bench/async_vs_sync.py
+"""
+Сравнение синхронного (SessionLocal + пул потоков) и асинхронного
+(AsyncSession + asyncpg) доступа к БД при одинаковой нагрузке.
+
+Синхронный режим повторяет то, как FastAPI выполняет обычные `def`-обработчики:
+в пуле потоков anyio (по умолчанию 40 потоков). Асинхронный — как `async def`
+обработчики на одном event loop. Пулы соединений в обоих режимах одинакового
+размера, чтобы сравнивался именно способ ожидания БД, а не размер пула.
+
+Каждый "запрос" делает то же, что GET /materials?limit=100, плюс
+`pg_sleep(--query-ms)` — имитация медленного запроса / сетевой задержки до БД.
+
+Выигрыш async-режима виден, когда запрос в основном ждёт БД (query-ms велик
+по сравнению с CPU-временем на запрос): sync упирается в 40 потоков, async —
+только в размер пула. Если приложение и Postgres делят одно ядро, оба режима
+упираются в CPU, и разница пропадает.
+
+Запуск (из корня репозитория, БД по DATABASE_URL):
+
+    python bench/async_vs_sync.py --requests 2000 --concurrency 200 --query-ms 20
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import common  # noqa: F401  (добавляет app/ в sys.path)
+
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+import models
+from db import ASYNC_DATABASE_URL, DATABASE_URL
+
+ANYIO_DEFAULT_THREADS = 40
+
+
+def _query():
+    return select(models.Material).order_by(models.Material.material_id).limit(100)
+
+
+def run_sync(args) -> dict:
+    engine = create_engine(DATABASE_URL, pool_size=args.pool_size, max_overflow=0)
+    Session = sessionmaker(bind=engine)
+    sleep = text("SELECT pg_sleep(:s)")
+
+    def one_request(submitted_at: float) -> float:
+        with Session() as db:
+            db.execute(sleep, {"s": args.query_ms / 1000})
+            db.execute(_query()).scalars().all()
+        return time.perf_counter() - submitted_at
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        futures = [pool.submit(one_request, time.perf_counter()) for _ in range(args.requests)]
+        latencies = [f.result() for f in futures]
+    wall = time.perf_counter() - started
+    engine.dispose()
+    return common.summarize(latencies, wall)
+
+
+async def run_async(args) -> dict:
+    engine = create_async_engine(ASYNC_DATABASE_URL, pool_size=args.pool_size, max_overflow=0)
+    Session = async_sessionmaker(engine)
+    sleep = text("SELECT pg_sleep(:s)")
+    gate = asyncio.Semaphore(args.concurrency)
+
+    async def one_request() -> float:
+        submitted_at = time.perf_counter()
+        async with gate:
+            async with Session() as db:
+                await db.execute(sleep, {"s": args.query_ms / 1000})
+                (await db.execute(_query())).scalars().all()
+        return time.perf_counter() - submitted_at
+
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*(one_request() for _ in range(args.requests)))
+    wall = time.perf_counter() - started
+    await engine.dispose()
+    return common.summarize(list(latencies), wall)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200,
+                        help="сколько запросов одновременно в полёте (async)")
+    parser.add_argument("--threads", type=int, default=ANYIO_DEFAULT_THREADS,
+                        help="размер пула потоков в sync-режиме")
+    parser.add_argument("--pool-size", type=int, default=50,
+                        help="размер пула соединений (одинаковый для обоих режимов)")
+    parser.add_argument("--query-ms", type=float, default=20,
+                        help="искусственная задержка БД на запрос")
+    parser.add_argument("--mode", choices=["both", "sync", "async"], default="both")
+    args = parser.parse_args()
+
+    results = {"params": vars(args)}
+    if args.mode in ("both", "sync"):
+        results["sync"] = run_sync(args)
+    if args.mode in ("both", "async"):
+        results["async"] = asyncio.run(run_async(args))
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
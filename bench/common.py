@@ -0,0 +1,39 @@
+# bench/common.py
+"""
+Общие помощники для бенчмарков: путь к app/ и статистика задержек.
+"""
+
+import os
+import statistics
+import sys
+from typing import Dict, List
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app")
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """
+    Перцентиль по методу ближайшего ранга (values в любых единицах).
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[rank]
+
+
+def summarize(latencies_s: List[float], wall_s: float) -> Dict[str, float]:
+    """
+    Сводка по прогону: p50/p95/p99 в миллисекундах и пропускная способность.
+    """
+    ms = [v * 1000 for v in latencies_s]
+    return {
+        "requests": len(ms),
+        "throughput_rps": round(len(ms) / wall_s, 1) if wall_s else 0.0,
+        "mean_ms": round(statistics.fmean(ms), 2) if ms else 0.0,
+        "p50_ms": round(percentile(ms, 50), 2),
+        "p95_ms": round(percentile(ms, 95), 2),
+        "p99_ms": round(percentile(ms, 99), 2),
+    }
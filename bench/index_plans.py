@@ -0,0 +1,198 @@
+# bench/index_plans.py
+"""
+Планы запросов отчётов до и после индексов миграции 1f539339da03.
+
+"После" — планы на текущей схеме. "До" — те же запросы внутри транзакции,
+в которой индексы миграции удалены (DDL в Postgres транзакционный,
+в конце ROLLBACK, так что база не меняется; на время прогона таблицы
+блокируются — запускать на тестовой базе).
+
+Можно предварительно догенерировать движений (--movements N), чтобы
+разница была видна на большом объёме:
+
+    python bench/index_plans.py --movements 2000000 --json plans.json
+"""
+
+import argparse
+import json
+import time
+
+import common  # noqa: F401  (добавляет app/ в sys.path)
+
+from sqlalchemy import text
+
+import balances
+from db import SessionLocal, engine
+
+# индексы из alembic/versions/1f539339da03_secondary_indexes.py
+MIGRATION_INDEXES = [
+    "ix_stock_movements_material_date",
+    "ix_stock_movements_to_wh_material_date",
+    "ix_stock_movements_from_wh_material_date",
+    "ix_stock_movements_move_date",
+    "ix_stock_movements_related_po_id",
+    "ix_supplier_material_prices_material_supplier_date",
+    "ix_supplier_materials_material_id",
+    "ix_stock_balances_material_id",
+    "ix_warehouses_project_id",
+    "ix_materials_category_id",
+]
+
+QUERIES = {
+    "material_history": """
+        SELECT * FROM stock_movements
+        WHERE material_id = :material_id
+        ORDER BY move_date DESC
+        LIMIT 50
+    """,
+    "pair_balance_as_of": """
+        SELECT
+            COALESCE(SUM(CASE WHEN to_warehouse_id = :warehouse_id THEN qty ELSE 0 END), 0)
+          - COALESCE(SUM(CASE WHEN from_warehouse_id = :warehouse_id THEN qty ELSE 0 END), 0)
+        FROM stock_movements
+        WHERE material_id = :material_id
+          AND (to_warehouse_id = :warehouse_id OR from_warehouse_id = :warehouse_id)
+          AND move_date <= :as_of
+    """,
+    "warehouse_period": """
+        SELECT count(*) FROM stock_movements
+        WHERE (to_warehouse_id = :warehouse_id OR from_warehouse_id = :warehouse_id)
+          AND move_date BETWEEN :date_from AND :date_to
+    """,
+    "period_export": """
+        SELECT * FROM stock_movements
+        WHERE move_date BETWEEN :date_from AND :date_to
+        ORDER BY move_id
+        LIMIT 1000
+    """,
+    "po_receipts": """
+        SELECT * FROM stock_movements WHERE related_po_id = :po_id
+    """,
+    "latest_prices_for_material": """
+        SELECT DISTINCT ON (supplier_id) supplier_id, price, price_date
+        FROM supplier_material_prices
+        WHERE material_id = :material_id
+        ORDER BY supplier_id, price_date DESC
+    """,
+    "material_stock_everywhere": """
+        SELECT * FROM stock_balances WHERE material_id = :material_id
+    """,
+}
+
+
+def generate_movements(db, count: int) -> None:
+    """
+    Догенерировать count случайных движений по существующим складам и материалам
+    (set-based INSERT ... SELECT generate_series) и пересчитать остатки.
+    """
+    db.execute(
+        text(
+            """
+            WITH w AS (SELECT array_agg(warehouse_id) AS ids FROM warehouses),
+                 m AS (SELECT array_agg(material_id) AS ids FROM materials),
+                 p AS (SELECT array_agg(po_id) AS ids FROM purchase_orders)
+            INSERT INTO stock_movements
+                (move_type, move_date, from_warehouse_id, to_warehouse_id,
+                 related_po_id, material_id, qty)
+            SELECT
+                CASE WHEN r < 0.5 THEN 'IN' WHEN r < 0.8 THEN 'OUT' ELSE 'TRANSFER' END,
+                DATE '2022-01-01' + (random() * 1400)::int,
+                CASE WHEN r >= 0.5 THEN w.ids[1 + floor(random() * cardinality(w.ids))::int] END,
+                CASE WHEN r < 0.5 OR r >= 0.8 THEN w.ids[1 + floor(random() * cardinality(w.ids))::int] END,
+                CASE WHEN r < 0.5 AND p.ids IS NOT NULL AND random() < 0.3
+                     THEN p.ids[1 + floor(random() * cardinality(p.ids))::int] END,
+                m.ids[1 + floor(random() * cardinality(m.ids))::int],
+                1 + floor(random() * 100)
+            FROM (SELECT random() AS r FROM generate_series(1, :n)) AS g, w, m, p
+            """
+        ),
+        {"n": count},
+    )
+    balances.rebuild(db)
+    db.commit()
+
+
+def sample_params(db) -> dict:
+    row = db.execute(
+        text(
+            """
+            SELECT to_warehouse_id, material_id
+            FROM stock_movements WHERE to_warehouse_id IS NOT NULL
+            LIMIT 1
+            """
+        )
+    ).first()
+    po_id = db.execute(
+        text("SELECT related_po_id FROM stock_movements WHERE related_po_id IS NOT NULL LIMIT 1")
+    ).scalar()
+    return {
+        "warehouse_id": row[0] if row else 1,
+        "material_id": row[1] if row else 1,
+        "po_id": po_id or 1,
+        "as_of": "2024-06-30",
+        "date_from": "2024-01-01",
+        "date_to": "2024-01-31",
+    }
+
+
+def explain(conn, sql: str, params: dict) -> dict:
+    plan = conn.execute(
+        text("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql), params
+    ).scalar()[0]
+
+    def node_types(node):
+        yield node["Node Type"] + (f" [{node['Index Name']}]" if "Index Name" in node else "")
+        for child in node.get("Plans", []):
+            yield from node_types(child)
+
+    return {
+        "execution_ms": plan["Execution Time"],
+        "shared_blocks": plan["Plan"].get("Shared Hit Blocks", 0)
+        + plan["Plan"].get("Shared Read Blocks", 0),
+        "nodes": list(node_types(plan["Plan"])),
+    }
+
+
+def run_all(conn, params: dict) -> dict:
+    return {name: explain(conn, sql, params) for name, sql in QUERIES.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--movements", type=int, default=0,
+                        help="догенерировать столько движений перед замером")
+    parser.add_argument("--json", help="сохранить результат в файл")
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        if args.movements:
+            started = time.perf_counter()
+            generate_movements(db, args.movements)
+            print(f"generated {args.movements} movements in {time.perf_counter() - started:.1f}s")
+        params = sample_params(db)
+
+    with engine.connect() as conn:
+        conn.execute(text("ANALYZE"))
+        conn.commit()
+        after = run_all(conn, params)
+        conn.rollback()
+
+        trans = conn.begin()
+        for name in MIGRATION_INDEXES:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        before = run_all(conn, params)
+        trans.rollback()
+
+    results = {"params": params, "before": before, "after": after}
+    for name in QUERIES:
+        b, a = before[name], after[name]
+        print(f"{name}:")
+        print(f"  before {b['execution_ms']:9.2f} ms  {' -> '.join(b['nodes'])}")
+        print(f"  after  {a['execution_ms']:9.2f} ms  {' -> '.join(a['nodes'])}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False, default=str)
+
+
+if __name__ == "__main__":
+    main()
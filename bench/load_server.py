@@ -0,0 +1,40 @@
+# bench/load_server.py
+"""
+Приложение для нагрузочного прогона: app/main.py + счётчик SQL-запросов.
+
+Счётчик — событие before_cursor_execute на обоих движках (asyncpg и psycopg2);
+GET /__bench/queries отдаёт число выполненных запросов с момента старта.
+Само приложение не меняется. Запускается из bench/loadtest.py:
+
+    uvicorn load_server:app --app-dir bench
+"""
+
+import threading
+
+import common  # noqa: F401  (добавляет app/ в sys.path)
+
+from sqlalchemy import event
+
+import main
+from db import async_engine, engine
+
+# запросы идут и из event loop, и из потоков run_sync
+_lock = threading.Lock()
+_executed = 0
+
+
+def _count_query(*_args) -> None:
+    global _executed
+    with _lock:
+        _executed += 1
+
+
+event.listen(async_engine.sync_engine, "before_cursor_execute", _count_query)
+event.listen(engine, "before_cursor_execute", _count_query)
+
+app = main.app
+
+
+@app.get("/__bench/queries", include_in_schema=False)
+async def bench_queries():
+    return {"queries": _executed}
@@ -0,0 +1,335 @@
+# bench/loadtest.py
+"""
+Нагрузочный прогон реальных эндпоинтов с сохранением результатов и сравнением с базовой линией.
+
+Шаги:
+1. (--seed) база заполняется детерминированно на выбранном масштабе
+   (--scale 10k / 1m / 10m движений) через seed.seed_scale: все таблицы
+   грузятся COPY, движения — в --workers процессах;
+2. поднимается uvicorn с bench/load_server.py (приложение + счётчик SQL-запросов)
+   или используется уже запущенный сервер (--base-url, тогда без счётчика);
+3. сценарии (списки, поиск, отчёты, создание и массовая загрузка движений)
+   выполняются по очереди: --requests запросов, --concurrency клиентов
+   одновременно, перед замером --warmup запросов;
+4. по каждому сценарию — p50/p95/p99, пропускная способность, ошибки
+   и число SQL-запросов на HTTP-запрос; всё пишется в --out (JSON);
+5. с --baseline результаты сравниваются с сохранённым прогоном: рост p95
+   или падение пропускной способности больше --tolerance, а также рост числа
+   запросов на HTTP-запрос считаются регрессией (код выхода 1).
+
+Работает без сети: нужна только локальная база, например из docker compose:
+
+    docker compose up -d db
+    cd app && alembic upgrade head && cd ..
+    python bench/loadtest.py --seed --scale 10k --out results.json
+    python bench/loadtest.py --out new.json --baseline results.json
+
+Пишущие сценарии идут последними и добавляют движения — для точного
+повторения прогона базу нужно пересеять (--seed).
+Кроме зависимостей приложения нужен httpx.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from datetime import date
+from typing import Callable, Dict, List, Optional, Tuple
+
+import common  # noqa: F401  (добавляет app/ в sys.path)
+
+import httpx
+from sqlalchemy import func, select
+
+import models
+import seed
+from db import SessionLocal
+from pagination import encode_cursor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# масштаб -> коэффициент seed.seed_scale (1 — около миллиона движений)
+SCALES = {"10k": 0.01, "1m": 1, "10m": 10}
+RANDOM_SEED = seed.DEFAULT_SEED
+BULK_ROWS = 200
+
+
+# ===== SCENARIOS =====
+
+class Context:
+    """Идентификаторы из базы, из которых сценарии собирают запросы."""
+
+    def __init__(self):
+        with SessionLocal() as db:
+            self.warehouse_ids = list(db.execute(select(models.Warehouse.warehouse_id)).scalars())
+            self.material_ids = list(db.execute(select(models.Material.material_id)).scalars())
+            self.skus = list(db.execute(select(models.Material.sku)).scalars())
+            self.max_move_id = db.execute(select(func.max(models.StockMovement.move_id))).scalar() or 0
+            self.movements = db.execute(select(func.count()).select_from(models.StockMovement)).scalar()
+        if not self.warehouse_ids or not self.material_ids:
+            raise SystemExit("База пустая — запустите с --seed")
+
+
+def _movement(ctx: Context, rng: random.Random) -> dict:
+    return {
+        "move_type": "IN",
+        "move_date": date.today().isoformat(),
+        "status": "DONE",
+        "to_warehouse_id": rng.choice(ctx.warehouse_ids),
+        "material_id": rng.choice(ctx.material_ids),
+        "qty": rng.randint(1, 100),
+        "unit_price": rng.randint(500, 20000),
+    }
+
+
+# сценарий: (ctx, rng) -> (method, url, kwargs для httpx)
+Scenario = Callable[[Context, random.Random], Tuple[str, str, dict]]
+
+SCENARIOS: Dict[str, Scenario] = {
+    "materials_list": lambda ctx, rng: ("GET", "/materials", {"params": {"limit": 100}}),
+    "materials_search": lambda ctx, rng: (
+        "GET", "/materials/search",
+        {"params": {"q": rng.choice(ctx.skus)[:-1], "mode": "prefix"}},
+    ),
+    "movements_list": lambda ctx, rng: (
+        "GET", "/stock-movements",
+        {"params": {"limit": 500, "after": encode_cursor([rng.randint(0, ctx.max_move_id)])}},
+    ),
+    "balances_list": lambda ctx, rng: (
+        "GET", "/stock-balances", {"params": {"warehouse_id": rng.choice(ctx.warehouse_ids)}},
+    ),
+    "offers_lookup": lambda ctx, rng: (
+        "POST", "/offers/lookup",
+        {"json": {"material_ids": rng.sample(ctx.material_ids, min(50, len(ctx.material_ids)))}},
+    ),
+    "report_shortages": lambda ctx, rng: (
+        "GET", "/reports/shortages", {"params": {"warehouse_id": rng.choice(ctx.warehouse_ids)}},
+    ),
+    "report_donors": lambda ctx, rng: ("GET", "/reports/donors", {}),
+    # пишущие — последними
+    "movement_create": lambda ctx, rng: ("POST", "/stock-movements", {"json": _movement(ctx, rng)}),
+    "movements_bulk": lambda ctx, rng: (
+        "POST", "/stock-movements/bulk",
+        {"json": [_movement(ctx, rng) for _ in range(BULK_ROWS)]},
+    ),
+}
+
+
+# ===== RUNNER =====
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port: int) -> subprocess.Popen:
+    proc = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "load_server:app",
+            "--app-dir", BENCH_DIR,
+            "--host", "127.0.0.1", "--port", str(port),
+            "--log-level", "warning", "--no-access-log",
+        ],
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"uvicorn exited with code {proc.returncode}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/ping", timeout=1).status_code == 200:
+                return proc
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    proc.terminate()
+    raise SystemExit("uvicorn did not start in 30 s")
+
+
+async def _query_count(client: httpx.AsyncClient) -> Optional[int]:
+    response = await client.get("/__bench/queries")
+    return response.json()["queries"] if response.status_code == 200 else None
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    scenario: Scenario,
+    ctx: Context,
+    requests: int,
+    concurrency: int,
+    warmup: int,
+    rng: random.Random,
+) -> dict:
+    async def drive(specs: List[tuple], latencies: List[float], errors: List[str]) -> None:
+        async def worker():
+            while specs:
+                method, url, kwargs = specs.pop()
+                started = time.perf_counter()
+                try:
+                    response = await client.request(method, url, **kwargs)
+                    if response.status_code >= 400:
+                        errors.append(f"{response.status_code} {url}")
+                except httpx.HTTPError as e:
+                    errors.append(f"{type(e).__name__} {url}")
+                latencies.append(time.perf_counter() - started)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    await drive([scenario(ctx, rng) for _ in range(warmup)], [], [])
+
+    specs = [scenario(ctx, rng) for _ in range(requests)]
+    latencies: List[float] = []
+    errors: List[str] = []
+    queries_before = await _query_count(client)
+    started = time.perf_counter()
+    await drive(specs, latencies, errors)
+    wall = time.perf_counter() - started
+    queries_after = await _query_count(client)
+
+    summary = common.summarize(latencies, wall)
+    summary["errors"] = len(errors)
+    if errors:
+        summary["first_error"] = errors[0]
+    summary["db_queries_per_request"] = (
+        round((queries_after - queries_before) / requests, 2)
+        if queries_before is not None and queries_after is not None
+        else None
+    )
+    return summary
+
+
+async def run_all(args, ctx: Context, base_url: str) -> Dict[str, dict]:
+    results = {}
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        for name in args.scenarios:
+            rng = random.Random(f"{RANDOM_SEED}:{name}")
+            results[name] = await run_scenario(
+                client, SCENARIOS[name], ctx, args.requests, args.concurrency, args.warmup, rng
+            )
+            print(f"{name:18} {json.dumps(results[name], ensure_ascii=False)}", file=sys.stderr)
+    return results
+
+
+# ===== BASELINE =====
+
+def compare(current: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> Dict[str, dict]:
+    """
+    Отношения текущего прогона к базовому по сценариям и список регрессий.
+    """
+    report = {}
+    for name, cur in current.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        regressions = []
+        p95_ratio = cur["p95_ms"] / base["p95_ms"] if base["p95_ms"] else None
+        rps_ratio = cur["throughput_rps"] / base["throughput_rps"] if base["throughput_rps"] else None
+        if p95_ratio is not None and p95_ratio > 1 + tolerance:
+            regressions.append(f"p95 x{p95_ratio:.2f}")
+        if rps_ratio is not None and rps_ratio < 1 - tolerance:
+            regressions.append(f"throughput x{rps_ratio:.2f}")
+        cur_q, base_q = cur.get("db_queries_per_request"), base.get("db_queries_per_request")
+        if cur_q is not None and base_q is not None and cur_q > base_q:
+            regressions.append(f"queries/request {base_q} -> {cur_q}")
+        if cur["errors"] > base.get("errors", 0):
+            regressions.append(f"errors {base.get('errors', 0)} -> {cur['errors']}")
+        report[name] = {
+            "p95_ratio": round(p95_ratio, 3) if p95_ratio is not None else None,
+            "throughput_ratio": round(rps_ratio, 3) if rps_ratio is not None else None,
+            "regressions": regressions,
+        }
+    return report
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BENCH_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--seed", action="store_true", help="пересеять базу перед прогоном")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="10k",
+                        help="число движений при --seed")
+    parser.add_argument("--workers", type=int, default=1, help="процессов загрузки при --seed")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=300, help="запросов на сценарий")
+    parser.add_argument("--concurrency", type=int, default=20, help="одновременных клиентов")
+    parser.add_argument("--warmup", type=int, default=20, help="запросов прогрева на сценарий")
+    parser.add_argument("--base-url", help="уже запущенный сервер (без подсчёта SQL-запросов)")
+    parser.add_argument("--out", default="loadtest-results.json")
+    parser.add_argument("--baseline", help="файл прошлого прогона для сравнения")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="допустимое ухудшение p95 / пропускной способности (доля)")
+    args = parser.parse_args()
+    # порядок сценариев — как в SCENARIOS (пишущие последними)
+    args.scenarios = [name for name in SCENARIOS if name in args.scenarios]
+
+    if args.seed:
+        started = time.perf_counter()
+        seed.seed_scale(SCALES[args.scale], args.workers)
+        print(f"seeded {args.scale} in {time.perf_counter() - started:.1f} s", file=sys.stderr)
+    ctx = Context()
+
+    server = None
+    base_url = args.base_url
+    if base_url is None:
+        port = _free_port()
+        server = start_server(port)
+        base_url = f"http://127.0.0.1:{port}"
+    try:
+        scenarios = asyncio.run(run_all(args, ctx, base_url))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+    results = {
+        "meta": {
+            "commit": _git_commit(),
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "scale": args.scale if args.seed else None,
+            "movements": ctx.movements,
+            "params": {k: v for k, v in vars(args).items() if k not in ("out", "baseline")},
+        },
+        "scenarios": scenarios,
+    }
+
+    failed = False
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        results["baseline"] = {
+            "file": args.baseline,
+            "commit": baseline["meta"].get("commit"),
+            # сравнение честное только при одинаковых объёме данных и нагрузке
+            "same_setup": (
+                baseline["meta"].get("movements") == ctx.movements
+                and all(
+                    baseline["meta"]["params"].get(key) == getattr(args, key)
+                    for key in ("requests", "concurrency", "warmup")
+                )
+            ),
+        }
+        results["comparison"] = compare(scenarios, baseline["scenarios"], args.tolerance)
+        failed = any(item["regressions"] for item in results["comparison"].values())
+
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(json.dumps(results.get("comparison", scenarios), indent=2, ensure_ascii=False))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+# bench/serialization.py
+"""
+Сериализация большой страницы журнала движений: строк в секунду для каждого пути.
+
+Пути (одни и те же N строк stock_movements, одинаковый JSON на выходе):
+- orm_fastapi     — как было: ORM-объекты -> response_model FastAPI
+                    (валидация from_attributes + jsonable_encoder) -> json.dumps;
+- orm_adapter     — ORM-объекты -> заранее созданный TypeAdapter
+                    (validate_python + dump_json, всё в pydantic-core);
+- rows_adapter    — кортежи колонок -> dict -> TypeAdapter (валидация + dump_json);
+- rows_orjson     — кортежи колонок -> dict -> orjson без валидации
+                    (то, что делает app/fastjson.py).
+
+Для каждого пути отдельно меряются выборка из БД (asyncpg) и сериализация;
+из --repeat прогонов берётся медиана. Одинаковость JSON проверяется.
+
+Запуск (из корня репозитория, БД по DATABASE_URL):
+
+    python bench/serialization.py --rows 10000 --repeat 5 --json serialization.json
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from typing import List
+
+import common  # noqa: F401  (добавляет app/ в sys.path)
+
+from fastapi.routing import serialize_response
+from fastapi.responses import JSONResponse
+from fastapi.utils import create_model_field
+from pydantic import TypeAdapter
+from sqlalchemy import select
+
+import fastjson
+import models
+import schemas
+from db import AsyncSessionLocal, async_engine
+
+SCHEMA = schemas.StockMovement
+MODEL = models.StockMovement
+
+
+def orm_query(rows: int):
+    return select(MODEL).order_by(MODEL.move_id).limit(rows)
+
+
+def rows_query(rows: int):
+    return fastjson.select_schema(SCHEMA, MODEL).order_by(MODEL.move_id).limit(rows)
+
+
+async def fetch_orm(db, rows: int) -> list:
+    return list((await db.execute(orm_query(rows))).scalars())
+
+
+async def fetch_rows(db, rows: int) -> tuple:
+    stmt = rows_query(rows)
+    return list(stmt.selected_columns.keys()), list(await db.execute(stmt))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=10000, help="строк на страницу")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", help="сохранить результат в файл")
+    args = parser.parse_args()
+
+    response_field = create_model_field("Response", List[SCHEMA], mode="serialization")
+    adapter = TypeAdapter(List[SCHEMA])
+
+    async def orm_fastapi(db):
+        objs = await fetch_orm(db, args.rows)
+        fetched = time.perf_counter()
+        content = await serialize_response(field=response_field, response_content=objs)
+        return fetched, JSONResponse(content).body
+
+    async def orm_adapter(db):
+        objs = await fetch_orm(db, args.rows)
+        fetched = time.perf_counter()
+        return fetched, adapter.dump_json(adapter.validate_python(objs, from_attributes=True))
+
+    async def rows_adapter(db):
+        keys, rows = await fetch_rows(db, args.rows)
+        fetched = time.perf_counter()
+        return fetched, adapter.dump_json(adapter.validate_python([dict(zip(keys, r)) for r in rows]))
+
+    async def rows_orjson(db):
+        keys, rows = await fetch_rows(db, args.rows)
+        fetched = time.perf_counter()
+        return fetched, fastjson.dumps_rows(keys, rows)
+
+    paths = {
+        "orm_fastapi": orm_fastapi,
+        "orm_adapter": orm_adapter,
+        "rows_adapter": rows_adapter,
+        "rows_orjson": rows_orjson,
+    }
+
+    async def run() -> dict:
+        results = {"params": vars(args)}
+        bodies = {}
+        async with AsyncSessionLocal() as db:
+            # прогрев: кэш планов, соединение, страницы таблицы в shared buffers
+            await fetch_rows(db, args.rows)
+            for name, path in paths.items():
+                fetch_s, serialize_s = [], []
+                for _ in range(args.repeat):
+                    db.expunge_all()
+                    started = time.perf_counter()
+                    fetched, body = await path(db)
+                    done = time.perf_counter()
+                    fetch_s.append(fetched - started)
+                    serialize_s.append(done - fetched)
+                bodies[name] = json.loads(body)
+                fetch, serialize = statistics.median(fetch_s), statistics.median(serialize_s)
+                results[name] = {
+                    "rows": len(bodies[name]),
+                    "fetch_ms": round(fetch * 1000, 1),
+                    "serialize_ms": round(serialize * 1000, 1),
+                    "rows_per_s": round(len(bodies[name]) / (fetch + serialize)),
+                    "serialize_rows_per_s": round(len(bodies[name]) / serialize),
+                }
+        await async_engine.dispose()
+        results["same_output"] = all(body == bodies["orm_fastapi"] for body in bodies.values())
+        return results
+
+    results = asyncio.run(run())
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
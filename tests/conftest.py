@@ -0,0 +1,78 @@
+# tests/conftest.py
+"""
+Общие настройки тестов. Запуск из корня репозитория: python -m pytest -q
+"""
+
+import os
+import sys
+from uuid import uuid4
+
+import pytest
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+
+# ===== БД =====
+# Тесты на SQL идут в PostgreSQL из DATABASE_URL (схема — alembic upgrade head)
+# внутри одной транзакции, которая откатывается в конце теста; commit() кода
+# под тестом закрывает только SAVEPOINT. Без доступной БД такие тесты пропускаются.
+
+@pytest.fixture
+def db():
+    from app.db import engine
+
+    try:
+        connection = engine.connect()
+    except OperationalError as e:
+        pytest.skip(f"PostgreSQL is not available: {e.orig}")
+    transaction = connection.begin()
+    session = Session(bind=connection, join_transaction_mode="create_savepoint")
+    try:
+        yield session
+    finally:
+        session.close()
+        transaction.rollback()
+        connection.close()
+
+
+@pytest.fixture
+def material(db):
+    """Новый материал (со своими единицей и категорией)."""
+    from app import models
+
+    unit = models.Unit(name="test unit", symbol="t")
+    category = models.Category(name="test category")
+    db.add_all([unit, category])
+    db.flush()
+    row = models.Material(
+        sku=f"TEST-{uuid4().hex[:12]}",
+        name="test material",
+        unit_id=unit.unit_id,
+        category_id=category.category_id,
+    )
+    db.add(row)
+    # commit — только SAVEPOINT: строка переживёт rollback() кода под тестом
+    db.commit()
+    return row.material_id
+
+
+@pytest.fixture
+def new_warehouse(db):
+    """Фабрика складов одного нового проекта: new_warehouse() -> warehouse_id."""
+    from app import models
+
+    project = models.Project(code=f"TEST-{uuid4().hex[:12]}", name="test project")
+    db.add(project)
+    db.commit()
+
+    def create() -> int:
+        row = models.Warehouse(project_id=project.project_id, name="test warehouse")
+        db.add(row)
+        db.commit()
+        return row.warehouse_id
+
+    return create
@@ -0,0 +1,78 @@
+# tests/test_donors.py
+"""
+Предложения перемещений излишков в склады с нехваткой (reports.build_donor_query).
+Нужна БД (см. conftest.py).
+"""
+
+from app import models, reports
+
+
+def setup_stock(db, material, stock):
+    """stock: {warehouse_id: (qty, min_stock)}; qty None — нет строки остатка, min_stock None — нет политики."""
+    for warehouse_id, (qty, min_stock) in stock.items():
+        if qty is not None:
+            db.add(models.StockBalance(warehouse_id=warehouse_id, material_id=material, qty=qty))
+        if min_stock is not None:
+            db.add(models.WarehouseMaterialPolicy(warehouse_id=warehouse_id, material_id=material, min_stock=min_stock))
+    db.flush()
+
+
+def transfers(db, **filters):
+    rows = db.execute(reports.build_donor_query(**filters)).mappings()
+    return [(row["from_warehouse_id"], row["to_warehouse_id"], row["qty"]) for row in rows]
+
+
+def test_surplus_split_across_shortages(db, material, new_warehouse):
+    empty, low, rich, spare = (new_warehouse() for _ in range(4))
+    setup_stock(db, material, {
+        empty: (None, 10),   # нехватка 10, строки остатка нет
+        low: (4, 10),        # нехватка 6
+        rich: (20, 5),       # излишек 15
+        spare: (3, None),    # без политики — излишек весь остаток
+    })
+
+    # очереди по убыванию объёма: нехватки empty (0, 10], low (10, 16];
+    # излишки rich (0, 15], spare (15, 18] — нужна только 1 из 3
+    assert sorted(transfers(db, material_id=material)) == sorted([
+        (rich, empty, 10),
+        (rich, low, 5),
+        (spare, low, 1),
+    ])
+
+
+def test_filter_by_shortage_warehouse(db, material, new_warehouse):
+    empty, low, rich, spare = (new_warehouse() for _ in range(4))
+    setup_stock(db, material, {
+        empty: (None, 10),
+        low: (4, 10),
+        rich: (20, 5),
+        spare: (3, None),
+    })
+
+    # только нехватка low: её закрывает самый большой излишек целиком
+    assert transfers(db, warehouse_id=low, material_id=material) == [(rich, low, 6)]
+
+
+def test_no_transfer_without_surplus(db, material, new_warehouse):
+    short, at_minimum = new_warehouse(), new_warehouse()
+    setup_stock(db, material, {
+        short: (1, 10),
+        at_minimum: (5, 5),  # ровно минимум — не донор
+    })
+
+    assert transfers(db, material_id=material) == []
+
+
+def test_surplus_shortfall_covers_what_it_can(db, material, new_warehouse):
+    first, second, donor = new_warehouse(), new_warehouse(), new_warehouse()
+    setup_stock(db, material, {
+        first: (0, 8),
+        second: (0, 4),
+        donor: (10, 0),
+    })
+
+    # излишка 10 на нехватку 12: сначала большая нехватка целиком, остаток — следующей
+    assert sorted(transfers(db, material_id=material)) == sorted([
+        (donor, first, 8),
+        (donor, second, 2),
+    ])
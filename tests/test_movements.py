@@ -0,0 +1,68 @@
+# tests/test_movements.py
+"""
+Массовая загрузка движений (movements.py): разбор тела и ошибки по строкам.
+Разбор — без БД; bulk_insert — с БД (см. conftest.py).
+"""
+
+import json
+
+import pytest
+
+from app import models, movements
+
+NDJSON = "application/x-ndjson"
+MISSING_WAREHOUSE_ID = 2_000_000_000
+
+
+def test_parse_json_array():
+    body = json.dumps([{"qty": 1}, {"qty": 2}]).encode()
+    assert movements.parse_bulk_body(body, "application/json") == [{"qty": 1}, {"qty": 2}]
+
+
+@pytest.mark.parametrize("body", [b'{"qty": 1}', b'[{"qty": 1}'])
+def test_parse_json_rejects_non_array(body):
+    with pytest.raises(ValueError):
+        movements.parse_bulk_body(body, "application/json")
+
+
+def test_parse_ndjson_malformed_line_stays_in_place():
+    body = b'{"qty": 1}\n{"qty": \n\n   \n{"qty": 3}\r\n\xff\n'
+    items = movements.parse_bulk_body(body, "application/x-ndjson; charset=utf-8")
+
+    # пустые строки не считаются, индексы — по непустым
+    assert len(items) == 4
+    assert items[0] == {"qty": 1}
+    assert isinstance(items[1], movements.InvalidLine)
+    assert items[1].detail.startswith("Invalid JSON")
+    assert items[2] == {"qty": 3}
+    assert isinstance(items[3], movements.InvalidLine)
+
+
+def test_bulk_insert_reports_errors_per_row(db, material, new_warehouse):
+    wh = new_warehouse()
+    good = {"move_type": "IN", "move_date": "2001-03-01", "material_id": material, "to_warehouse_id": wh, "qty": 5}
+    body = "\n".join([
+        json.dumps(good),
+        "{not json",
+        json.dumps([1, 2]),
+        json.dumps({**good, "qty": "many"}),
+        json.dumps({**good, "to_warehouse_id": MISSING_WAREHOUSE_ID}),
+        json.dumps({**good, "qty": 7}),
+    ]).encode()
+
+    result = movements.bulk_insert(db, movements.parse_bulk_body(body, NDJSON))
+
+    assert [error["index"] for error in result["errors"]] == [1, 2, 3, 4]
+    assert result["errors"][0]["detail"].startswith("Invalid JSON")
+    assert result["errors"][1]["detail"] == "Expected a JSON object"
+    assert result["errors"][2]["detail"][0]["loc"] == ["qty"]
+    # несуществующий склад отсеивается построчным повтором в SAVEPOINT-ах
+    assert "foreign key" in result["errors"][3]["detail"]
+
+    assert result["inserted"] == 2
+    ids = result["move_ids"]
+    assert ids[0] is not None and ids[5] is not None
+    assert ids[1:5] == [None] * 4
+
+    balance = db.get(models.StockBalance, (wh, material))
+    assert balance.qty == 12
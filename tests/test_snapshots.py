@@ -0,0 +1,88 @@
+# tests/test_snapshots.py
+"""
+Остатки на дату (snapshots.py): снимок закрытого периода + движения после него,
+движения задним числом в закрытые периоды. Нужна БД (см. conftest.py).
+"""
+
+from datetime import date
+
+from sqlalchemy import select
+
+from app import models, movements, snapshots
+
+# старые даты: в рабочей БД снимков за эти месяцы нет
+JAN_END = date(2001, 1, 31)
+
+
+def post(db, *rows):
+    result = movements.bulk_insert(db, [{"move_date": d.isoformat(), **row} for d, row in rows])
+    assert result["errors"] == []
+
+
+def balance_as_of(db, as_of, warehouse_id, material_id):
+    period_end = db.execute(snapshots.nearest_period_query(as_of)).scalar()
+    balances = snapshots.build_balances_as_of_query(as_of, period_end, warehouse_id, material_id)
+    return db.execute(select(balances.c.qty)).scalar()
+
+
+def snapshot_qty(db, period_end, warehouse_id, material_id):
+    snapshot = models.StockBalanceSnapshot
+    return db.execute(
+        select(snapshot.qty).where(
+            snapshot.period_end == period_end,
+            snapshot.warehouse_id == warehouse_id,
+            snapshot.material_id == material_id,
+        )
+    ).scalar()
+
+
+def test_as_of_uses_snapshot_plus_later_movements(db, material, new_warehouse):
+    wh = new_warehouse()
+    mv = {"material_id": material}
+    post(
+        db,
+        (date(2001, 1, 10), {"move_type": "IN", "to_warehouse_id": wh, "qty": 10, **mv}),
+        (date(2001, 2, 5), {"move_type": "IN", "to_warehouse_id": wh, "qty": 5, **mv}),
+        (date(2001, 2, 20), {"move_type": "OUT", "from_warehouse_id": wh, "qty": 2, **mv}),
+    )
+    snapshots.close_period(db, JAN_END)
+
+    assert snapshot_qty(db, JAN_END, wh, material) == 10
+    assert db.execute(snapshots.nearest_period_query(date(2001, 2, 10))).scalar() == JAN_END
+    assert balance_as_of(db, date(2001, 1, 20), wh, material) == 10
+    assert balance_as_of(db, date(2001, 2, 10), wh, material) == 15
+    assert balance_as_of(db, date(2001, 2, 28), wh, material) == 13
+
+
+def test_zero_balance_is_omitted(db, material, new_warehouse):
+    wh = new_warehouse()
+    mv = {"material_id": material}
+    post(
+        db,
+        (date(2001, 1, 10), {"move_type": "IN", "to_warehouse_id": wh, "qty": 4, **mv}),
+        (date(2001, 2, 10), {"move_type": "OUT", "from_warehouse_id": wh, "qty": 4, **mv}),
+    )
+    snapshots.close_period(db, JAN_END)
+
+    assert balance_as_of(db, date(2001, 2, 28), wh, material) is None
+
+
+def test_backdated_movement_updates_closed_snapshot(db, material, new_warehouse):
+    source, target = new_warehouse(), new_warehouse()
+    mv = {"material_id": material}
+    post(db, (date(2001, 1, 10), {"move_type": "IN", "to_warehouse_id": source, "qty": 10, **mv}))
+    snapshots.close_period(db, JAN_END)
+
+    # после закрытия января: перемещение задним числом
+    post(
+        db,
+        (
+            date(2001, 1, 15),
+            {"move_type": "TRANSFER", "from_warehouse_id": source, "to_warehouse_id": target, "qty": 3, **mv},
+        ),
+    )
+
+    assert snapshot_qty(db, JAN_END, source, material) == 7
+    assert snapshot_qty(db, JAN_END, target, material) == 3
+    assert balance_as_of(db, date(2001, 2, 10), source, material) == 7
+    assert balance_as_of(db, date(2001, 2, 10), target, material) == 3
@@ -0,0 +1,131 @@
+# tests/test_valuation.py
+"""
+Проводка движений в Ledger (valuation.py): средняя себестоимость и FIFO-слои.
+Без БД — Ledger работает с объектами в памяти.
+"""
+
+from datetime import date
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+
+from app import valuation
+
+JAN, FEB, MAR, APR = date(2025, 1, 10), date(2025, 2, 10), date(2025, 3, 10), date(2025, 4, 10)
+W1, W2, MAT = 1, 2, 100
+
+
+def move(qty, move_date, from_wh=None, to_wh=None, unit_price=None):
+    return SimpleNamespace(
+        from_warehouse_id=from_wh,
+        to_warehouse_id=to_wh,
+        material_id=MAT,
+        qty=qty,
+        unit_price=unit_price,
+        move_date=move_date,
+    )
+
+
+def layers(ledger, warehouse_id):
+    return [
+        (layer.received_date, layer.qty, layer.unit_cost)
+        for layer in ledger.state((warehouse_id, MAT)).layers
+    ]
+
+
+@pytest.fixture(params=[False, True], ids=["average", "fifo"])
+def ledger(request):
+    return valuation.Ledger(fifo=request.param)
+
+
+def test_receipts_weighted_average(ledger):
+    ledger.post(move(10, JAN, to_wh=W1, unit_price=5))
+    ledger.post(move(10, FEB, to_wh=W1, unit_price=7))
+
+    state = ledger.state((W1, MAT))
+    assert state.qty == 20
+    assert state.avg_cost == 6
+    assert state.value == Decimal("120.00")
+    expected = [(JAN, 10, 5), (FEB, 10, 7)] if ledger.fifo else []
+    assert layers(ledger, W1) == expected
+
+
+def test_receipt_without_price_uses_average(ledger):
+    ledger.post(move(10, JAN, to_wh=W1, unit_price=5))
+    ledger.post(move(10, FEB, to_wh=W1))
+
+    state = ledger.state((W1, MAT))
+    assert state.qty == 20
+    assert state.avg_cost == 5
+
+
+def test_issue_keeps_average(ledger):
+    ledger.post(move(10, JAN, to_wh=W1, unit_price=5))
+    ledger.post(move(10, FEB, to_wh=W1, unit_price=7))
+    ledger.post(move(15, MAR, from_wh=W1))
+
+    state = ledger.state((W1, MAT))
+    assert state.qty == 5
+    assert state.avg_cost == 6
+    expected = [(FEB, 5, 7)] if ledger.fifo else []
+    assert layers(ledger, W1) == expected
+
+
+def test_negative_adjust_is_issue(ledger):
+    ledger.post(move(10, JAN, to_wh=W1, unit_price=5))
+    ledger.post(move(-3, FEB, to_wh=W1))
+
+    state = ledger.state((W1, MAT))
+    assert state.qty == 7
+    assert state.avg_cost == 5
+
+
+def test_transfer_carries_sender_cost(ledger):
+    ledger.post(move(10, JAN, to_wh=W1, unit_price=5))
+    ledger.post(move(10, FEB, to_wh=W1, unit_price=7))
+    ledger.post(move(10, MAR, to_wh=W2, unit_price=9))
+    ledger.post(move(12, APR, from_wh=W1, to_wh=W2))
+
+    sender, receiver = ledger.state((W1, MAT)), ledger.state((W2, MAT))
+    assert sender.qty == 8
+    assert sender.avg_cost == 6
+    assert receiver.qty == 22
+    if ledger.fifo:
+        # 10 по 5 из январского слоя и 2 по 7 из февральского: (90 + 64) / 22
+        assert receiver.avg_cost == 7
+        assert layers(ledger, W1) == [(FEB, 8, 7)]
+        # слои отправителя сохраняют даты прихода и встают раньше мартовского
+        assert layers(ledger, W2) == [(JAN, 10, 5), (FEB, 2, 7), (MAR, 10, 9)]
+    else:
+        # 12 по средней отправителя 6: (90 + 72) / 22
+        assert receiver.avg_cost == Decimal("7.363636")
+
+
+def test_over_issue_then_receipt_covers_debt(ledger):
+    ledger.post(move(10, JAN, to_wh=W1, unit_price=5))
+    ledger.post(move(15, FEB, from_wh=W1))
+
+    state = ledger.state((W1, MAT))
+    assert state.qty == -5
+    assert state.avg_cost == 5
+    assert layers(ledger, W1) == []
+
+    ledger.post(move(10, MAR, to_wh=W1, unit_price=8))
+    assert state.qty == 5
+    # минус уже списан по старой средней, средняя — только по новому приходу
+    assert state.avg_cost == 8
+    assert state.value == Decimal("40.00")
+    expected = [(MAR, 5, 8)] if ledger.fifo else []
+    assert layers(ledger, W1) == expected
+
+
+def test_fifo_transfer_beyond_layers_dated_on_transfer():
+    ledger = valuation.Ledger(fifo=True)
+    ledger.post(move(10, JAN, to_wh=W1, unit_price=5))
+    ledger.post(move(15, FEB, from_wh=W1, to_wh=W2))
+
+    assert ledger.state((W1, MAT)).qty == -5
+    # недостающие 5 списаны по средней и приходят без исходной даты
+    assert layers(ledger, W2) == [(JAN, 10, 5), (FEB, 5, 5)]
+    assert ledger.state((W2, MAT)).avg_cost == 5